@@ -0,0 +1,253 @@
+"""
+作品单字批量分析任务
+按作品创建任务后立即返回任务ID；后台线程打开作品图片，按每个单字的 x/y/width/height 裁剪，
+由有界线程池并发调用视觉模型（令牌桶限制整个进程的调用速率），结果写入 Character.keypoints。
+每完成一个单字推送 analysis_job_progress 事件到用户的 user_<id> 房间，结束时推送 analysis_job_completed。
+任务记录已完成的单字，服务重启或失败后续跑时跳过这些单字，只重试未完成和失败的。
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from PIL import Image
+from models import db, AnalysisJob, Character, Work
+from image_derivatives import crop_character
+from usage_stats import attribute_to
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+class AnalysisJobConflictError(Exception):
+    """作品已有进行中的分析任务"""
+
+    def __init__(self, job):
+        super().__init__('该作品已有进行中的分析任务')
+        self.job = job
+
+
+class TokenBucket:
+    """令牌桶限速（线程安全）：每秒补充 rate 个令牌，最多积累 capacity 个"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AnalysisBatchQueue:
+    """批量分析任务队列，用法与 Flask 扩展一致：先创建实例，再调用 init_app(app)"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._bucket = None
+        self._lock = threading.Lock()
+        self._recovered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """读取配置"""
+        self.app = app
+        self.workers = app.config.get('ANALYSIS_BATCH_JOB_WORKERS', 2)
+        self.concurrency = app.config.get('ANALYSIS_BATCH_CONCURRENCY', 4)
+        self.rate = app.config.get('ANALYSIS_BATCH_RATE', 2)
+        self.burst = app.config.get('ANALYSIS_BATCH_BURST', 4)
+        app.extensions['analysis_batch_queue'] = self
+
+    def _ensure_started(self):
+        """创建线程池与令牌桶，并在本进程首次使用时恢复未完成的任务"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='analysis-job')
+                self._bucket = TokenBucket(self.rate, self.burst)
+            if self._recovered:
+                return
+            # 上次退出时正在执行的任务重新排队，已完成的单字会被跳过
+            AnalysisJob.query.filter_by(status='running').update({'status': 'pending'})
+            db.session.commit()
+            pending = [job.id for job in AnalysisJob.query.filter_by(status='pending').order_by(AnalysisJob.created_at)]
+            self._recovered = True
+        for job_id in pending:
+            self._executor.submit(self._run, job_id)
+
+    def submit(self, work, user_id, overwrite=False):
+        """
+        为作品创建批量分析任务
+
+        Args:
+            work: 作品
+            user_id: 发起用户ID
+            overwrite: 是否重新分析已有关键点的单字
+
+        Raises:
+            AnalysisJobConflictError: 该作品已有进行中的任务
+        """
+        self._ensure_started()
+        with self._lock:
+            active = AnalysisJob.query.filter(
+                AnalysisJob.work_id == work.id,
+                AnalysisJob.status.in_(ACTIVE_STATUSES)
+            ).first()
+            if active:
+                raise AnalysisJobConflictError(active)
+
+            query = Character.query.filter_by(work_id=work.id).order_by(Character.id)
+            characters = query.all() if overwrite else [c for c in query if not c.keypoints]
+            job = AnalysisJob(
+                id=uuid.uuid4().hex,
+                work_id=work.id,
+                user_id=user_id,
+                status='pending',
+                overwrite=overwrite,
+                character_ids=[c.id for c in characters],
+                done_ids=[],
+                failures={}
+            )
+            db.session.add(job)
+            db.session.commit()
+        self._executor.submit(self._run, job.id)
+        return job
+
+    def resume(self, job):
+        """续跑已结束的任务：跳过已完成的单字，重试未完成和失败的"""
+        self._ensure_started()
+        with self._lock:
+            claimed = AnalysisJob.query.filter(
+                AnalysisJob.id == job.id,
+                AnalysisJob.status.notin_(ACTIVE_STATUSES)
+            ).update({'status': 'pending', 'error': None, 'finished_at': None}, synchronize_session=False)
+            db.session.commit()
+        db.session.refresh(job)
+        if claimed:
+            self._executor.submit(self._run, job.id)
+        return bool(claimed)
+
+    def get(self, job_id):
+        """查询任务（同时确保重启后的任务已恢复执行）"""
+        self._ensure_started()
+        return AnalysisJob.query.get(job_id)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                self._execute(job_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"分析任务 {job_id} 执行异常: {e}")
+                job = AnalysisJob.query.get(job_id)
+                if job and job.status == 'running':
+                    job.status = 'failed'
+                    job.error = f'服务器内部错误: {str(e)}'[:500]
+                    job.finished_at = datetime.utcnow()
+                    db.session.commit()
+                    self._emit('analysis_job_completed', job)
+            finally:
+                db.session.remove()
+
+    def _execute(self, job_id):
+        # 只有一个线程能把任务从 pending 改为 running
+        claimed = AnalysisJob.query.filter_by(id=job_id, status='pending').update({
+            'status': 'running',
+            'started_at': datetime.utcnow()
+        })
+        db.session.commit()
+        if not claimed:
+            return
+        job = AnalysisJob.query.get(job_id)
+
+        work = Work.query.get(job.work_id)
+        image_path = os.path.join(self.app.config['UPLOAD_FOLDER'], 'works', work.image_url) if work else None
+        if not image_path or not os.path.exists(image_path):
+            self._finish(job, 'failed', '作品或作品图片不存在')
+            return
+
+        done = set(job.done_ids or [])
+        todo = [char_id for char_id in job.character_ids if char_id not in done]
+        characters = {c.id: c for c in Character.query.filter(Character.id.in_(todo))} if todo else {}
+        failures = dict(job.failures or {})
+
+        with Image.open(image_path) as image:
+            image = image.convert('RGB')
+            crops = {}
+            for char_id in todo:
+                character = characters.get(char_id)
+                crop = crop_character(image, character, work) if character else None
+                if crop is None:
+                    failures[str(char_id)] = '单字不存在或区域超出作品图片范围'
+                else:
+                    crops[char_id] = crop
+
+        # 线程池只负责调用模型，数据库写入都在本线程完成
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='analysis-char') as pool:
+            futures = {pool.submit(self._analyze, crop, job.user_id): char_id for char_id, crop in crops.items()}
+            for future in as_completed(futures):
+                char_id = futures[future]
+                character = characters[char_id]
+                try:
+                    result = future.result()
+                    character.keypoints = result.get('keypoints', [])
+                    done.add(char_id)
+                    failures.pop(str(char_id), None)
+                    status = 'succeeded'
+                except Exception as e:
+                    failures[str(char_id)] = str(e)[:200]
+                    status = 'failed'
+                job.done_ids = sorted(done)
+                job.failures = dict(failures)
+                db.session.commit()
+                self._emit('analysis_job_progress', job, {
+                    'character_id': char_id,
+                    'character_status': status,
+                    'keypoints': character.keypoints if status == 'succeeded' else None
+                })
+
+        job.failures = failures
+        self._finish(job, 'succeeded')
+
+    def _analyze(self, crop, user_id):
+        # 延迟导入，避免与路由模块循环引用
+        from routes.calligraphy import analyze_with_doubao
+        self._bucket.acquire()
+        with self.app.app_context(), attribute_to(user_id):
+            return analyze_with_doubao(crop)
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        self._emit('analysis_job_completed', job)
+
+    def _emit(self, event, job, extra=None):
+        """推送任务事件到用户房间"""
+        socketio = self.app.extensions.get('socketio')
+        if socketio is None:
+            return
+        payload = job.to_dict()
+        if extra:
+            payload.update(extra)
+        try:
+            socketio.emit(event, payload, room=f'user_{job.user_id}')
+        except Exception as e:
+            print(f"推送分析任务事件失败: {e}")
+
+
+analysis_batch_queue = AnalysisBatchQueue()
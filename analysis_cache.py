@@ -0,0 +1,121 @@
+"""
+AI 单字分析结果缓存
+以缩放后单字图片的感知哈希（64 位 DCT pHash）加模型名与提示词版本作为键缓存分析结果，
+同一单字图片（含轻微缩放、压缩差异的近似图片）重复分析时直接返回，不再调用视觉模型。
+汉明距离不超过 ANALYSIS_CACHE_HAMMING_THRESHOLD 视为命中；条目超过 ANALYSIS_CACHE_TTL 秒过期，
+数量超过 ANALYSIS_CACHE_MAX_ENTRIES 时淘汰最久未用的条目。缓存在进程内，重启后清空。
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from flask import current_app
+from PIL import Image
+
+HASH_SIZE = 8
+_SAMPLE_SIZE = 32
+
+
+def _dct_matrix(n):
+    """n 点 DCT-II 变换矩阵"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(_SAMPLE_SIZE)
+
+# (模型, 提示词版本, 哈希) -> (过期时间, 分析结果)，按最近使用排序
+_entries = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'near_hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def perceptual_hash(image):
+    """
+    计算图片的 64 位感知哈希
+
+    灰度缩放到 32x32 后做二维 DCT，取左上角 8x8 低频系数（不含直流分量）与中位数比较得到各位。
+    """
+    gray = image.convert('L').resize((_SAMPLE_SIZE, _SAMPLE_SIZE), Image.BOX)
+    pixels = np.asarray(gray, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    bits = low > np.median(low[1:])
+    return int(sum(1 << i for i, bit in enumerate(bits) if bit))
+
+
+def _count(key):
+    _stats[key] += 1
+
+
+def get(image_hash, model, prompt_version):
+    """
+    查找缓存的分析结果：先按哈希精确查找，再在同一模型与提示词版本的条目中找汉明距离最近的
+
+    Returns:
+        dict: 分析结果副本（metadata 中附带 cached 与 hash_distance），未命中返回 None
+    """
+    config = current_app.config
+    threshold = config.get('ANALYSIS_CACHE_HAMMING_THRESHOLD', 4)
+    now = time.monotonic()
+    with _lock:
+        key = (model, prompt_version, image_hash)
+        best_key, best_distance = None, None
+        entry = _entries.get(key)
+        if entry is not None and entry[0] > now:
+            best_key, best_distance = key, 0
+        elif threshold > 0:
+            for candidate, (expires_at, _) in _entries.items():
+                if candidate[0] != model or candidate[1] != prompt_version or expires_at <= now:
+                    continue
+                distance = (candidate[2] ^ image_hash).bit_count()
+                if distance <= threshold and (best_distance is None or distance < best_distance):
+                    best_key, best_distance = candidate, distance
+                    if distance == 0:
+                        break
+        if best_key is None:
+            _count('misses')
+            return None
+        _count('hits' if best_distance == 0 else 'near_hits')
+        _entries.move_to_end(best_key)
+        result = _entries[best_key][1]
+    result = copy.deepcopy(result)
+    result.setdefault('metadata', {}).update({'cached': True, 'hash_distance': best_distance})
+    return result
+
+
+def put(image_hash, model, prompt_version, result):
+    """写入分析结果，并淘汰过期与超出数量上限的条目"""
+    config = current_app.config
+    ttl = config.get('ANALYSIS_CACHE_TTL', 7 * 24 * 3600)
+    max_entries = config.get('ANALYSIS_CACHE_MAX_ENTRIES', 2000)
+    now = time.monotonic()
+    with _lock:
+        key = (model, prompt_version, image_hash)
+        _entries[key] = (now + ttl, copy.deepcopy(result))
+        _entries.move_to_end(key)
+        for expired in [k for k, (expires_at, _) in _entries.items() if expires_at <= now]:
+            del _entries[expired]
+            _count('evictions')
+        while len(_entries) > max_entries:
+            _entries.popitem(last=False)
+            _count('evictions')
+
+
+def clear():
+    """清空缓存（计数器保留）"""
+    with _lock:
+        _entries.clear()
+
+
+def stats():
+    """命中/未命中计数与当前条目数"""
+    with _lock:
+        counters = dict(_stats)
+        size = len(_entries)
+    lookups = counters['hits'] + counters['near_hits'] + counters['misses']
+    hit_rate = (counters['hits'] + counters['near_hits']) / lookups if lookups else 0
+    return {**counters, 'entries': size, 'hit_rate': round(hit_rate, 4)}
@@ -0,0 +1,259 @@
+"""
+单字注释关键点汇总
+把同一个字所有注释者标注的关键点（归一化 x/y）聚类为共识点，并生成粗粒度的二维密度网格，
+计算全部使用 NumPy 向量化完成。结果按 (单字, 网格大小) 缓存在进程内，
+该字的注释新增、修改或删除并提交后立即失效。
+"""
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from models import Annotation
+
+# (单字, 网格大小) -> (过期时间, 汇总结果)
+_cache = {}
+_cache_lock = threading.Lock()
+
+# 会话中待失效的单字，提交后统一清除缓存
+_PENDING_KEY = 'annotation_stats_pending'
+
+
+def _extract_points(annotations):
+    """
+    取出所有合法关键点
+
+    Returns:
+        tuple: (坐标数组 (N, 2), 所属注释下标数组 (N,), 提示文字列表)
+    """
+    coords, owners, tips = [], [], []
+    for index, annotation in enumerate(annotations):
+        keypoints = (annotation.data or {}).get('keypoints')
+        if not isinstance(keypoints, list):
+            continue
+        for point in keypoints:
+            if not isinstance(point, dict):
+                continue
+            try:
+                x, y = float(point['x']), float(point['y'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            coords.append((x, y))
+            owners.append(index)
+            tips.append(point.get('tips') or point.get('description') or '')
+    points = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    valid = np.isfinite(points).all(axis=1)
+    points = np.clip(points[valid], 0.0, 1.0)
+    owners = np.asarray(owners, dtype=np.int64)[valid]
+    tips = [tip for tip, keep in zip(tips, valid) if keep]
+    return points, owners, tips
+
+
+# 距离块的最大元素数，控制单次计算的内存（约 8 MB float64）
+_BLOCK_ELEMENTS = 1 << 20
+
+
+def _grid_cells(points, radius):
+    """
+    按边长 radius 的网格分桶
+
+    Returns:
+        tuple: (每个点所在格子 (N, 2), 格子 -> 点下标数组)
+    """
+    cell_size = radius if radius > 0 else 1.0
+    cells = np.floor(points / cell_size).astype(np.int64)
+    order = np.lexsort((cells[:, 1], cells[:, 0]))
+    sorted_cells = cells[order]
+    starts = np.flatnonzero(np.r_[True, (np.diff(sorted_cells, axis=0) != 0).any(axis=1)])
+    buckets = {
+        tuple(sorted_cells[start]): np.sort(chunk)
+        for start, chunk in zip(starts, np.split(order, starts[1:]))
+    }
+    return cells, buckets
+
+
+def _candidates(buckets, cell):
+    """格子本身与周围 8 个格子中的点，距离不超过 radius 的点只可能落在这里"""
+    cx, cy = cell
+    parts = [buckets[(cx + dx, cy + dy)] for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (cx + dx, cy + dy) in buckets]
+    return np.concatenate(parts)
+
+
+def _hits(points, rows, columns, radius_sq):
+    """rows × columns 的邻接块按行分块计算，返回 (每行邻居数, 每列邻居数)"""
+    row_hits = np.zeros(len(rows), dtype=np.int64)
+    column_hits = np.zeros(len(columns), dtype=np.int64)
+    step = max(1, _BLOCK_ELEMENTS // max(1, len(columns)))
+    for start in range(0, len(rows), step):
+        chunk = points[rows[start:start + step]]
+        dx = chunk[:, 0, None] - points[columns, 0]
+        dy = chunk[:, 1, None] - points[columns, 1]
+        within = dx * dx + dy * dy <= radius_sq
+        row_hits[start:start + step] = within.sum(axis=1)
+        column_hits += within.sum(axis=0)
+    return row_hits, column_hits
+
+
+def cluster_points(points, radius):
+    """
+    按距离阈值聚类关键点
+
+    每轮选取剩余点中邻居最多的点作为中心（并列时取下标最小的），半径内的剩余点归为一类，
+    直到所有点都被归类。点按边长 radius 的网格分桶，只与相邻格子比较距离；
+    各点的剩余邻居数在每轮归类后增量扣减，内存与耗时不随点数平方增长。
+
+    Args:
+        points: 坐标数组 (N, 2)
+        radius: 聚类半径（归一化坐标）
+
+    Returns:
+        list: 每个类别的成员下标数组，按选取顺序排列
+    """
+    if len(points) == 0:
+        return []
+    radius_sq = radius * radius
+    cells, buckets = _grid_cells(points, radius)
+
+    # 每个点在剩余点中的邻居数（含自身），已归类的点记为 -1
+    neighbors = np.zeros(len(points), dtype=np.int64)
+    for cell, members in buckets.items():
+        neighbors[members] = _hits(points, members, _candidates(buckets, cell), radius_sq)[0]
+
+    remaining = np.ones(len(points), dtype=bool)
+    clusters = []
+    while remaining.any():
+        seed = int(neighbors.argmax())
+        candidates = _candidates(buckets, tuple(cells[seed]))
+        candidates = candidates[remaining[candidates]]
+        within = _hits(points, np.array([seed]), candidates, radius_sq)[1] > 0
+        members = np.sort(candidates[within])
+        remaining[members] = False
+        neighbors[members] = -1
+        clusters.append(members)
+
+        # 刚归类的点不再计入其余点的邻居数
+        member_cells = cells[members]
+        for cell in {tuple(c) for c in member_cells}:
+            group = members[(member_cells == cell).all(axis=1)]
+            others = _candidates(buckets, cell)
+            others = others[remaining[others]]
+            if len(others):
+                neighbors[others] -= _hits(points, group, others, radius_sq)[1]
+    return clusters
+
+
+def density_grid(points, size):
+    """二维密度网格，grid[行 y][列 x] 为落在该格内的关键点数量"""
+    grid, _, _ = np.histogram2d(points[:, 1], points[:, 0], bins=size, range=[[0, 1], [0, 1]])
+    return grid.astype(np.int64)
+
+
+def summarize_character(character, grid_size=16):
+    """
+    汇总某个字的全部注释关键点
+
+    Returns:
+        dict: 共识点（clusters）与密度网格（heatmap）
+    """
+    config = current_app.config
+    radius = config.get('ANNOTATION_CLUSTER_RADIUS', 0.08)
+    max_tips = config.get('ANNOTATION_CLUSTER_TIPS', 3)
+    annotations = Annotation.query.filter(
+        Annotation.character == character
+    ).order_by(
+        Annotation.timestamp.desc(), Annotation.id.desc()
+    ).limit(config.get('ANNOTATION_STATS_MAX_ANNOTATIONS', 500)).all()
+
+    points, owners, tips = _extract_points(annotations)
+    # 注释按时间倒序，超出点数上限时保留最新的关键点
+    max_points = config.get('ANNOTATION_STATS_MAX_POINTS', 5000)
+    points, owners, tips = points[:max_points], owners[:max_points], tips[:max_points]
+    clusters = []
+    for members in cluster_points(points, radius):
+        member_points = points[members]
+        center = member_points.mean(axis=0)
+        distances = np.sqrt(((member_points - center) ** 2).sum(axis=1))
+        # 离共识点最近的几条不重复提示
+        representative = []
+        for i in members[np.argsort(distances, kind='stable')]:
+            tip = tips[i]
+            if tip and tip not in representative:
+                representative.append(tip)
+                if len(representative) >= max_tips:
+                    break
+        clusters.append({
+            'x': round(float(center[0]), 4),
+            'y': round(float(center[1]), 4),
+            'count': int(len(np.unique(owners[members]))),
+            'points': int(len(members)),
+            'spread': round(float(np.sqrt((distances ** 2).mean())), 4),
+            'tips': representative
+        })
+    clusters.sort(key=lambda c: (-c['count'], -c['points']))
+
+    grid = density_grid(points, grid_size)
+    return {
+        'character': character,
+        'annotations_count': len(annotations),
+        'keypoints_count': int(len(points)),
+        'clusters': clusters,
+        'heatmap': {
+            'size': grid_size,
+            'max': int(grid.max()) if grid.size else 0,
+            'grid': grid.tolist()
+        },
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
+
+def get_character_summary(character, grid_size=16):
+    """带缓存的单字关键点汇总"""
+    key = (character, grid_size)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    summary = summarize_character(character, grid_size)
+    ttl = current_app.config.get('ANNOTATION_STATS_CACHE_TTL', 600)
+    with _cache_lock:
+        _cache[key] = (now + ttl, summary)
+    return summary
+
+
+def invalidate(character):
+    """清除某个字的全部缓存"""
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] == character]:
+            del _cache[key]
+
+
+def _mark_changed(target):
+    session = object_session(target)
+    if session is None:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, set())
+    pending.add(target.character)
+    # 修改了单字时，原来的字也要失效
+    pending.update(c for c in inspect(target).attrs.character.history.deleted if c)
+
+
+@event.listens_for(Annotation, 'after_insert')
+@event.listens_for(Annotation, 'after_update')
+@event.listens_for(Annotation, 'after_delete')
+def _annotation_changed(mapper, connection, target):
+    _mark_changed(target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    for character in session.info.pop(_PENDING_KEY, ()):
+        invalidate(character)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
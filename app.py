@@ -7,7 +7,16 @@ import os
 
 from config import config
 from models import db, User
-from routes import auth_bp, works_bp, users_bp, comments_bp, collections_bp, calligraphy_bp, posts_bp, topics_bp, character_sets_bp, notifications_bp
+from search_log_buffer import search_log_buffer
+from ocr_jobs import ocr_job_queue
+from analysis_batch import analysis_batch_queue
+from usage_stats import usage_stats
+from http_client import provider_metrics
+from llm_client import model_metrics
+import analysis_cache
+import single_flight
+import image_derivatives
+from routes import auth_bp, works_bp, users_bp, comments_bp, collections_bp, calligraphy_bp, posts_bp, topics_bp, character_sets_bp, notifications_bp, admin_bp
 
 # 加载环境变量
 load_dotenv()
@@ -31,6 +40,10 @@ def create_app(config_name='default'):
     db.init_app(app)
     CORS(app, origins=app.config['CORS_ORIGINS'], supports_credentials=True)
     jwt = JWTManager(app)
+    search_log_buffer.init_app(app)
+    ocr_job_queue.init_app(app)
+    analysis_batch_queue.init_app(app)
+    usage_stats.init_app(app)
     
     # 初始化SocketIO
     socketio = SocketIO(app, 
@@ -49,6 +62,7 @@ def create_app(config_name='default'):
     app.register_blueprint(topics_bp)
     app.register_blueprint(character_sets_bp)
     app.register_blueprint(notifications_bp)
+    app.register_blueprint(admin_bp)
 
     # 创建上传目录
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
@@ -64,7 +78,12 @@ def create_app(config_name='default'):
     # 静态文件路由（用于访问上传的图片）
     @app.route('/uploads/<path:filename>')
     def uploaded_file(filename):
-        """访问上传的文件"""
+        """访问上传的文件，缺失的衍生图首次访问时补生成"""
+        if f'/{image_derivatives.DERIVED_FOLDER}/' in filename:
+            if not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+                image_derivatives.ensure_derivative(filename)
+            return send_from_directory(app.config['UPLOAD_FOLDER'], filename,
+                                       max_age=app.config['IMAGE_DERIVATIVE_CACHE_MAX_AGE'])
         return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
     # ========== 前端页面路由 ==========
@@ -180,6 +199,16 @@ def create_app(config_name='default'):
         """健康检查"""
         return jsonify({'status': 'healthy'}), 200
 
+    @app.route('/health/providers')
+    def provider_health():
+        """外部服务调用指标（请求数、错误数、重试数、熔断状态与延迟分布）、各模型的首字节时间与耗时分布、分析结果缓存命中情况与并发请求合并情况"""
+        return jsonify({
+            'providers': provider_metrics(),
+            'models': model_metrics(),
+            'analysis_cache': analysis_cache.stats(),
+            'single_flight': single_flight.metrics()
+        }), 200
+
     # 错误处理
     @app.errorhandler(404)
     def not_found(error):
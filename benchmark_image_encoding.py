@@ -0,0 +1,115 @@
+"""
+AI 分析图片编码基准测试
+对样例图片按不同编码配置压缩，输出每种配置的载荷大小与编码耗时；
+加 --live 时实际调用视觉模型，额外输出端到端耗时（会产生 API 费用）。
+
+用法：
+    python benchmark_image_encoding.py [图片或目录 ...] [--live]
+未指定图片时使用 uploads/works/ 下的作品图片。
+"""
+import argparse
+import os
+import time
+from PIL import Image
+from app import create_app
+from image_encoding import encode_image, settings_from_config
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# 对照组为原来的无损 PNG 编码
+PRESETS = {
+    'png（原方案）': {'grayscale': False, 'threshold': None, 'max_edge': None, 'format': 'PNG', 'quality': None, 'max_bytes': None},
+    'jpeg q85 彩色': {'grayscale': False, 'threshold': None, 'max_edge': 1024, 'format': 'JPEG', 'quality': 85, 'max_bytes': None},
+    'jpeg q85 灰度': {'grayscale': True, 'threshold': None, 'max_edge': 1024, 'format': 'JPEG', 'quality': 85, 'max_bytes': None},
+    'webp q80 灰度': {'grayscale': True, 'threshold': None, 'max_edge': 1024, 'format': 'WEBP', 'quality': 80, 'max_bytes': None},
+    'png 二值化': {'grayscale': True, 'threshold': 128, 'max_edge': 1024, 'format': 'PNG', 'quality': None, 'max_bytes': None},
+    'jpeg 预算100KB': {'grayscale': True, 'threshold': None, 'max_edge': 1024, 'format': 'JPEG', 'quality': 85, 'max_bytes': 100 * 1024},
+}
+
+
+def collect_images(paths):
+    """展开目录，返回图片文件列表"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    files.append(os.path.join(path, name))
+        elif os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+def load_image(path):
+    """与分析接口相同的预处理：转 RGB 并确保最短边不小于 300px"""
+    from routes.calligraphy import resize_image_if_needed
+    image = Image.open(path)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return resize_image_if_needed(image)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI 分析图片编码基准测试')
+    parser.add_argument('paths', nargs='*', help='图片文件或目录')
+    parser.add_argument('--live', action='store_true', help='实际调用视觉模型并统计端到端耗时')
+    parser.add_argument('--repeat', type=int, default=3, help='每种配置重复编码次数，取平均耗时')
+    args = parser.parse_args()
+
+    app, _ = create_app()
+
+    with app.app_context():
+        presets = dict(PRESETS)
+        presets['当前配置'] = settings_from_config()
+        paths = args.paths or [os.path.join(app.config['UPLOAD_FOLDER'], 'works')]
+        files = collect_images(paths)
+        if not files:
+            print("未找到样例图片，请指定图片文件或目录")
+            return
+
+        if args.live:
+            from routes.calligraphy import request_doubao_analysis
+            vision_model = os.getenv("ARK_VISION_MODEL", "doubao-1.5-vision-pro-32k-250115")
+
+        print(f"共 {len(files)} 张样例图片，每种配置编码 {args.repeat} 次取平均\n")
+        totals = {name: {'bytes': 0, 'encode_ms': 0.0, 'e2e_ms': 0.0, 'errors': 0} for name in presets}
+        for path in files:
+            image = load_image(path)
+            print(f"{os.path.basename(path)}（{image.size[0]}x{image.size[1]}）")
+            baseline = None
+            for name, settings in presets.items():
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    encoded = encode_image(image, settings)
+                encode_ms = (time.perf_counter() - start) * 1000 / args.repeat
+                payload = len(encoded['data_url'])
+                baseline = baseline or payload
+                total = totals[name]
+                total['bytes'] += payload
+                total['encode_ms'] += encode_ms
+                line = (f"  {name:<14} {encoded['size'][0]:>5}x{encoded['size'][1]:<5} "
+                        f"载荷 {payload / 1024:>8.1f} KB（{payload / baseline:>6.1%}） 编码 {encode_ms:>7.1f} ms")
+                if args.live:
+                    start = time.perf_counter()
+                    try:
+                        request_doubao_analysis(image, vision_model, settings)
+                        e2e_ms = (time.perf_counter() - start) * 1000
+                        total['e2e_ms'] += e2e_ms
+                        line += f" 端到端 {e2e_ms:>8.1f} ms"
+                    except Exception as e:
+                        total['errors'] += 1
+                        line += f" 调用失败: {e}"
+                print(line)
+
+        print("\n汇总（平均每张）：")
+        count = len(files)
+        for name, total in totals.items():
+            line = f"  {name:<14} 载荷 {total['bytes'] / count / 1024:>8.1f} KB 编码 {total['encode_ms'] / count:>7.1f} ms"
+            if args.live:
+                succeeded = count - total['errors']
+                line += f" 端到端 {total['e2e_ms'] / succeeded:>8.1f} ms" if succeeded else " 端到端 -"
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
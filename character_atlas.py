@@ -0,0 +1,132 @@
+"""
+作品单字精灵图
+把一个作品的全部单字裁剪图按统一格子尺寸拼成一张图片，并生成单字ID -> 图中矩形的坐标表，
+读帖页一次请求即可拿到整个作品的单字图。
+精灵图与坐标表和作品衍生图放在一起：
+    uploads/works/derived/<原文件名去扩展名>_atlas_<版本>.webp / .json
+版本是作品图片、全部单字框与格子配置的哈希，单字增删或单字框修改后版本随之变化，
+下次访问时重新生成（并删除旧版本）；文件名带版本，可长期缓存。
+"""
+import glob
+import hashlib
+import json
+import math
+import os
+from flask import current_app
+from PIL import Image
+from models import db, Character
+from image_derivatives import DERIVED_FOLDER, crop_character, flatten_image
+import character_crops
+import single_flight
+
+
+def _settings():
+    config = current_app.config
+    return (
+        config.get('CHARACTER_ATLAS_CELL_SIZE', 96),
+        config.get('CHARACTER_ATLAS_PADDING', 4),
+        config.get('CHARACTER_ATLAS_QUALITY', 85)
+    )
+
+
+def _boxes(work):
+    """作品全部单字的 (id, x, y, width, height)，按ID排序"""
+    return db.session.query(
+        Character.id, Character.x, Character.y, Character.width, Character.height
+    ).filter(Character.work_id == work.id).order_by(Character.id).all()
+
+
+def atlas_version(work, boxes):
+    """精灵图版本：作品图片、单字框与格子配置任一变化都会改变"""
+    cell_size, padding, quality = _settings()
+    raw = json.dumps([
+        character_crops.CROP_VERSION, work.image_url, work.original_width, work.original_height,
+        cell_size, padding, quality, [list(box) for box in boxes]
+    ])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _paths(work, version):
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'works', DERIVED_FOLDER)
+    stem = os.path.splitext(work.image_url)[0]
+    name = f"{stem}_atlas_{version}"
+    return folder, stem, os.path.join(folder, f"{name}.webp"), os.path.join(folder, f"{name}.json")
+
+
+def get_atlas(work):
+    """
+    取作品的单字精灵图坐标表，不存在或已过期时生成
+
+    Returns:
+        dict: version, atlas_url, width, height, cell_size, characters（单字ID -> {x, y, width, height}）；
+        作品图片不存在时返回 None
+    """
+    boxes = _boxes(work)
+    version = atlas_version(work, boxes)
+    folder, stem, image_path, map_path = _paths(work, version)
+    if os.path.exists(map_path) and os.path.exists(image_path):
+        with open(map_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    # 同一作品同一版本的并发请求只生成一次
+    return single_flight.coalesce('atlas', (work.id, version), lambda: _build(work, boxes, version))
+
+
+def _build(work, boxes, version):
+    source = os.path.join(current_app.config['UPLOAD_FOLDER'], 'works', work.image_url)
+    if not os.path.exists(source):
+        return None
+    cell_size, padding, quality = _settings()
+    folder, stem, image_path, map_path = _paths(work, version)
+
+    crops = []
+    with Image.open(source) as image:
+        for box in boxes:
+            crop = crop_character(image, box, work)
+            if crop is not None:
+                crops.append((box.id, flatten_image(crop)))
+
+    # 接近正方形的网格，避免超长图片超出 WebP 的尺寸上限
+    columns = max(1, math.ceil(math.sqrt(len(crops))))
+    rows = max(1, math.ceil(len(crops) / columns))
+    atlas = Image.new('RGB', (columns * cell_size, rows * cell_size), (255, 255, 255))
+    inner = cell_size - 2 * padding
+    rects = {}
+    for index, (char_id, crop) in enumerate(crops):
+        # 等比缩放到格子内（小字放大、大字缩小），在格子中居中
+        scale = inner / max(crop.size)
+        width, height = max(1, round(crop.width * scale)), max(1, round(crop.height * scale))
+        left = (index % columns) * cell_size + (cell_size - width) // 2
+        top = (index // columns) * cell_size + (cell_size - height) // 2
+        atlas.paste(crop.resize((width, height), Image.LANCZOS), (left, top))
+        rects[str(char_id)] = {'x': left, 'y': top, 'width': width, 'height': height}
+
+    data = {
+        'work_id': work.id,
+        'version': version,
+        'atlas_url': f"/uploads/works/{DERIVED_FOLDER}/{os.path.basename(image_path)}",
+        'width': atlas.width,
+        'height': atlas.height,
+        'cell_size': cell_size,
+        'characters': rects
+    }
+
+    os.makedirs(folder, exist_ok=True)
+    # 先写临时文件再替换；坐标表最后写入，存在即表示精灵图完整
+    tmp_suffix = f".{os.getpid()}.tmp"
+    atlas.save(image_path + tmp_suffix, format='WEBP', quality=quality, method=4)
+    os.replace(image_path + tmp_suffix, image_path)
+    with open(map_path + tmp_suffix, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(map_path + tmp_suffix, map_path)
+    _remove_stale(folder, stem, version)
+    return data
+
+
+def _remove_stale(folder, stem, version):
+    """删除该作品旧版本的精灵图"""
+    for path in glob.glob(os.path.join(glob.escape(folder), glob.escape(stem) + '_atlas_*')):
+        if version not in os.path.basename(path) and not path.endswith('.tmp'):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"旧精灵图删除失败: {e}")
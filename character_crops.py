@@ -0,0 +1,106 @@
+"""
+单字裁剪图磁盘缓存
+按单字框从作品图片裁出单字（可加边距、缩放到目标尺寸），结果按
+单字ID + 作品图片 + 单字框 + 边距 + 尺寸 + 格式 计算缓存键，保存在
+CHARACTER_CROP_CACHE_FOLDER/<单字ID>/<缓存键>.<扩展名>。
+缓存键同时用作强 ETag：同一个键对应的图片内容固定不变。
+单字框修改或单字删除时整个 <单字ID> 目录失效；缓存键包含单字框，漏删的旧文件也不会被返回。
+"""
+import hashlib
+import os
+import shutil
+from flask import current_app
+from PIL import Image
+from image_derivatives import crop_character, flatten_image
+
+# 修改裁剪或编码逻辑时递增，使旧缓存全部失效
+CROP_VERSION = 1
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+}
+
+
+def cache_dir():
+    """裁剪图缓存目录，未配置时放在上传目录的 character_crops/ 下"""
+    return current_app.config.get('CHARACTER_CROP_CACHE_FOLDER') or \
+        os.path.join(current_app.config['UPLOAD_FOLDER'], 'character_crops')
+
+
+def snap_size(size):
+    """把请求的目标尺寸向上取到 CHARACTER_CROP_SIZES 中的档位，限制缓存文件的组合数"""
+    if not size:
+        return None
+    sizes = sorted(current_app.config.get('CHARACTER_CROP_SIZES', (64, 128, 256, 512)))
+    return next((s for s in sizes if s >= size), sizes[-1])
+
+
+def crop_key(character, work, padding=0, size=None, image_format='webp'):
+    """缓存键（十六进制字符串），同时作为强 ETag"""
+    raw = '|'.join(str(part) for part in (
+        CROP_VERSION, character.id, work.image_url, work.original_width, work.original_height,
+        character.x, character.y, character.width, character.height,
+        padding, size or 0, image_format, current_app.config.get('CHARACTER_CROP_QUALITY', 85)
+    ))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def get_crop(character, work, padding=0, size=None, image_format='webp'):
+    """
+    取单字裁剪图，缓存未命中时生成并写入磁盘
+
+    Args:
+        character: 单字
+        work: 单字所属作品
+        padding: 边距（与单字坐标同一尺度的像素）
+        size: 目标尺寸（最长边像素，已按档位取整），None 表示保持原尺寸
+        image_format: webp / jpeg / png
+
+    Returns:
+        (文件路径, 缓存键)；作品图片不存在或单字框超出图片范围时返回 (None, None)
+    """
+    key = crop_key(character, work, padding, size, image_format)
+    folder = os.path.join(cache_dir(), str(character.id))
+    path = os.path.join(folder, f"{key}.{image_format}")
+    if os.path.exists(path):
+        return path, key
+
+    source = os.path.join(current_app.config['UPLOAD_FOLDER'], 'works', work.image_url)
+    if not os.path.exists(source):
+        return None, None
+    with Image.open(source) as image:
+        crop = crop_character(image, character, work, padding=padding)
+        if crop is None:
+            return None, None
+        crop = flatten_image(crop)
+    if size and max(crop.size) != size:
+        # 缩略图也可能放大：单字框通常只有几十像素
+        scale = size / max(crop.size)
+        crop = crop.resize((max(1, round(crop.width * scale)), max(1, round(crop.height * scale))), Image.LANCZOS)
+
+    os.makedirs(folder, exist_ok=True)
+    pil_format = FORMATS[image_format][0]
+    quality = current_app.config.get('CHARACTER_CROP_QUALITY', 85)
+    # 先写临时文件再替换，并发请求同一裁剪图时不会读到半个文件
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if pil_format == 'PNG':
+        crop.save(tmp_path, format='PNG')
+    else:
+        crop.save(tmp_path, format=pil_format, quality=quality)
+    os.replace(tmp_path, path)
+    return path, key
+
+
+def crop_url(character):
+    """单字裁剪图 URL，v 参数随单字框变化，单字框修改后浏览器缓存自然失效"""
+    box = f"{character.x},{character.y},{character.width},{character.height}"
+    version = hashlib.sha1(box.encode('utf-8')).hexdigest()[:8]
+    return f"/api/works/characters/{character.id}/image?v={version}"
+
+
+def invalidate(character_id):
+    """删除某个单字的全部裁剪图缓存"""
+    folder = os.path.join(cache_dir(), str(character_id))
+    shutil.rmtree(folder, ignore_errors=True)
@@ -13,8 +13,121 @@ class Config:
     # 上传文件配置
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+
+    # 上传图片衍生图：各子目录的尺寸档位（最长边像素）、保存格式与质量；
+    # 衍生图文件名不变、内容只在重建时变化，浏览器缓存 IMAGE_DERIVATIVE_CACHE_MAX_AGE 秒
+    IMAGE_DERIVATIVE_SIZES = {
+        'works': {'thumb': 320, 'medium': 640, 'large': 800},
+        'avatars': {'thumb': 64, 'medium': 200},
+    }
+    IMAGE_DERIVATIVE_FORMATS = ('WEBP', 'JPEG')
+    IMAGE_DERIVATIVE_QUALITY = 80
+    IMAGE_DERIVATIVE_CACHE_MAX_AGE = 7 * 24 * 3600
+
+    # 单字裁剪图：目标尺寸档位（最长边像素）、最大边距、编码质量与浏览器缓存时间（秒）；
+    # 缓存目录默认为 UPLOAD_FOLDER/character_crops
+    CHARACTER_CROP_SIZES = (64, 128, 256, 512)
+    CHARACTER_CROP_MAX_PADDING = 50
+    CHARACTER_CROP_QUALITY = 85
+    CHARACTER_CROP_CACHE_MAX_AGE = 24 * 3600
+
+    # 作品单字精灵图：格子边长（像素）、格子内边距与 WebP 质量
+    CHARACTER_ATLAS_CELL_SIZE = 96
+    CHARACTER_ATLAS_PADDING = 4
+    CHARACTER_ATLAS_QUALITY = 85
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 
+    # 单字 NDJSON 导出每批读取的行数
+    CHARACTER_EXPORT_BATCH_SIZE = 500
+
+    # 搜索记录写缓冲：队列上限、每批写入条数、刷新间隔（秒）
+    SEARCH_LOG_QUEUE_SIZE = 10000
+    SEARCH_LOG_BATCH_SIZE = 200
+    SEARCH_LOG_FLUSH_INTERVAL = 5
+
+    # 搜索记录与热门词汇总的保留天数、清理间隔（秒）
+    SEARCH_LOG_RETENTION_DAYS = 30
+    SEARCH_LOG_PRUNE_INTERVAL = 3600
+
+    # 热门搜索词缓存：每个统计天数缓存前 K 个（也是接口 limit 的上限），缓存有效期（秒）
+    HOT_KEYWORDS_TOP_K = 20
+    HOT_KEYWORDS_CACHE_TTL = 60
+
+    # 单字注释关键点汇总：聚类半径（归一化坐标）、每个共识点的提示条数、参与汇总的最大注释数与最大关键点数、缓存有效期（秒）
+    ANNOTATION_CLUSTER_RADIUS = 0.08
+    ANNOTATION_CLUSTER_TIPS = 3
+    ANNOTATION_STATS_MAX_ANNOTATIONS = 500
+    ANNOTATION_STATS_MAX_POINTS = 5000
+    ANNOTATION_STATS_CACHE_TTL = 600
+
+    # OCR 结果缓存（json_temp/ocr_<哈希>.json）最多保留的条目数，超出后淘汰最久未用的
+    OCR_CACHE_MAX_ENTRIES = 1000
+
+    # 古籍 OCR 接口地址与 HTTP 客户端：超时（秒）、重试次数、连接池大小、熔断阈值（连续失败次数）与冷却时间（秒）
+    OCR_API_URL = os.environ.get('OCR_API_URL') or 'https://ocr.kandianguji.com/ocr_api'
+    OCR_HTTP_TIMEOUT = 30
+    OCR_HTTP_RETRIES = 2
+    OCR_HTTP_POOL_SIZE = 10
+    OCR_CIRCUIT_FAILURE_THRESHOLD = 5
+    OCR_CIRCUIT_RESET_TIMEOUT = 30
+
+    # 异步 OCR 任务：线程池大小、每个用户同时进行中的任务数、排队总数上限、已结束任务保留时间（小时）
+    OCR_JOB_WORKERS = 4
+    OCR_JOB_MAX_PER_USER = 2
+    OCR_JOB_QUEUE_SIZE = 100
+    OCR_JOB_RETENTION_HOURS = 24
+
+    # 大图分块识别：最长边超过触发尺寸时切成边长 OCR_TILE_SIZE、相互重叠 OCR_TILE_OVERLAP 像素的分块并发识别，
+    # 并发数为 OCR_TILE_WORKERS；字符框距分块内侧边缘不足 OCR_TILE_EDGE_MARGIN 像素视为被截断
+    OCR_TILE_TRIGGER_SIZE = 4096
+    OCR_TILE_SIZE = 2048
+    OCR_TILE_OVERLAP = 256
+    OCR_TILE_WORKERS = 4
+    OCR_TILE_EDGE_MARGIN = 4
+
+    # 豆包模型共享客户端：读取超时与连接超时（秒）、连接池上限、保持的空闲连接数、SDK 重试次数
+    ARK_HTTP_TIMEOUT = 60
+    ARK_CONNECT_TIMEOUT = 5
+    ARK_MAX_CONNECTIONS = 20
+    ARK_MAX_KEEPALIVE_CONNECTIONS = 10
+    ARK_MAX_RETRIES = 2
+
+    # AI 单字分析结果缓存：感知哈希汉明距离阈值（0 只接受完全相同的哈希）、有效期（秒）、最多条目数
+    ANALYSIS_CACHE_HAMMING_THRESHOLD = 4
+    ANALYSIS_CACHE_TTL = 7 * 24 * 3600
+    ANALYSIS_CACHE_MAX_ENTRIES = 2000
+
+    # 并发相同请求合并（AI 分析、OCR）：等待首个请求结果的最长时间（秒）、成功结果的保留时间（秒）
+    SINGLE_FLIGHT_WAIT_TIMEOUT = 120
+    SINGLE_FLIGHT_RESULT_WINDOW = 2
+
+    # AI 分析图片编码：是否转灰度、二值化阈值（0-255，None 不二值化）、最长边像素、
+    # 编码格式（JPEG/WEBP/PNG）与质量、字节预算（超出时先降质量再缩小，None 不限制）
+    ANALYZE_IMAGE_GRAYSCALE = True
+    ANALYZE_IMAGE_THRESHOLD = None
+    ANALYZE_IMAGE_MAX_EDGE = 1024
+    ANALYZE_IMAGE_FORMAT = 'JPEG'
+    ANALYZE_IMAGE_QUALITY = 85
+    ANALYZE_IMAGE_MAX_BYTES = 300 * 1024
+
+    # 作品单字批量分析：同时执行的任务数、每个任务并发分析的单字数、
+    # 整个进程调用视觉模型的速率（次/秒）与突发上限（令牌桶容量）
+    ANALYSIS_BATCH_JOB_WORKERS = 2
+    ANALYSIS_BATCH_CONCURRENCY = 4
+    ANALYSIS_BATCH_RATE = 2
+    ANALYSIS_BATCH_BURST = 4
+
+    # 外部 AI 调用用量统计：快照写入间隔（秒）；费用估算单价（元），
+    # 模型按 (输入, 输出) 每千 tokens 计价，OCR 按次计价，请按实际计费标准调整
+    USAGE_SNAPSHOT_INTERVAL = 300
+    AI_MODEL_PRICES = {
+        'doubao-1.5-vision-pro-32k-250115': (0.003, 0.009),
+    }
+    OCR_PRICE_PER_CALL = 0.0
+
+    # 管理员邮箱（逗号分隔），可访问 /api/admin 下的统计接口
+    ADMIN_EMAILS = [email.strip() for email in (os.environ.get('ADMIN_EMAILS') or '').split(',') if email.strip()]
+
     # JWT 配置
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
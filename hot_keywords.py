@@ -0,0 +1,142 @@
+"""
+热门搜索词统计
+搜索记录批量写入时按天累加到 search_keyword_stats 汇总表，热门词接口最多汇总 N 天的数据，
+不再对原始 search_logs 做 GROUP BY；结果在进程内按短 TTL 缓存。
+原始搜索记录与汇总数据超过保留期后分批删除。
+"""
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select, delete, update, insert
+from sqlalchemy.dialects import sqlite, postgresql
+from models import db, SearchLog, SearchKeywordStat
+
+# days -> (过期时间, 前 K 个热门词)
+_cache = {}
+_cache_lock = threading.Lock()
+
+_UPSERT_DIALECTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def record_keyword_stats(connection, rows):
+    """
+    将一批搜索记录累加到按天汇总表，与搜索记录写入在同一事务中执行
+
+    Args:
+        connection: 当前事务的数据库连接
+        rows: 搜索记录字典列表（含 keyword 与 created_at）
+    """
+    counts = Counter((row['created_at'].date(), row['keyword']) for row in rows)
+    if not counts:
+        return
+    table = SearchKeywordStat.__table__
+    values = [
+        {'bucket': bucket, 'keyword': keyword, 'count': count}
+        for (bucket, keyword), count in counts.items()
+    ]
+    dialect_insert = _UPSERT_DIALECTS.get(connection.dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(table).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['bucket', 'keyword'],
+            set_={'count': table.c.count + stmt.excluded['count']}
+        )
+        connection.execute(stmt)
+        return
+    # 其他数据库：逐条先更新，不存在再插入
+    for value in values:
+        result = connection.execute(
+            update(table).where(
+                table.c.bucket == value['bucket'],
+                table.c.keyword == value['keyword']
+            ).values(count=table.c.count + value['count'])
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(value))
+
+
+def get_hot_keywords(days=7, limit=10):
+    """
+    获取最近 days 天（含今天，UTC）的热门搜索词
+
+    每个 days 只查询并缓存前 HOT_KEYWORDS_TOP_K 个结果，limit 在缓存上截取，
+    超过 HOT_KEYWORDS_TOP_K 时按 HOT_KEYWORDS_TOP_K 处理，缓存内容与本次请求的 limit 无关。
+
+    Returns:
+        list: [{'keyword': ..., 'count': ...}]，按搜索次数降序
+    """
+    top_k = current_app.config.get('HOT_KEYWORDS_TOP_K', 20)
+    limit = min(limit, top_k)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(days)
+    if cached and cached[0] > now:
+        return cached[1][:limit]
+
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    total = func.sum(SearchKeywordStat.count).label('count')
+    rows = db.session.query(SearchKeywordStat.keyword, total).filter(
+        SearchKeywordStat.bucket >= start
+    ).group_by(
+        SearchKeywordStat.keyword
+    ).order_by(
+        total.desc(), SearchKeywordStat.keyword
+    ).limit(top_k).all()
+    keywords = [{'keyword': row.keyword, 'count': int(row.count)} for row in rows]
+
+    ttl = current_app.config.get('HOT_KEYWORDS_CACHE_TTL', 60)
+    with _cache_lock:
+        _cache[days] = (now + ttl, keywords)
+    return keywords[:limit]
+
+
+def clear_cache():
+    """清空热门词缓存"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def prune_search_logs(retention_days=30, batch_size=1000):
+    """
+    分批删除超过保留期的原始搜索记录和汇总数据，每批单独提交，避免长时间持有写锁
+
+    Returns:
+        int: 删除的原始搜索记录数
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        ids = select(SearchLog.id).where(SearchLog.created_at < cutoff).limit(batch_size)
+        result = db.session.execute(delete(SearchLog).where(SearchLog.id.in_(ids)))
+        db.session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            break
+    db.session.execute(delete(SearchKeywordStat).where(SearchKeywordStat.bucket < cutoff.date()))
+    db.session.commit()
+    return deleted
+
+
+def rebuild_keyword_stats():
+    """
+    清空汇总表并按原始搜索记录重新汇总
+
+    Returns:
+        int: 汇总后的行数
+    """
+    db.session.execute(delete(SearchKeywordStat))
+    bucket = func.date(SearchLog.created_at)
+    db.session.execute(
+        insert(SearchKeywordStat).from_select(
+            ['bucket', 'keyword', 'count'],
+            select(bucket, SearchLog.keyword, func.count(SearchLog.id)).group_by(bucket, SearchLog.keyword)
+        )
+    )
+    db.session.commit()
+    clear_cache()
+    return SearchKeywordStat.query.count()
@@ -0,0 +1,222 @@
+"""
+外部服务 HTTP 客户端
+每个外部服务（如古籍 OCR）共用一个 requests.Session，复用 keep-alive 连接池；
+超时、连接失败和 5xx 响应按抖动指数退避有限重试；连续失败达到阈值后熔断，
+熔断期间直接失败，冷却后放行一个试探请求，成功即恢复。
+每个服务记录请求数、错误数、重试数与延迟分布，可通过 /health/providers 查看。
+"""
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# 延迟分布的桶上界（毫秒），最后一个桶为 +Inf
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+RETRY_STATUS = frozenset({500, 502, 503, 504})
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """熔断期间直接拒绝请求"""
+
+
+class LatencyHistogram:
+    """累计延迟分布（线程安全）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if ms <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.total += 1
+            self.sum_ms += ms
+
+    def to_dict(self):
+        with self._lock:
+            counts = list(self.counts)
+            total, sum_ms = self.total, self.sum_ms
+        labels = [f'le_{bound}' for bound in self.buckets] + ['le_inf']
+        return {
+            'count': total,
+            'avg_ms': round(sum_ms / total, 1) if total else 0,
+            'buckets': dict(zip(labels, counts))
+        }
+
+
+class CircuitBreaker:
+    """连续失败计数熔断器：closed -> open -> half_open -> closed"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """是否放行本次请求"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._trial_in_flight = False
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """试探请求既非成功也非服务故障（如请求参数错误）时，允许下一个请求继续试探"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class ProviderClient:
+    """单个外部服务的 HTTP 客户端"""
+
+    def __init__(self, name, timeout=30, retries=2, backoff=0.5, backoff_max=5,
+                 pool_size=10, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyHistogram()
+        self.counters = {'requests': 0, 'success': 0, 'errors': 0, 'retries': 0, 'rejected': 0}
+        self._counter_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._counter_lock:
+            self.counters[key] += 1
+
+    def _sleep_before_retry(self, attempt):
+        # 全抖动退避：[0, min(上限, 基数 * 2^attempt)] 内随机
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt))))
+
+    def request(self, method, url, **kwargs):
+        """
+        发送请求，失败时按策略重试
+
+        Returns:
+            requests.Response: 最终响应（非 5xx 的错误状态码原样返回，由调用方 raise_for_status）
+
+        Raises:
+            CircuitOpenError: 熔断中
+            requests.exceptions.RequestException: 重试用尽后的最后一次错误
+        """
+        if not self.breaker.allow():
+            self._count('rejected')
+            raise CircuitOpenError(f'{self.name} 服务暂不可用（熔断中）')
+
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.retries + 1):
+            self._count('requests')
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                self.latency.observe((time.perf_counter() - start) * 1000)
+                self._count('errors')
+                if attempt < self.retries:
+                    self._count('retries')
+                    self._sleep_before_retry(attempt)
+                    continue
+                self.breaker.record_failure()
+                raise
+            except requests.exceptions.RequestException:
+                # 请求本身有误（如 URL 非法），重试无意义，也不计入熔断
+                self._count('errors')
+                self.breaker.release()
+                raise
+            self.latency.observe((time.perf_counter() - start) * 1000)
+
+            if response.status_code in RETRY_STATUS:
+                self._count('errors')
+                if attempt < self.retries:
+                    self._count('retries')
+                    response.close()
+                    self._sleep_before_retry(attempt)
+                    continue
+                self.breaker.record_failure()
+                return response
+
+            self._count('success')
+            self.breaker.record_success()
+            return response
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def metrics(self):
+        """当前计数、熔断状态与延迟分布"""
+        with self._counter_lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'latency': self.latency.to_dict()
+        }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name, **options):
+    """
+    获取（首次调用时创建）某个外部服务的共享客户端
+
+    Args:
+        name: 服务名，同名共用一个客户端
+        options: 首次创建时使用的 ProviderClient 参数
+    """
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = ProviderClient(name, **options)
+                _clients[name] = client
+    return client
+
+
+def provider_metrics():
+    """所有外部服务的指标"""
+    return {name: client.metrics() for name, client in list(_clients.items())}
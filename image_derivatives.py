@@ -0,0 +1,200 @@
+"""
+上传图片多尺寸衍生图
+作品图片与头像上传时按 IMAGE_DERIVATIVE_SIZES 生成固定几档尺寸（如 thumb/medium/large），
+每档以 IMAGE_DERIVATIVE_FORMATS（默认 WebP 与 JPEG）各保存一份，放在原图所在目录的 derived/ 下：
+    uploads/<子目录>/derived/<原文件名去扩展名>_<尺寸>.<webp|jpg>
+文件名由原图文件名确定，序列化时直接拼出 URL，不需要额外字段；缺失的衍生图在首次访问时补生成，
+已有上传可用 rebuild_image_derivatives.py 批量重建。
+flatten_image / crop_character 也供单字裁剪图、精灵图与批量分析使用。
+"""
+import glob
+import os
+import re
+from flask import current_app
+from PIL import Image, ImageOps
+
+DERIVED_FOLDER = 'derived'
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+DEFAULT_SIZES = {
+    'works': {'thumb': 320, 'medium': 640, 'large': 800},
+    'avatars': {'thumb': 64, 'medium': 200},
+}
+
+# derived/ 下的文件名：<原文件名去扩展名>_<尺寸>.<扩展名>
+_DERIVED_PATTERN = re.compile(r'^(?P<subfolder>[\w-]+)/' + DERIVED_FOLDER + r'/(?P<stem>[\w.-]+)_(?P<size>[a-z]+)\.(?P<ext>webp|jpg)$')
+
+
+def _config():
+    config = current_app.config
+    return (
+        config.get('IMAGE_DERIVATIVE_SIZES', DEFAULT_SIZES),
+        config.get('IMAGE_DERIVATIVE_FORMATS', ('WEBP', 'JPEG')),
+        config.get('IMAGE_DERIVATIVE_QUALITY', 80)
+    )
+
+
+def _stem(filename):
+    return os.path.splitext(filename)[0]
+
+
+def derivative_name(filename, size, image_format):
+    """衍生图文件名（相对于 derived/ 目录）"""
+    return f"{_stem(filename)}_{size}.{EXTENSIONS[image_format.upper()]}"
+
+
+def derivative_urls(filename, subfolder):
+    """
+    衍生图 URL
+
+    Returns:
+        dict: 尺寸 -> {格式扩展名: URL}，如 {'thumb': {'webp': ..., 'jpg': ...}}；
+        没有文件名或该子目录未配置衍生图时返回 None
+    """
+    sizes, formats, _ = _config()
+    if not filename or subfolder not in sizes:
+        return None
+    return {
+        size: {
+            EXTENSIONS[image_format.upper()]: f"/uploads/{subfolder}/{DERIVED_FOLDER}/{derivative_name(filename, size, image_format)}"
+            for image_format in formats
+        }
+        for size in sizes[subfolder]
+    }
+
+
+def flatten_image(image):
+    """转为可保存为 JPEG/WebP 的 RGB 或 L 图，透明区域填充白色"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    if image.mode not in ('RGB', 'L'):
+        return image.convert('RGB')
+    return image
+
+
+def crop_character(image, character, work, padding=0):
+    """
+    从作品图片裁剪单字
+
+    单字坐标基于保存作品时记录的图片尺寸（original_width/original_height），
+    与实际图片尺寸不一致时按比例换算。
+
+    Args:
+        padding: 四周额外保留的边距（与单字坐标同一尺度的像素），超出图片的部分截掉
+
+    Returns:
+        PIL Image对象，区域超出图片范围时返回 None
+    """
+    width, height = image.size
+    scale_x = width / work.original_width if work.original_width else 1
+    scale_y = height / work.original_height if work.original_height else 1
+    left = max(0, int(round((character.x - padding) * scale_x)))
+    top = max(0, int(round((character.y - padding) * scale_y)))
+    right = min(width, int(round((character.x + character.width + padding) * scale_x)))
+    bottom = min(height, int(round((character.y + character.height + padding) * scale_y)))
+    if right <= left or bottom <= top:
+        return None
+    return image.crop((left, top, right, bottom))
+
+
+def _save(image, path, image_format, quality):
+    # 先写临时文件再替换，并发补生成同一张衍生图时不会读到半个文件
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if image_format == 'WEBP':
+        image.save(tmp_path, format='WEBP', quality=quality, method=4)
+    else:
+        image.save(tmp_path, format='JPEG', quality=quality, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+
+
+def generate_derivatives(filename, subfolder, overwrite=True, only=None):
+    """
+    为一张上传图片生成全部衍生图
+
+    Args:
+        filename: 原图文件名
+        subfolder: 子目录（works / avatars）
+        overwrite: 是否覆盖已存在的衍生图
+        only: 只生成指定的 (尺寸, 格式) 时传入，供按需补生成使用
+
+    Returns:
+        list: 新写入的衍生图路径
+    """
+    sizes, formats, quality = _config()
+    if subfolder not in sizes:
+        return []
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder)
+    source = os.path.join(folder, filename)
+    target_folder = os.path.join(folder, DERIVED_FOLDER)
+    os.makedirs(target_folder, exist_ok=True)
+
+    written = []
+    with Image.open(source) as image:
+        image = flatten_image(image)
+        for size, max_edge in sizes[subfolder].items():
+            targets = []
+            for image_format in formats:
+                image_format = image_format.upper()
+                if only is not None and (size, image_format) != only:
+                    continue
+                path = os.path.join(target_folder, derivative_name(filename, size, image_format))
+                if overwrite or not os.path.exists(path):
+                    targets.append((path, image_format))
+            if not targets:
+                continue
+            # 按最长边缩放，竖幅长卷的缩略图也不会过大；不放大小图
+            resized = image.copy()
+            resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            for path, image_format in targets:
+                _save(resized, path, image_format, quality)
+                written.append(path)
+    return written
+
+
+def delete_derivatives(filename, subfolder):
+    """删除一张上传图片的全部衍生图"""
+    if not filename:
+        return
+    target_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder, DERIVED_FOLDER)
+    for path in glob.glob(os.path.join(glob.escape(target_folder), glob.escape(_stem(filename)) + '_*')):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"衍生图删除失败: {e}")
+
+
+def ensure_derivative(relative_path):
+    """
+    按需补生成缺失的衍生图
+
+    Args:
+        relative_path: 相对 UPLOAD_FOLDER 的路径（/uploads/ 之后的部分）
+
+    Returns:
+        bool: 衍生图已存在或补生成成功
+    """
+    match = _DERIVED_PATTERN.match(relative_path)
+    if not match:
+        return False
+    sizes, formats, _ = _config()
+    subfolder, stem, size = match.group('subfolder'), match.group('stem'), match.group('size')
+    image_format = next((f.upper() for f in formats if EXTENSIONS.get(f.upper()) == match.group('ext')), None)
+    if size not in sizes.get(subfolder, {}) or image_format is None:
+        return False
+
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder)
+    sources = [path for path in glob.glob(os.path.join(glob.escape(folder), glob.escape(stem) + '.*'))
+               if not path.endswith('.tmp')]
+    if not sources:
+        return False
+    try:
+        generate_derivatives(os.path.basename(sources[0]), subfolder, overwrite=False, only=(size, image_format))
+    except Exception as e:
+        print(f"衍生图生成失败 {relative_path}: {e}")
+        return False
+    return os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], relative_path))
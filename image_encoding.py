@@ -0,0 +1,106 @@
+"""
+视觉模型图片编码
+把待分析的单字图片按配置压缩后再 base64 编码：可转灰度、按阈值二值化、限制最长边，
+以 JPEG / WebP / PNG 编码，并尽量控制在字节预算内（先降低质量，再逐步缩小尺寸）。
+模型返回的关键点坐标是 0-1 的相对坐标，缩放不影响结果。
+"""
+import base64
+import io
+from flask import current_app
+from PIL import Image
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+
+# 超出字节预算时依次尝试的最低质量与每次缩小的比例
+MIN_QUALITY = 40
+QUALITY_STEP = 10
+SHRINK_RATIO = 0.8
+# 缩小时最短边不低于该值（与 resize_image_if_needed 的要求一致）
+MIN_SIDE = 300
+
+
+def settings_from_config(config=None):
+    """读取编码配置"""
+    config = config if config is not None else current_app.config
+    return {
+        'grayscale': config.get('ANALYZE_IMAGE_GRAYSCALE', True),
+        'threshold': config.get('ANALYZE_IMAGE_THRESHOLD'),
+        'max_edge': config.get('ANALYZE_IMAGE_MAX_EDGE', 1024),
+        'format': config.get('ANALYZE_IMAGE_FORMAT', 'JPEG'),
+        'quality': config.get('ANALYZE_IMAGE_QUALITY', 85),
+        'max_bytes': config.get('ANALYZE_IMAGE_MAX_BYTES', 300 * 1024)
+    }
+
+
+def _prepare(image, settings):
+    """颜色转换与尺寸限制"""
+    if settings['threshold'] is not None:
+        threshold = int(settings['threshold'])
+        image = image.convert('L').point(lambda v: 255 if v >= threshold else 0)
+        # 二值图用 PNG 保存为 1 位图，体积最小
+        if settings['format'].upper() == 'PNG':
+            image = image.convert('1')
+    elif settings['grayscale']:
+        image = image.convert('L')
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    max_edge = settings['max_edge']
+    if max_edge and max(image.size) > max_edge:
+        image = image.copy()
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    return image
+
+
+def _save(image, image_format, quality):
+    buffer = io.BytesIO()
+    if image_format == 'PNG':
+        image.save(buffer, format='PNG')
+    elif image_format == 'WEBP':
+        image.save(buffer, format='WEBP', quality=quality, method=4)
+    else:
+        if image.mode == '1':
+            image = image.convert('L')
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def encode_image(image, settings=None):
+    """
+    按配置编码图片
+
+    Args:
+        image: PIL Image对象
+        settings: 编码配置，缺省读取 app 配置（见 settings_from_config）
+
+    Returns:
+        dict: {data_url, mime_type, bytes, size: [宽, 高], quality}
+    """
+    settings = settings or settings_from_config()
+    image_format = settings['format'].upper()
+    if image_format not in MIME_TYPES:
+        raise ValueError(f'不支持的图片编码格式: {settings["format"]}')
+    image = _prepare(image, settings)
+    quality = settings['quality']
+    budget = settings['max_bytes']
+
+    data = _save(image, image_format, quality)
+    if budget:
+        # 先降低质量（PNG 无损，跳过）
+        while len(data) > budget and image_format != 'PNG' and quality - QUALITY_STEP >= MIN_QUALITY:
+            quality -= QUALITY_STEP
+            data = _save(image, image_format, quality)
+        # 再逐步缩小尺寸
+        while len(data) > budget and min(image.size) * SHRINK_RATIO >= MIN_SIDE:
+            width, height = image.size
+            image = image.resize((int(width * SHRINK_RATIO), int(height * SHRINK_RATIO)), Image.LANCZOS)
+            data = _save(image, image_format, quality)
+
+    mime_type = MIME_TYPES[image_format]
+    return {
+        'data_url': f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}",
+        'mime_type': mime_type,
+        'bytes': len(data),
+        'size': list(image.size),
+        'quality': quality if image_format != 'PNG' else None
+    }
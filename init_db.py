@@ -4,6 +4,8 @@
 """
 from app import create_app
 from models import db, User, Work, Follow, Topic, Notification, Post, PostLike, PostComment, Checkin, FollowTopic, Character, CharacterSet, CharacterInSet, SearchLog
+from search_index import rebuild_search_index
+from migrate_annotations import migrate_annotations
 from datetime import datetime
 
 def init_db():
@@ -19,6 +21,12 @@ def init_db():
         print("正在创建新表...")
         db.create_all()
 
+        # 创建并清空全文索引（drop_all 不会删除 FTS 虚拟表）
+        rebuild_search_index()
+
+        # 导入 calligraphy_annotations/ 目录下的注释文件
+        migrate_annotations()
+
         # 创建测试用户
         print("正在创建测试数据...")
         admin = User(
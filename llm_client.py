@@ -0,0 +1,193 @@
+"""
+豆包（火山方舟）模型客户端
+进程内共用一个 OpenAI 兼容客户端，底层 httpx 连接池在请求和线程间复用，
+连接数上限与超时取自配置；API Key、Base URL 或连接参数变化时才重建客户端。
+每个模型分别记录请求数、错误数、首字节时间（TTFB）与总耗时分布，可通过 /health/providers 查看；
+每次调用的耗时、请求/响应字节数与 token 用量同时计入 usage_stats。
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app
+from http_client import LatencyHistogram
+from usage_stats import usage_stats
+
+# 尝试导入OpenAI客户端
+try:
+    from openai import OpenAI
+    import httpx
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+DEFAULT_BASE_URL = 'https://ark.cn-beijing.volces.com/api/v3'
+
+_client = None
+_client_settings = None
+_client_lock = threading.Lock()
+
+# 当前线程正在调用的模型、本次 HTTP 请求的发出时间与收到的响应，供 httpx 事件钩子记录首字节时间与响应字节数
+_local = threading.local()
+
+
+class ModelMetrics:
+    """单个模型的调用指标"""
+
+    def __init__(self):
+        self.ttfb = LatencyHistogram()
+        self.latency = LatencyHistogram()
+        self.counters = {'requests': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def to_dict(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, 'ttfb': self.ttfb.to_dict(), 'latency': self.latency.to_dict()}
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def _metrics_for(model):
+    metrics = _metrics.get(model)
+    if metrics is None:
+        with _metrics_lock:
+            metrics = _metrics.setdefault(model, ModelMetrics())
+    return metrics
+
+
+def _on_request(request):
+    _local.sent_at = time.perf_counter()
+    try:
+        _local.request_bytes = getattr(_local, 'request_bytes', 0) + len(request.content)
+    except Exception:
+        pass
+
+
+def _on_response(response):
+    # 响应头到达时触发，此时响应体尚未读取，字节数在调用结束后统计
+    model = getattr(_local, 'model', None)
+    sent_at = getattr(_local, 'sent_at', None)
+    if model and sent_at is not None:
+        _metrics_for(model).ttfb.observe((time.perf_counter() - sent_at) * 1000)
+    if model:
+        _local.responses.append(response)
+
+
+def _response_bytes(response):
+    """
+    响应体字节数（解码后）
+
+    分块传输的响应没有 Content-Length，读取完毕后按实际内容计算；
+    流式响应未完整读取时退回 Content-Length，两者都没有时计为 0（未知）。
+    """
+    try:
+        return len(response.content)
+    except httpx.ResponseNotRead:
+        pass
+    try:
+        return int(response.headers.get('content-length', 0))
+    except ValueError:
+        return 0
+
+
+def _settings():
+    """决定客户端的全部配置，任一项变化都需要重建客户端"""
+    config = current_app.config
+    return (
+        os.getenv('ARK_API_KEY'),
+        os.getenv('ARK_BASE_URL', DEFAULT_BASE_URL),
+        config.get('ARK_HTTP_TIMEOUT', 60),
+        config.get('ARK_CONNECT_TIMEOUT', 5),
+        config.get('ARK_MAX_CONNECTIONS', 20),
+        config.get('ARK_MAX_KEEPALIVE_CONNECTIONS', 10),
+        config.get('ARK_MAX_RETRIES', 2)
+    )
+
+
+def _build_client(settings):
+    api_key, base_url, timeout, connect_timeout, max_connections, max_keepalive, max_retries = settings
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+        event_hooks={'request': [_on_request], 'response': [_on_response]}
+    )
+    return OpenAI(base_url=base_url, api_key=api_key, max_retries=max_retries, http_client=http_client)
+
+
+def get_client():
+    """
+    获取共享的豆包客户端（首次调用或配置变化时创建）
+
+    Raises:
+        RuntimeError: 未安装 openai
+        ValueError: 未配置 ARK_API_KEY
+    """
+    global _client, _client_settings
+    if not OPENAI_AVAILABLE:
+        raise RuntimeError("OpenAI客户端未安装")
+    settings = _settings()
+    if not settings[0]:
+        raise ValueError("未配置 ARK_API_KEY 环境变量")
+
+    client = _client
+    if client is None or _client_settings != settings:
+        with _client_lock:
+            if _client is None or _client_settings != settings:
+                # 旧客户端可能仍被其他线程的请求使用，不主动关闭，由垃圾回收释放连接
+                _client = _build_client(settings)
+                _client_settings = settings
+            client = _client
+    return client
+
+
+@contextmanager
+def track(model, endpoint='chat.completions'):
+    """
+    记录一次模型调用的指标与用量
+
+    用法：
+        with track(model) as call:
+            response = client.chat.completions.create(model=model, ...)
+            call['usage'] = response.usage
+    """
+    metrics = _metrics_for(model)
+    metrics.count('requests')
+    _local.model = model
+    _local.request_bytes = 0
+    _local.responses = []
+    call = {'usage': None}
+    outcome = 'success'
+    start = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        metrics.count('errors')
+        outcome = type(e).__name__
+        raise
+    finally:
+        latency_ms = (time.perf_counter() - start) * 1000
+        metrics.latency.observe(latency_ms)
+        usage = call['usage']
+        usage_stats.record(
+            'ark', endpoint, model, latency_ms,
+            request_bytes=_local.request_bytes,
+            response_bytes=sum(_response_bytes(response) for response in _local.responses),
+            prompt_tokens=getattr(usage, 'prompt_tokens', 0),
+            completion_tokens=getattr(usage, 'completion_tokens', 0),
+            outcome=outcome
+        )
+        _local.model = None
+        _local.sent_at = None
+        _local.responses = []
+
+
+def model_metrics():
+    """所有模型的调用指标"""
+    return {model: metrics.to_dict() for model, metrics in list(_metrics.items())}
@@ -0,0 +1,75 @@
+"""
+注释数据迁移脚本
+将 calligraphy_annotations/ 目录下的 JSON 文件导入 annotations 表，已导入的文件（按文件名）自动跳过，
+可重复执行。导入后原文件保留不动。
+"""
+import json
+import os
+import sys
+from datetime import datetime
+from app import create_app
+from models import db, Annotation, parse_timestamp
+
+ANNOTATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calligraphy_annotations')
+
+
+def migrate_annotations(source_dir=ANNOTATIONS_DIR, batch_size=200):
+    """
+    导入注释文件
+
+    Returns:
+        tuple: (导入数, 跳过数, 失败数)
+    """
+    if not os.path.isdir(source_dir):
+        return 0, 0, 0
+
+    existing = {row.filename for row in db.session.query(Annotation.filename)}
+    imported = skipped = failed = 0
+    for name in sorted(os.listdir(source_dir)):
+        if not name.endswith('.json'):
+            continue
+        if name in existing:
+            skipped += 1
+            continue
+        path = os.path.join(source_dir, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError('文件内容不是 JSON 对象')
+        except Exception as e:
+            print(f"  - 跳过无法解析的文件 {name}: {e}")
+            failed += 1
+            continue
+
+        annotation = Annotation(filename=name)
+        annotation.apply_data(data)
+        # 缺少或无法解析时间的旧文件使用文件修改时间
+        if not parse_timestamp(data.get('timestamp')):
+            annotation.timestamp = datetime.utcfromtimestamp(os.path.getmtime(path))
+        db.session.add(annotation)
+        imported += 1
+        if imported % batch_size == 0:
+            db.session.commit()
+    db.session.commit()
+    return imported, skipped, failed
+
+
+def main():
+    """导入注释文件"""
+    source_dir = sys.argv[1] if len(sys.argv) > 1 else ANNOTATIONS_DIR
+    app, _ = create_app()
+
+    with app.app_context():
+        # 只创建缺失的表，不影响已有数据
+        db.create_all()
+
+        print(f"正在导入注释文件: {source_dir}")
+        imported, skipped, failed = migrate_annotations(source_dir)
+        print(f"  - 导入 {imported} 条，已存在跳过 {skipped} 条，失败 {failed} 条")
+
+        print("\n注释数据迁移完成！")
+
+
+if __name__ == '__main__':
+    main()
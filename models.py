@@ -1,5 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
@@ -17,6 +17,13 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # 冗余计数字段，由作品/收藏/帖子/关注的增删路径在同一事务中维护，可用 rebuild_counters.py 校正
+    works_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    collections_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    posts_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    followers_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # 关系
     works = db.relationship('Work', backref='author', lazy='dynamic', cascade='all, delete-orphan')
     comments = db.relationship('Comment', backref='author', lazy='dynamic', cascade='all, delete-orphan')
@@ -42,15 +49,23 @@ class User(db.Model):
             'username': self.username,
             'email': self.email,
             'avatar': self.avatar,
+            'avatar_urls': self.avatar_urls(),
             'bio': self.bio,
             'created_at': self.created_at.isoformat(),
-            'works_count': self.works.count(),
-            'collections_count': self.collections.count(),
-            'posts_count': self.posts.count(),
-            'followers_count': self.followers.count(),
-            'following_count': self.following.count()
+            'works_count': self.works_count or 0,
+            'collections_count': self.collections_count or 0,
+            'posts_count': self.posts_count or 0,
+            'followers_count': self.followers_count or 0,
+            'following_count': self.following_count or 0
         }
 
+    def avatar_urls(self):
+        """头像各尺寸衍生图 URL，默认头像返回 None"""
+        if not self.avatar or self.avatar == 'default_avatar.png':
+            return None
+        from image_derivatives import derivative_urls
+        return derivative_urls(self.avatar, 'avatars')
+
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -71,11 +86,17 @@ class Work(db.Model):
     tags = db.Column(db.JSON, default=list)  # 作品标签
     views = db.Column(db.Integer, default=0)
     status = db.Column(db.String(20), default='approved')  # 默认approved，跳过审核
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     original_width = db.Column(db.Integer, default=0)  # 原始图片宽度
     original_height = db.Column(db.Integer, default=0)  # 原始图片高度
 
+    # 冗余计数字段，由点赞/评论/收藏/单字的增删路径在同一事务中维护，可用 rebuild_counters.py 校正
+    likes_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comments_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    collections_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    characters_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # 关系
     comments = db.relationship('Comment', backref='work', lazy='dynamic', cascade='all, delete-orphan')
     collections = db.relationship('Collection', backref='work', lazy='dynamic', cascade='all, delete-orphan')
@@ -86,6 +107,7 @@ class Work(db.Model):
         """转换为字典"""
         # 生成完整的图片URL
         from utils import get_file_url
+        from image_derivatives import derivative_urls
         image_url = get_file_url(self.image_url, 'works')
         
         data = {
@@ -93,6 +115,7 @@ class Work(db.Model):
             'title': self.title,
             'description': self.description,
             'image_url': image_url,
+            'image_urls': derivative_urls(self.image_url, 'works'),
             'style': self.style,
             'dynasty': self.dynasty,
             'author_name': self.author_name,
@@ -101,16 +124,17 @@ class Work(db.Model):
             'views': self.views,
             'status': self.status,
             'created_at': self.created_at.isoformat(),
-            'likes_count': self.likes.count(),
-            'comments_count': self.comments.count(),
-            'collections_count': self.collections.count(),
-            'characters_count': self.characters.count()
+            'likes_count': self.likes_count or 0,
+            'comments_count': self.comments_count or 0,
+            'collections_count': self.collections_count or 0,
+            'characters_count': self.characters_count or 0
         }
         if include_author:
             data['author'] = {
                 'id': self.author.id,
                 'username': self.author.username,
-                'avatar': self.author.avatar
+                'avatar': self.author.avatar,
+                'avatar_urls': self.author.avatar_urls()
             }
         return data
 
@@ -127,7 +151,7 @@ class Comment(db.Model):
     work_id = db.Column(db.Integer, db.ForeignKey('works.id'), nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     parent_id = db.Column(db.Integer, db.ForeignKey('comments.id'))  # 父评论ID，用于回复
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     # 自引用关系
     replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]),
@@ -162,7 +186,7 @@ class Collection(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     work_id = db.Column(db.Integer, db.ForeignKey('works.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     # 唯一约束：一个用户不能重复收藏同一作品
     __table_args__ = (db.UniqueConstraint('user_id', 'work_id', name='unique_user_work_collection'),)
@@ -215,7 +239,7 @@ class Post(db.Model):
     content = db.Column(db.Text, nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     topic_id = db.Column(db.String(50), db.ForeignKey('topics.id'), nullable=False)  # 话题ID必填
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # 关系
@@ -223,8 +247,18 @@ class Post(db.Model):
     comments = db.relationship('PostComment', backref='post', lazy='dynamic', cascade='all, delete-orphan')
     topic = db.relationship('Topic', backref=db.backref('posts', lazy='dynamic'))
 
-    def to_dict(self, include_author=True):
-        """转换为字典"""
+    def to_dict(self, include_author=True, counts=None):
+        """转换为字典
+
+        Args:
+            include_author: 是否包含作者信息
+            counts: 预先批量统计的计数 {'likes_count', 'comments_count'}，为空时逐条查询
+        """
+        if counts is None:
+            counts = {
+                'likes_count': self.likes.count(),
+                'comments_count': self.comments.count()
+            }
         data = {
             'id': self.id,
             'title': self.title,
@@ -233,8 +267,8 @@ class Post(db.Model):
             'topic': self.topic.to_dict() if self.topic else None,
             'created_at': (self.created_at + timedelta(hours=8)).isoformat(),
             'updated_at': (self.updated_at + timedelta(hours=8)).isoformat(),
-            'likes_count': self.likes.count(),
-            'comments_count': self.comments.count()
+            'likes_count': counts['likes_count'],
+            'comments_count': counts['comments_count']
         }
         if include_author:
             data['author'] = {
@@ -342,7 +376,7 @@ class Follow(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     follower_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     followed_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     # 唯一约束：一个用户不能重复关注另一个用户
     __table_args__ = (db.UniqueConstraint('follower_id', 'followed_id', name='unique_follow_relationship'),)
@@ -474,6 +508,9 @@ class Character(db.Model):
             # 添加作品图片的尺寸信息，用于前端裁剪显示
             data['work_image_width'] = self.work.original_width if hasattr(self.work, 'original_width') else 0
             data['work_image_height'] = self.work.original_height if hasattr(self.work, 'original_height') else 0
+            # 服务端裁剪好的单字图，列表页优先使用，避免为一个字下载整张作品图片
+            from character_crops import crop_url
+            data['crop_url'] = crop_url(self)
         
         return data
 
@@ -499,8 +536,14 @@ class CharacterSet(db.Model):
     # 唯一约束：一个用户的字集名称不能重复
     __table_args__ = (db.UniqueConstraint('user_id', 'name', name='unique_user_character_set_name'),)
     
-    def to_dict(self):
-        """转换为字典"""
+    def to_dict(self, characters_count=None):
+        """转换为字典
+
+        Args:
+            characters_count: 预先批量统计的单字数量，为空时单独查询
+        """
+        if characters_count is None:
+            characters_count = self.characters.count()
         return {
             'id': self.id,
             'name': self.name,
@@ -508,7 +551,7 @@ class CharacterSet(db.Model):
             'user_id': self.user_id,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
-            'characters_count': self.characters.count()
+            'characters_count': characters_count
         }
     
     def __repr__(self):
@@ -571,6 +614,194 @@ class SearchLog(db.Model):
         return f'<SearchLog keyword:{self.keyword}>'
 
 
+class SearchKeywordStat(db.Model):
+    """搜索词按天汇总模型 - 搜索记录写入时增量累加，用于热门搜索词统计"""
+    __tablename__ = 'search_keyword_stats'
+
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.Date, nullable=False, index=True)  # 统计日期（UTC）
+    keyword = db.Column(db.String(100), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # 确保同一天同一搜索词只有一行
+    __table_args__ = (db.UniqueConstraint('bucket', 'keyword', name='unique_bucket_keyword'),)
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'bucket': self.bucket.isoformat(),
+            'keyword': self.keyword,
+            'count': self.count
+        }
+
+    def __repr__(self):
+        return f'<SearchKeywordStat {self.bucket} {self.keyword}:{self.count}>'
+
+
+class Annotation(db.Model):
+    """单字注释模型 - 替代 calligraphy_annotations/ 目录下的 JSON 文件"""
+    __tablename__ = 'annotations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), unique=True, nullable=False)  # 对外ID，沿用原文件名
+    character = db.Column(db.String(50), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    username = db.Column(db.String(80))
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    keypoints_count = db.Column(db.Integer, nullable=False, default=0)
+    data = db.Column(db.JSON, nullable=False, default=dict)  # 完整注释内容
+
+    __table_args__ = (db.Index('ix_annotations_character_timestamp', 'character', 'timestamp'),)
+
+    def apply_data(self, data):
+        """写入完整注释内容，并同步可查询的冗余字段"""
+        self.data = dict(data)
+        self.character = data.get('character') or 'unknown'
+        user_id = data.get('user_id')
+        self.user_id = int(user_id) if str(user_id or '').isdigit() else None
+        self.username = data.get('username')
+        self.timestamp = parse_timestamp(data.get('timestamp')) or datetime.utcnow()
+        keypoints = data.get('keypoints')
+        self.keypoints_count = len(keypoints) if isinstance(keypoints, list) else 0
+
+    def to_summary(self):
+        """列表摘要，只读取索引字段，不解析注释内容"""
+        return {
+            'id': self.filename,
+            'filename': self.filename,
+            'character': self.character,
+            'user_id': str(self.user_id) if self.user_id is not None else None,
+            'username': self.username,
+            'timestamp': self.timestamp.isoformat(),
+            'keypoints_count': self.keypoints_count
+        }
+
+    def to_dict(self):
+        """完整注释内容"""
+        return {**self.data, 'id': self.filename}
+
+    def __repr__(self):
+        return f'<Annotation {self.filename}>'
+
+
+class OcrJob(db.Model):
+    """OCR 识别任务模型 - 持久化异步识别任务状态，服务重启后未完成的任务会重新执行"""
+    __tablename__ = 'ocr_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 十六进制
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    client_key = db.Column(db.String(64), nullable=False, index=True)  # 并发限制维度：user:<id> 或 ip:<地址>
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending/running/succeeded/failed
+    params = db.Column(db.JSON, nullable=False, default=dict)  # det_mode/version/return_position
+    input_path = db.Column(db.String(255))  # 待识别图片的暂存路径，任务结束后删除
+    result = db.Column(db.JSON)  # {temp_json_path, boxes, image_size, cached}
+    error = db.Column(db.String(500))
+    error_code = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """转换为字典"""
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'params': self.params,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if self.status == 'succeeded' and self.result:
+            data.update(self.result)
+        if self.status == 'failed':
+            data['info'] = self.error
+            data['error_code'] = self.error_code
+        return data
+
+    def __repr__(self):
+        return f'<OcrJob {self.id} {self.status}>'
+
+
+
+class AnalysisJob(db.Model):
+    """单字批量分析任务模型 - 逐字裁剪作品图片调用视觉模型并写入关键点，中断后续跑时跳过已完成的单字"""
+    __tablename__ = 'analysis_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 十六进制
+    work_id = db.Column(db.Integer, db.ForeignKey('works.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending/running/succeeded/failed
+    overwrite = db.Column(db.Boolean, nullable=False, default=False)  # 是否覆盖已有关键点
+    character_ids = db.Column(db.JSON, nullable=False, default=list)  # 创建任务时确定的待分析单字ID
+    done_ids = db.Column(db.JSON, nullable=False, default=list)  # 已写入关键点的单字ID
+    failures = db.Column(db.JSON, nullable=False, default=dict)  # 单字ID -> 失败原因，续跑时重试
+    error = db.Column(db.String(500))  # 整个任务失败的原因
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'job_id': self.id,
+            'work_id': self.work_id,
+            'status': self.status,
+            'overwrite': self.overwrite,
+            'total': len(self.character_ids or []),
+            'completed': len(self.done_ids or []),
+            'failed': len(self.failures or {}),
+            'failures': self.failures or {},
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<AnalysisJob {self.id} work:{self.work_id} {self.status}>'
+
+
+
+class UsageSnapshot(db.Model):
+    """外部 AI 调用用量快照模型 - 每个统计周期按接口与按用户各写一行汇总"""
+    __tablename__ = 'usage_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    period_start = db.Column(db.DateTime, nullable=False, index=True)
+    period_end = db.Column(db.DateTime, nullable=False)
+    scope = db.Column(db.String(20), nullable=False)  # endpoint（服务:接口:模型）或 user（用户ID）
+    key = db.Column(db.String(200), nullable=False)
+    calls = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms_sum = db.Column(db.Float, nullable=False, default=0)
+    latency_ms_max = db.Column(db.Float, nullable=False, default=0)
+    request_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    response_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)
+    cost = db.Column(db.Float, nullable=False, default=0)  # 估算费用（元）
+
+    __table_args__ = (
+        db.Index('ix_usage_snapshots_scope_key_period', 'scope', 'key', 'period_start'),
+    )
+
+    def __repr__(self):
+        return f'<UsageSnapshot {self.scope}:{self.key} {self.period_start}>'
+
+
+def parse_timestamp(value):
+    """解析 ISO 格式时间（支持末尾 Z），统一转换为不带时区的 UTC 时间，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
 class Notification(db.Model):
     """通知模型"""
     __tablename__ = 'notifications'
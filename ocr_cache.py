@@ -0,0 +1,125 @@
+"""
+OCR 结果缓存
+按图片内容寻址：以解码后图片字节和 det_mode/version/return_position 参数的 SHA-256 作为键，
+OCR 接口原始返回保存为 json_temp/ocr_<键>.json，同一张图片重复识别时直接读取，不再请求远端接口，
+也不再重复生成暂存文件。
+缓存文件数量超过 OCR_CACHE_MAX_ENTRIES 时按最近使用时间（命中时刷新文件修改时间）淘汰最久未用的条目。
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from flask import current_app
+
+# 影响识别结果的参数
+KEY_PARAMS = ('det_mode', 'version', 'return_position')
+
+_CACHE_FILE_RE = re.compile(r'^ocr_[0-9a-f]{64}\.json$')
+_evict_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def cache_dir():
+    """缓存目录（与原 OCR 暂存目录相同）"""
+    return os.path.join(os.path.dirname(current_app.instance_path), 'json_temp')
+
+
+def cache_key(image_bytes, params, variant=None):
+    """
+    计算缓存键
+
+    Args:
+        image_bytes: 解码后的图片字节
+        params: OCR 请求参数，只取 KEY_PARAMS 中的字段
+        variant: 其他影响结果的处理参数（如分块大小），None 表示整图识别
+
+    Returns:
+        str: 64 位十六进制 SHA-256
+    """
+    digest = hashlib.sha256(image_bytes)
+    digest.update(json.dumps({k: params.get(k) for k in KEY_PARAMS}, sort_keys=True).encode('utf-8'))
+    if variant is not None:
+        digest.update(json.dumps(variant, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_filename(key):
+    return f"ocr_{key}.json"
+
+
+def get(key):
+    """
+    读取缓存的 OCR 原始返回，命中时刷新最近使用时间
+
+    Returns:
+        dict: OCR 接口原始返回，未命中返回 None
+    """
+    path = os.path.join(cache_dir(), cache_filename(key))
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            api_json = json.load(f)
+        os.utime(path)
+    except (OSError, ValueError):
+        api_json = None
+    if not isinstance(api_json, dict):
+        api_json = None
+    with _stats_lock:
+        _stats['misses' if api_json is None else 'hits'] += 1
+    return api_json
+
+
+def stats():
+    """命中/未命中计数（进程内）"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def put(key, api_json):
+    """
+    写入缓存（先写临时文件再原子替换），并淘汰超出上限的条目
+
+    Returns:
+        str: 缓存文件名
+    """
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    filename = cache_filename(key)
+    tmp_path = os.path.join(directory, f".{filename}.{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(api_json, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(directory, filename))
+    evict(current_app.config.get('OCR_CACHE_MAX_ENTRIES', 1000))
+    return filename
+
+
+def evict(max_entries):
+    """
+    按最近使用时间淘汰缓存，只处理缓存文件，不影响旧版按时间命名的暂存文件
+
+    Returns:
+        int: 删除的文件数
+    """
+    directory = cache_dir()
+    with _evict_lock:
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if _CACHE_FILE_RE.match(entry.name):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        continue
+        if len(entries) <= max_entries:
+            return 0
+        entries.sort()
+        removed = 0
+        for _, path in entries[:len(entries) - max_entries]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+        return removed
@@ -0,0 +1,179 @@
+"""
+异步 OCR 识别任务队列
+提交接口只保存图片并写入 ocr_jobs 表后立即返回任务ID，由有界线程池调用远端接口，
+完成后推送 ocr_job_completed 事件到用户的 user_<id> 房间，前端也可轮询任务状态。
+每个用户（未登录时按 IP）同时进行中的任务数受 OCR_JOB_MAX_PER_USER 限制，排队总数受 OCR_JOB_QUEUE_SIZE 限制。
+服务重启后首次使用队列时，未完成的任务会重新排队执行。
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from models import db, OcrJob
+import ocr_service
+from ocr_service import OcrError
+from usage_stats import attribute_to
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+class OcrJobLimitError(Exception):
+    """超过并发或排队上限"""
+
+
+class OcrJobQueue:
+    """OCR 任务队列，用法与 Flask 扩展一致：先创建实例，再调用 init_app(app)"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._recovered = False
+        self._last_prune = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """读取配置"""
+        self.app = app
+        self.workers = app.config.get('OCR_JOB_WORKERS', 4)
+        self.max_per_user = app.config.get('OCR_JOB_MAX_PER_USER', 2)
+        self.queue_size = app.config.get('OCR_JOB_QUEUE_SIZE', 100)
+        self.retention_hours = app.config.get('OCR_JOB_RETENTION_HOURS', 24)
+        self.input_dir = os.path.join(os.path.dirname(app.instance_path), 'json_temp', 'ocr_jobs')
+        app.extensions['ocr_job_queue'] = self
+
+    def _ensure_started(self):
+        """创建线程池，并在本进程首次使用时恢复未完成的任务"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr-job')
+            if self._recovered:
+                return
+            # 上次退出时正在执行的任务重新排队
+            OcrJob.query.filter_by(status='running').update({'status': 'pending'})
+            db.session.commit()
+            pending = [job.id for job in OcrJob.query.filter_by(status='pending').order_by(OcrJob.created_at)]
+            self._recovered = True
+        for job_id in pending:
+            self._executor.submit(self._run, job_id)
+
+    def submit(self, image_bytes, params, user_id=None, client_key=None):
+        """
+        创建识别任务
+
+        Returns:
+            OcrJob: 已入队的任务
+
+        Raises:
+            OcrJobLimitError: 用户进行中的任务过多或队列已满
+        """
+        self._ensure_started()
+        self._prune_finished()
+        client_key = client_key or f'user:{user_id}'
+        with self._lock:
+            active = OcrJob.query.filter(OcrJob.status.in_(ACTIVE_STATUSES))
+            if active.filter(OcrJob.client_key == client_key).count() >= self.max_per_user:
+                raise OcrJobLimitError(f'同时进行中的识别任务不能超过 {self.max_per_user} 个')
+            if active.count() >= self.queue_size:
+                raise OcrJobLimitError('识别任务排队已满，请稍后再试')
+
+            job_id = uuid.uuid4().hex
+            os.makedirs(self.input_dir, exist_ok=True)
+            input_path = os.path.join(self.input_dir, f'{job_id}.img')
+            with open(input_path, 'wb') as f:
+                f.write(image_bytes)
+            job = OcrJob(
+                id=job_id,
+                user_id=user_id,
+                client_key=client_key,
+                status='pending',
+                params=params,
+                input_path=input_path
+            )
+            db.session.add(job)
+            db.session.commit()
+        self._executor.submit(self._run, job_id)
+        return job
+
+    def get(self, job_id):
+        """查询任务（同时确保重启后的任务已恢复执行）"""
+        self._ensure_started()
+        return OcrJob.query.get(job_id)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                self._execute(job_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"OCR 任务 {job_id} 执行异常: {e}")
+            finally:
+                db.session.remove()
+
+    def _execute(self, job_id):
+        # 只有一个线程能把任务从 pending 改为 running
+        claimed = OcrJob.query.filter_by(id=job_id, status='pending').update({
+            'status': 'running',
+            'started_at': datetime.utcnow()
+        })
+        db.session.commit()
+        if not claimed:
+            return
+        job = OcrJob.query.get(job_id)
+
+        try:
+            with open(job.input_path, 'rb') as f:
+                image_bytes = f.read()
+            with attribute_to(job.user_id):
+                job.result = ocr_service.recognize(image_bytes, job.params)
+            job.status = 'succeeded'
+        except OcrError as e:
+            job.status = 'failed'
+            job.error = e.info[:500]
+            job.error_code = e.status_code
+        except Exception as e:
+            job.status = 'failed'
+            job.error = f'服务器内部错误: {str(e)}'[:500]
+            job.error_code = 500
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+        self._remove_input(job.input_path)
+        self._notify(job)
+
+    def _notify(self, job):
+        """推送任务完成事件到用户房间"""
+        socketio = self.app.extensions.get('socketio')
+        if socketio is None or job.user_id is None:
+            return
+        try:
+            socketio.emit('ocr_job_completed', job.to_dict(), room=f'user_{job.user_id}')
+        except Exception as e:
+            print(f"推送 OCR 任务完成事件失败: {e}")
+
+    @staticmethod
+    def _remove_input(path):
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
+
+    def _prune_finished(self):
+        """每小时最多一次，删除超过保留期的已结束任务"""
+        now = time.monotonic()
+        if now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        OcrJob.query.filter(
+            OcrJob.status.notin_(ACTIVE_STATUSES),
+            OcrJob.finished_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+
+ocr_job_queue = OcrJobQueue()
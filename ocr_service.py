@@ -0,0 +1,401 @@
+"""
+古籍 OCR 识别
+封装图片解码、结果缓存、远端接口调用与字符框提取，供同步接口和异步识别任务共用。
+
+长卷、大幅拓片按 OCR_TILE_SIZE 切成相互重叠的分块，用有界线程池并发识别，
+分块内坐标换算回整图坐标，重叠区域的重复字符框去重后按整图结果缓存，返回结构与整图识别相同。
+"""
+import base64
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import numpy as np
+import requests
+from flask import current_app
+import ocr_cache
+import single_flight
+from http_client import get_client, CircuitOpenError
+from usage_stats import usage_stats, attribute_to, current_user_id
+
+try:
+    from PIL import Image  # Optional, used to get original image size
+    _PIL_AVAILABLE = True
+except Exception:
+    _PIL_AVAILABLE = False
+
+
+def _client():
+    """OCR 服务共享客户端（连接池、重试与熔断参数取自配置）"""
+    config = current_app.config
+    return get_client(
+        'ocr',
+        timeout=config.get('OCR_HTTP_TIMEOUT', 30),
+        retries=config.get('OCR_HTTP_RETRIES', 2),
+        pool_size=config.get('OCR_HTTP_POOL_SIZE', 10),
+        failure_threshold=config.get('OCR_CIRCUIT_FAILURE_THRESHOLD', 5),
+        reset_timeout=config.get('OCR_CIRCUIT_RESET_TIMEOUT', 30)
+    )
+
+
+class OcrError(Exception):
+    """OCR 识别失败，info 为返回给前端的说明，status_code 为对应的 HTTP 状态码"""
+
+    def __init__(self, info, status_code=500):
+        super().__init__(info)
+        self.info = info
+        self.status_code = status_code
+
+
+def decode_image(image_b64):
+    """
+    解码 base64 图片（可包含 dataURL 前缀）
+
+    Returns:
+        bytes: 图片字节
+    """
+    if not image_b64:
+        raise OcrError('缺少 image(base64) 参数', 400)
+    try:
+        # 去掉 dataURL 前缀
+        if ',' in image_b64:
+            image_b64 = image_b64.split(',', 1)[1]
+        return base64.b64decode(image_b64, validate=True)
+    except Exception as e:
+        raise OcrError(f'base64 格式错误: {str(e)}', 400)
+
+
+def build_params(req_data):
+    """
+    取出影响识别结果的参数，并补齐默认值（确保返回位置信息）
+
+    tiled 为 true/false 时强制开启/关闭分块识别，缺省按图片尺寸自动判断。
+    """
+    params = {key: req_data[key] for key in ocr_cache.KEY_PARAMS if key in req_data}
+    params.setdefault('return_position', True)
+    params.setdefault('version', 'v2')
+    params.setdefault('det_mode', 'auto')
+    tiled = req_data.get('tiled')
+    if isinstance(tiled, str):
+        tiled = {'true': True, '1': True, 'false': False, '0': False}.get(tiled.lower())
+    if isinstance(tiled, bool):
+        params['tiled'] = tiled
+    return params
+
+
+def _split_params(params):
+    """拆分为远端接口参数与分块开关"""
+    provider_params = {key: value for key, value in params.items() if key != 'tiled'}
+    return provider_params, params.get('tiled')
+
+
+def image_size(image_bytes):
+    """读取原图尺寸（如果 Pillow 可用），失败时返回 None"""
+    if not _PIL_AVAILABLE:
+        return None
+    try:
+        with Image.open(BytesIO(image_bytes)) as im:
+            width, height = im.size
+    except Exception:
+        return None
+    return {'width': width, 'height': height} if width and height else None
+
+
+def extract_boxes(api_json):
+    """从 OCR 接口原始返回中提取字符框 [{text, position:[x1,y1,x2,y2], confidence, det_confidence, line_index, word_index}]"""
+    boxes = []
+    data = api_json.get('data', {})
+    text_lines = data.get('text_lines', [])
+    for line_idx, text_line in enumerate(text_lines):
+        words = text_line.get('words', [])
+        for word_idx, word in enumerate(words):
+            text = word.get('text', '')
+            position = word.get('position', [])
+            confidence = word.get('confidence', 0.0)
+            det_confidence = word.get('det_confidence', 0.0)
+            if text and isinstance(position, list) and len(position) >= 4:
+                boxes.append({
+                    'text': text,
+                    'position': position[:4],  # [x1,y1,x2,y2]
+                    'confidence': confidence,
+                    'det_confidence': det_confidence,
+                    'line_index': line_idx,
+                    'word_index': word_idx
+                })
+    return boxes
+
+
+def tiling_for(image_bytes, tiled=None):
+    """
+    决定是否分块识别
+
+    Returns:
+        dict: {'tile_size', 'overlap'}，整图识别时返回 None
+    """
+    if tiled is False:
+        return None
+    size = image_size(image_bytes)
+    if not size:
+        return None
+    config = current_app.config
+    tile_size = config.get('OCR_TILE_SIZE', 2048)
+    longest = max(size['width'], size['height'])
+    if tiled is None and longest <= config.get('OCR_TILE_TRIGGER_SIZE', 4096):
+        return None
+    if longest <= tile_size:
+        return None
+    return {'tile_size': tile_size, 'overlap': config.get('OCR_TILE_OVERLAP', 256)}
+
+
+def _cache_key(image_bytes, params):
+    provider_params, tiled = _split_params(params)
+    return ocr_cache.cache_key(image_bytes, provider_params, tiling_for(image_bytes, tiled))
+
+
+def _build_result(key, api_json, image_bytes, cached):
+    try:
+        boxes = extract_boxes(api_json)
+    except Exception as e:
+        raise OcrError(f'处理 OCR 结果失败: {str(e)}', 500)
+    return {
+        'temp_json_path': f"json_temp/{ocr_cache.cache_filename(key)}",
+        'boxes': boxes,
+        'image_size': image_size(image_bytes),
+        'cached': cached
+    }
+
+
+def cached_result(image_bytes, params):
+    """
+    只查缓存，不请求远端接口
+
+    Returns:
+        dict: 识别结果，未命中返回 None
+    """
+    key = _cache_key(image_bytes, params)
+    api_json = ocr_cache.get(key)
+    if api_json is None:
+        return None
+    return _build_result(key, api_json, image_bytes, True)
+
+
+def call_api(image_bytes, params):
+    """
+    调用远端 OCR 接口
+
+    Returns:
+        dict: 接口原始返回（message 为 success）
+    """
+    # 获取 OCR API 配置
+    token = os.getenv('Token', '').strip('"').strip("'")
+    email = os.getenv('Email', '').strip('"').strip("'")
+    if not token or not email:
+        raise OcrError('服务器未配置 OCR Token/Email 环境变量', 500)
+
+    payload = {
+        'token': token,
+        'email': email,
+        'image': base64.b64encode(image_bytes).decode('ascii'),
+        **params
+    }
+    # 用量统计：耗时、请求/响应字节数与结果
+    usage = {'outcome': 'success', 'request_bytes': len(payload['image']), 'response_bytes': 0}
+    start = time.perf_counter()
+    try:
+        resp = _client().post(current_app.config['OCR_API_URL'], json=payload)
+        usage['response_bytes'] = len(resp.content)
+        resp.raise_for_status()  # 检查 HTTP 响应状态码
+        api_json = resp.json()
+    except CircuitOpenError:
+        usage['outcome'] = 'circuit_open'
+        raise OcrError('OCR 服务暂不可用，请稍后再试', 503)
+    except requests.exceptions.Timeout:
+        usage['outcome'] = 'timeout'
+        raise OcrError('OCR API 请求超时', 504)
+    except requests.exceptions.ConnectionError:
+        usage['outcome'] = 'connection_error'
+        raise OcrError('OCR API 连接失败', 503)
+    except requests.exceptions.HTTPError as e:
+        usage['outcome'] = f'http_{e.response.status_code}'
+        raise OcrError(f'OCR API 请求失败: HTTP {e.response.status_code}', 502)
+    except requests.exceptions.RequestException as e:
+        usage['outcome'] = 'request_error'
+        raise OcrError(f'OCR API 请求失败: {str(e)}', 502)
+    except ValueError:
+        usage['outcome'] = 'invalid_response'
+        raise OcrError('OCR API 返回格式错误', 502)
+    finally:
+        outcome = usage.pop('outcome')
+        usage_stats.record('ocr', 'ocr_api', params.get('version', 'v2'),
+                           (time.perf_counter() - start) * 1000, outcome=outcome, **usage)
+
+    # 验证 OCR API 返回结果
+    if not isinstance(api_json, dict):
+        raise OcrError('OCR API 返回格式错误', 502)
+    if api_json.get('message') != 'success':
+        raise OcrError(f'OCR 识别失败: {api_json.get("info", "未知错误")}', 502)
+    return api_json
+
+
+def _tile_starts(length, tile_size, step):
+    """单个方向上各分块的起点，最后一块贴齐边缘"""
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, step))
+    starts.append(length - tile_size)
+    return starts
+
+
+def _encode_tile(tile):
+    buffer = BytesIO()
+    if tile.mode not in ('RGB', 'L'):
+        tile = tile.convert('RGB')
+    tile.save(buffer, format='JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def _merge_tile_boxes(tile_results, margin):
+    """
+    合并各分块的字符框
+
+    坐标换算为整图坐标；重叠区域内两个框的交集超过较小框面积一半时视为同一个字，
+    优先保留未被分块边缘截断的框，其次是置信度高、面积大的框。
+
+    Args:
+        tile_results: [(分块区域 (x0, y0, x1, y1), 整图尺寸 (w, h), 分块字符框列表)]
+        margin: 距分块内侧边缘多少像素以内视为被截断
+
+    Returns:
+        list: 整图坐标的字符框，line_index 在整图范围内重新编号
+    """
+    records = []
+    for tile_index, ((x0, y0, x1, y1), (width, height), boxes) in enumerate(tile_results):
+        for box in boxes:
+            bx1, by1, bx2, by2 = (float(v) for v in box['position'][:4])
+            truncated = (
+                (x0 > 0 and bx1 <= margin) or (y0 > 0 and by1 <= margin) or
+                (x1 < width and bx2 >= (x1 - x0) - margin) or (y1 < height and by2 >= (y1 - y0) - margin)
+            )
+            records.append((tile_index, box, (bx1 + x0, by1 + y0, bx2 + x0, by2 + y0), truncated))
+    if not records:
+        return []
+
+    coords = np.array([r[2] for r in records], dtype=np.float64)
+    areas = np.maximum(coords[:, 2] - coords[:, 0], 0) * np.maximum(coords[:, 3] - coords[:, 1], 0)
+    confidence = np.array([float(r[1].get('confidence') or 0) for r in records])
+    truncated = np.array([r[3] for r in records])
+    # 排序优先级：未截断 > 置信度高 > 面积大
+    order = np.lexsort((-areas, -confidence, truncated))
+
+    kept = []
+    for i in order:
+        if kept:
+            k = np.array(kept)
+            ix = np.minimum(coords[k, 2], coords[i, 2]) - np.maximum(coords[k, 0], coords[i, 0])
+            iy = np.minimum(coords[k, 3], coords[i, 3]) - np.maximum(coords[k, 1], coords[i, 1])
+            inter = np.clip(ix, 0, None) * np.clip(iy, 0, None)
+            smaller = np.maximum(np.minimum(areas[k], areas[i]), 1e-9)
+            if (inter / smaller > 0.5).any():
+                continue
+        kept.append(int(i))
+
+    merged = []
+    line_numbers = {}
+    for i in sorted(kept):
+        tile_index, box, (gx1, gy1, gx2, gy2), _ = records[i]
+        line_key = (tile_index, box.get('line_index', 0))
+        merged.append({
+            **box,
+            'position': [int(round(gx1)), int(round(gy1)), int(round(gx2)), int(round(gy2))],
+            'line_index': line_numbers.setdefault(line_key, len(line_numbers))
+        })
+    return merged
+
+
+def _boxes_to_api_json(boxes):
+    """把合并后的字符框还原为 OCR 接口返回结构，便于缓存与 extract_boxes 复用"""
+    lines = {}
+    for box in boxes:
+        lines.setdefault(box['line_index'], []).append({
+            'text': box['text'],
+            'position': box['position'],
+            'confidence': box.get('confidence', 0.0),
+            'det_confidence': box.get('det_confidence', 0.0)
+        })
+    return {
+        'message': 'success',
+        'data': {'text_lines': [{'words': lines[index]} for index in sorted(lines)]},
+        'tiled': True
+    }
+
+
+def call_api_tiled(image_bytes, params, tiling):
+    """
+    分块并发识别整张图片
+
+    Returns:
+        dict: 与 OCR 接口返回结构相同的合并结果
+    """
+    tile_size, overlap = tiling['tile_size'], tiling['overlap']
+    step = max(tile_size - overlap, 1)
+    with Image.open(BytesIO(image_bytes)) as im:
+        im.load()
+        width, height = im.size
+        regions = [
+            (x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in _tile_starts(height, tile_size, step)
+            for x in _tile_starts(width, tile_size, step)
+        ]
+        tiles = [_encode_tile(im.crop(region)) for region in regions]
+
+    app = current_app._get_current_object()
+    user_id = current_user_id()
+
+    def run(tile_bytes):
+        with app.app_context(), attribute_to(user_id):
+            return extract_boxes(call_api(tile_bytes, params))
+
+    workers = min(app.config.get('OCR_TILE_WORKERS', 4), len(tiles))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr-tile') as pool:
+        tile_boxes = list(pool.map(run, tiles))
+
+    margin = app.config.get('OCR_TILE_EDGE_MARGIN', 4)
+    boxes = _merge_tile_boxes(
+        [(region, (width, height), boxes) for region, boxes in zip(regions, tile_boxes)],
+        margin
+    )
+    return _boxes_to_api_json(boxes)
+
+
+def recognize(image_bytes, params):
+    """
+    识别图片：命中缓存直接返回，否则请求远端接口（大图分块并发）并写入缓存；
+    并发的相同识别合并为一次远端调用
+
+    Returns:
+        dict: {temp_json_path, boxes, image_size, cached}
+    """
+    provider_params, tiled = _split_params(params)
+    tiling = tiling_for(image_bytes, tiled)
+    key = ocr_cache.cache_key(image_bytes, provider_params, tiling)
+    api_json = ocr_cache.get(key)
+    if api_json is not None:
+        return _build_result(key, api_json, image_bytes, True)
+
+    def fetch():
+        if tiling:
+            api_json = call_api_tiled(image_bytes, provider_params, tiling)
+        else:
+            api_json = call_api(image_bytes, provider_params)
+        try:
+            ocr_cache.put(key, api_json)
+        except Exception as e:
+            raise OcrError(f'保存 OCR 结果失败: {str(e)}', 500)
+        return api_json
+
+    # 同一图片与参数的并发识别只请求一次远端接口，其余等待同一结果
+    try:
+        api_json = single_flight.coalesce('ocr', key, fetch)
+    except single_flight.SingleFlightTimeout:
+        raise OcrError('等待相同图片的识别结果超时', 504)
+    return _build_result(key, api_json, image_bytes, False)
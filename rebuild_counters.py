@@ -0,0 +1,81 @@
+"""
+冗余计数校正脚本
+根据源数据表重新计算各模型上的冗余计数字段，修复因异常中断、手工改库等原因造成的偏差
+"""
+from sqlalchemy import func, inspect, text
+from app import create_app
+from models import db, User, Work, Like, Comment, Collection, Character, Post, Follow
+
+# 作品冗余计数字段：字段名 -> 计数子查询构造函数
+WORK_COUNTERS = {
+    'likes_count': lambda: db.select(func.count(Like.id)).where(Like.work_id == Work.id),
+    'comments_count': lambda: db.select(func.count(Comment.id)).where(Comment.work_id == Work.id),
+    'collections_count': lambda: db.select(func.count(Collection.id)).where(Collection.work_id == Work.id),
+    'characters_count': lambda: db.select(func.count(Character.id)).where(Character.work_id == Work.id),
+}
+
+# 用户冗余计数字段：字段名 -> 计数子查询构造函数
+USER_COUNTERS = {
+    'works_count': lambda: db.select(func.count(Work.id)).where(Work.author_id == User.id),
+    'collections_count': lambda: db.select(func.count(Collection.id)).where(Collection.user_id == User.id),
+    'posts_count': lambda: db.select(func.count(Post.id)).where(Post.author_id == User.id),
+    'followers_count': lambda: db.select(func.count(Follow.id)).where(Follow.followed_id == User.id),
+    'following_count': lambda: db.select(func.count(Follow.id)).where(Follow.follower_id == User.id),
+}
+
+
+def ensure_counter_columns(table_name, columns):
+    """为旧数据库补充缺失的计数字段（SQLite 不会通过 create_all 自动加列）"""
+    existing = {col['name'] for col in inspect(db.engine).get_columns(table_name)}
+    for column in columns:
+        if column not in existing:
+            db.session.execute(text(
+                f'ALTER TABLE {table_name} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0'
+            ))
+            print(f"  - 已为 {table_name} 添加字段 {column}")
+    db.session.commit()
+
+
+def rebuild_model_counters(model, counters):
+    """按源表重算指定模型的计数字段，整表一条 UPDATE 语句"""
+    values = {
+        getattr(model, field): build().scalar_subquery()
+        for field, build in counters.items()
+    }
+    updated = model.query.update(values, synchronize_session=False)
+    db.session.commit()
+    return updated
+
+
+def rebuild_work_counters():
+    """按点赞/评论/收藏/单字表重算作品计数"""
+    return rebuild_model_counters(Work, WORK_COUNTERS)
+
+
+def rebuild_user_counters():
+    """按作品/收藏/帖子/关注表重算用户计数"""
+    return rebuild_model_counters(User, USER_COUNTERS)
+
+
+def rebuild_counters():
+    """校正所有冗余计数"""
+    app, _ = create_app()
+
+    with app.app_context():
+        print("正在检查计数字段...")
+        ensure_counter_columns(Work.__tablename__, WORK_COUNTERS.keys())
+        ensure_counter_columns(User.__tablename__, USER_COUNTERS.keys())
+
+        print("正在重算作品计数...")
+        count = rebuild_work_counters()
+        print(f"  - 已校正 {count} 个作品")
+
+        print("正在重算用户计数...")
+        count = rebuild_user_counters()
+        print(f"  - 已校正 {count} 个用户")
+
+        print("\n计数校正完成！")
+
+
+if __name__ == '__main__':
+    rebuild_counters()
@@ -0,0 +1,29 @@
+"""
+热门搜索词汇总重建脚本
+创建汇总表（如不存在），按原始搜索记录重新汇总，并清理超过保留期的搜索记录
+"""
+from app import create_app
+from models import db
+from hot_keywords import rebuild_keyword_stats, prune_search_logs
+
+
+def main():
+    """重建热门搜索词汇总"""
+    app, _ = create_app()
+
+    with app.app_context():
+        # 只创建缺失的表，不影响已有数据
+        db.create_all()
+
+        print("正在清理过期搜索记录...")
+        deleted = prune_search_logs(app.config['SEARCH_LOG_RETENTION_DAYS'])
+        print(f"  - 删除 {deleted} 条")
+
+        print("正在重建热门搜索词汇总...")
+        print(f"  - search_keyword_stats: {rebuild_keyword_stats()} 条")
+
+        print("\n热门搜索词汇总重建完成！")
+
+
+if __name__ == '__main__':
+    main()
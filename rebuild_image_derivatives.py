@@ -0,0 +1,62 @@
+"""
+上传图片衍生图重建脚本
+为作品图片与用户头像批量生成多尺寸衍生图（修改 IMAGE_DERIVATIVE_* 配置后、或为已有上传补生成时执行）
+
+用法：
+    python rebuild_image_derivatives.py [--missing-only] [--only works|avatars]
+"""
+import argparse
+import os
+from app import create_app
+from models import db, User, Work
+from image_derivatives import generate_derivatives
+
+
+def rebuild(filenames, subfolder, upload_folder, missing_only):
+    """逐个生成衍生图，返回 (处理数, 写入文件数, 失败数)"""
+    processed = written = failed = 0
+    for filename in filenames:
+        if not os.path.exists(os.path.join(upload_folder, subfolder, filename)):
+            print(f"  - 跳过缺失的原图: {subfolder}/{filename}")
+            continue
+        try:
+            written += len(generate_derivatives(filename, subfolder, overwrite=not missing_only))
+            processed += 1
+        except Exception as e:
+            failed += 1
+            print(f"  - 生成失败 {subfolder}/{filename}: {e}")
+    return processed, written, failed
+
+
+def main():
+    """重建衍生图"""
+    parser = argparse.ArgumentParser(description='上传图片衍生图重建')
+    parser.add_argument('--missing-only', action='store_true', help='只生成缺失的衍生图，不覆盖已有文件')
+    parser.add_argument('--only', choices=['works', 'avatars'], help='只处理作品图片或头像')
+    args = parser.parse_args()
+
+    app, _ = create_app()
+
+    with app.app_context():
+        upload_folder = app.config['UPLOAD_FOLDER']
+        sources = {}
+        if args.only in (None, 'works'):
+            sources['works'] = [row.image_url for row in db.session.query(Work.image_url).filter(Work.image_url.isnot(None))]
+        if args.only in (None, 'avatars'):
+            sources['avatars'] = [
+                row.avatar for row in db.session.query(User.avatar).filter(
+                    User.avatar.isnot(None),
+                    User.avatar != 'default_avatar.png'
+                )
+            ]
+
+        for subfolder, filenames in sources.items():
+            print(f"正在生成 {subfolder} 衍生图（共 {len(filenames)} 张）...")
+            processed, written, failed = rebuild(filenames, subfolder, upload_folder, args.missing_only)
+            print(f"  - 处理 {processed} 张，写入 {written} 个文件，失败 {failed} 张")
+
+        print("\n衍生图重建完成！")
+
+
+if __name__ == '__main__':
+    main()
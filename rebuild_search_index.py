@@ -0,0 +1,22 @@
+"""
+全文索引重建脚本
+创建 FTS5 表（如不存在）并按 works / characters 表全量重建索引，用于旧数据库升级或索引损坏后修复
+"""
+from app import create_app
+from search_index import rebuild_search_index
+
+
+def main():
+    """重建全文索引"""
+    app, _ = create_app()
+
+    with app.app_context():
+        print("正在重建全文索引...")
+        for table, count in rebuild_search_index().items():
+            print(f"  - {table}: {count} 条")
+
+        print("\n全文索引重建完成！")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,5 +9,6 @@ from .posts import posts_bp
 from .topics import topics_bp
 from .character_sets import character_sets_bp
 from .notifications import notifications_bp
+from .admin import admin_bp
 
-__all__ = ['auth_bp', 'works_bp', 'users_bp', 'comments_bp', 'collections_bp', 'calligraphy_bp', 'posts_bp', 'topics_bp', 'character_sets_bp', 'notifications_bp']
\ No newline at end of file
+__all__ = ['auth_bp', 'works_bp', 'users_bp', 'comments_bp', 'collections_bp', 'calligraphy_bp', 'posts_bp', 'topics_bp', 'character_sets_bp', 'notifications_bp', 'admin_bp']
\ No newline at end of file
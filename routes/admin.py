@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Blueprint, jsonify, request, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func
+from models import db, User, UsageSnapshot
+from usage_stats import usage_stats
+import analysis_cache
+import ocr_cache
+import single_flight
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+
+def admin_required(fn):
+    """只允许 ADMIN_EMAILS 中配置的用户访问"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        user = User.query.get(get_jwt_identity())
+        if not user or user.email not in current_app.config.get('ADMIN_EMAILS', []):
+            return jsonify({'error': '需要管理员权限'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def _average(entries, prefix):
+    """某个服务全部接口的平均单次费用与耗时"""
+    calls = sum(e['calls'] for e in entries if e['key'].startswith(prefix))
+    if not calls:
+        return 0, 0
+    cost = sum(e['cost'] for e in entries if e['key'].startswith(prefix))
+    latency = sum(e['latency_ms_sum'] for e in entries if e['key'].startswith(prefix))
+    return cost / calls, latency / calls
+
+
+def _cache_savings(totals):
+    """按平均单次费用与耗时估算各缓存（含并发合并）节省的调用"""
+    flights = single_flight.metrics()
+    analysis = analysis_cache.stats()
+    ocr = ocr_cache.stats()
+    savings = {}
+    for name, prefix, saved in (
+        ('analysis_cache', 'ark:', analysis['hits'] + analysis['near_hits']),
+        ('analyze_single_flight', 'ark:', flights.get('analyze', {}).get('coalesced', 0)),
+        ('ocr_cache', 'ocr:', ocr['hits']),
+        ('ocr_single_flight', 'ocr:', flights.get('ocr', {}).get('coalesced', 0)),
+    ):
+        avg_cost, avg_latency = _average(totals['endpoints'], prefix)
+        savings[name] = {
+            'calls_saved': saved,
+            'cost_saved': round(saved * avg_cost, 4),
+            'seconds_saved': round(saved * avg_latency / 1000, 1)
+        }
+    return {
+        'analysis_cache': analysis,
+        'ocr_cache': ocr,
+        'single_flight': flights,
+        'savings': savings
+    }
+
+
+@admin_bp.route('/usage', methods=['GET'])
+@admin_required
+def get_usage():
+    """
+    外部 AI 调用用量统计
+
+    Query:
+    - hours: 同时汇总最近多少小时已持久化的快照（默认 24，最多 720）
+
+    Returns:
+        live: 内存中的当前周期与进程累计汇总（按接口、按用户）
+        history: 快照表中最近 hours 小时按接口、按用户的汇总
+        caches: 各缓存命中情况与估算节省的调用、费用与耗时
+    """
+    hours = min(max(request.args.get('hours', 24, type=int), 1), 720)
+    since = datetime.utcnow() - timedelta(hours=hours)
+
+    live = usage_stats.stats()
+    rows = db.session.query(
+        UsageSnapshot.scope,
+        UsageSnapshot.key,
+        func.sum(UsageSnapshot.calls),
+        func.sum(UsageSnapshot.errors),
+        func.sum(UsageSnapshot.latency_ms_sum),
+        func.max(UsageSnapshot.latency_ms_max),
+        func.sum(UsageSnapshot.request_bytes),
+        func.sum(UsageSnapshot.response_bytes),
+        func.sum(UsageSnapshot.prompt_tokens),
+        func.sum(UsageSnapshot.completion_tokens),
+        func.sum(UsageSnapshot.cost)
+    ).filter(
+        UsageSnapshot.period_start >= since
+    ).group_by(
+        UsageSnapshot.scope, UsageSnapshot.key
+    ).order_by(func.sum(UsageSnapshot.calls).desc()).all()
+
+    history = {'since': since.isoformat(), 'endpoints': [], 'users': []}
+    for scope, key, calls, errors, latency_sum, latency_max, req_bytes, resp_bytes, prompt, completion, cost in rows:
+        history['endpoints' if scope == 'endpoint' else 'users'].append({
+            'key': key,
+            'calls': calls,
+            'errors': errors,
+            'latency_ms_avg': round(latency_sum / calls, 1) if calls else 0,
+            'latency_ms_max': latency_max,
+            'request_bytes': req_bytes,
+            'response_bytes': resp_bytes,
+            'prompt_tokens': prompt,
+            'completion_tokens': completion,
+            'cost': round(cost or 0, 4)
+        })
+
+    return jsonify({
+        'live': live,
+        'history': history,
+        'caches': _cache_savings(live['totals'])
+    }), 200
@@ -7,29 +7,31 @@
 
 import os
 import json
-import base64
 from datetime import datetime
-from pathlib import Path
 from flask import Blueprint, request, jsonify
-from werkzeug.utils import secure_filename
 from PIL import Image
-import io
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import User, Character, db, Work, SearchLog
-from sqlalchemy import func
-
-# 尝试导入OpenAI客户端
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+from models import User, Character, db, Work, Annotation
+from utils import adjust_counter
+from serializers import serialize_works, preload
+import search_index
+from search_log_buffer import search_log_buffer
+import hot_keywords
+import annotation_stats
+from sqlalchemy.orm import defer
+import llm_client
+import analysis_cache
+import single_flight
+import image_encoding
+from analysis_batch import analysis_batch_queue, AnalysisJobConflictError
 
 calligraphy_bp = Blueprint('calligraphy', __name__, url_prefix='/api/calligraphy')
 
 # 配置
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+# 分析提示词版本，修改提示词时递增，使缓存的旧分析结果失效
+ANALYZE_PROMPT_VERSION = 1
 
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
@@ -56,54 +58,53 @@ def resize_image_if_needed(image):
     
     return image
 
-def image_to_base64(image):
+def analyze_with_doubao(image):
     """
-    将PIL图像转换为base64编码
+    使用豆包视觉模型分析书法单字
     
     Args:
         image: PIL Image对象
         
     Returns:
-        base64编码的字符串
+        分析结果字典（命中缓存时 metadata.cached 为 True）
     """
-    buffer = io.BytesIO()
-    image.save(buffer, format='PNG')
-    buffer.seek(0)
-    img_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-    return img_base64
+    vision_model = os.getenv("ARK_VISION_MODEL", "doubao-1.5-vision-pro-32k-250115")
+    
+    # 调整图片大小
+    image = resize_image_if_needed(image)
+    
+    # 相同或近似的单字图片已分析过时直接返回
+    image_hash = analysis_cache.perceptual_hash(image)
+    cached = analysis_cache.get(image_hash, vision_model, ANALYZE_PROMPT_VERSION)
+    if cached is not None:
+        cached["metadata"]["image_size"] = f"{image.size[0]}x{image.size[1]}"
+        return cached
+    
+    # 并发的相同请求只调用一次模型，其余请求等待并共享同一结果
+    def analyze():
+        result = request_doubao_analysis(image, vision_model)
+        analysis_cache.put(image_hash, vision_model, ANALYZE_PROMPT_VERSION, result)
+        return result
+    
+    return single_flight.coalesce('analyze', (image_hash, vision_model, ANALYZE_PROMPT_VERSION), analyze)
 
-def analyze_with_doubao(image):
+def request_doubao_analysis(image, vision_model, encoding=None):
     """
-    使用豆包视觉模型分析书法单字
+    调用豆包视觉模型分析单字（不经过缓存）
     
     Args:
-        image: PIL Image对象
+        image: 已调整大小的PIL Image对象
+        vision_model: 模型ID
+        encoding: 图片编码配置，缺省读取 ANALYZE_IMAGE_* 配置
         
     Returns:
         分析结果字典
     """
-    if not OPENAI_AVAILABLE:
-        raise Exception("OpenAI客户端未安装")
+    # 共享客户端（复用连接池），未安装 openai 或未配置 ARK_API_KEY 时抛出异常
+    client = llm_client.get_client()
     
-    # 获取环境变量配置
-    api_key = os.getenv("ARK_API_KEY")
-    base_url = os.getenv("ARK_BASE_URL", "https://ark.cn-beijing.volces.com/api/v3")
-    vision_model = os.getenv("ARK_VISION_MODEL", "doubao-1.5-vision-pro-32k-250115")
-    
-    if not api_key:
-        raise ValueError("未配置 ARK_API_KEY 环境变量")
-    
-    # 初始化客户端
-    client = OpenAI(
-        base_url=base_url,
-        api_key=api_key,
-    )
-    
-    # 调整图片大小
-    image = resize_image_if_needed(image)
-    
-    # 转换为base64
-    img_base64 = image_to_base64(image)
+    # 按配置压缩（灰度/二值化、限制尺寸与字节数）后转换为base64
+    encoded = image_encoding.encode_image(image, encoding)
     
     # 构建提示词
     prompt = """请仔细分析这个书法单字，并提供以下信息：
@@ -134,27 +135,29 @@ def analyze_with_doubao(image):
 }"""
     
     # 调用视觉理解模型
-    response = client.chat.completions.create(
-        model=vision_model,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{img_base64}"
+    with llm_client.track(vision_model) as call:
+        response = client.chat.completions.create(
+            model=vision_model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": encoded["data_url"]
+                            }
+                        },
+                        {
+                            "type": "text",
+                            "text": prompt
                         }
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ]
-            }
-        ],
-        temperature=0.7,
-    )
+                    ]
+                }
+            ],
+            temperature=0.7,
+        )
+        call["usage"] = response.usage
     
     # 解析响应
     content = response.choices[0].message.content
@@ -175,9 +178,13 @@ def analyze_with_doubao(image):
     result["metadata"] = {
         "image_size": f"{image.size[0]}x{image.size[1]}",
         "analysis_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "model": vision_model
+        "model": vision_model,
+        "payload_bytes": encoded["bytes"],
+        "usage": {
+            "prompt_tokens": getattr(response.usage, "prompt_tokens", None),
+            "completion_tokens": getattr(response.usage, "completion_tokens", None)
+        }
     }
-    
     return result
 
 @calligraphy_bp.route('/analyze', methods=['POST'])
@@ -220,6 +227,8 @@ def analyze_character():
         
         return jsonify({'analysis': result}), 200
         
+    except single_flight.SingleFlightTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except ValueError as e:
         return jsonify({'error': str(e)}), 500
     except json.JSONDecodeError as e:
@@ -227,6 +236,77 @@ def analyze_character():
     except Exception as e:
         return jsonify({'error': f'分析失败: {str(e)}'}), 500
 
+@calligraphy_bp.route('/works/<int:work_id>/analyze-batch', methods=['POST'])
+@jwt_required()
+def analyze_work_characters(work_id):
+    """
+    批量分析作品中的全部单字
+    
+    创建后台任务并立即返回任务ID，服务端按单字坐标裁剪作品图片逐字分析，结果写入单字的关键点；
+    进度通过 analysis_job_progress / analysis_job_completed 事件推送到 user_<id> 房间。
+    
+    Request JSON（可选）:
+    - overwrite: 是否重新分析已有关键点的单字，默认 false
+    """
+    try:
+        work = Work.query.get(work_id)
+        if not work:
+            return jsonify({'error': '作品不存在'}), 404
+        
+        # 检查权限：只有作品作者才能批量分析
+        current_user_id = get_jwt_identity()
+        if str(work.author_id) != current_user_id:
+            return jsonify({'error': '没有权限分析此作品'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        job = analysis_batch_queue.submit(work, work.author_id, overwrite=bool(data.get('overwrite', False)))
+        
+        return jsonify({
+            'message': '分析任务已创建',
+            'job': job.to_dict()
+        }), 202
+        
+    except AnalysisJobConflictError as e:
+        return jsonify({'error': str(e), 'job': e.job.to_dict()}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'创建分析任务失败: {str(e)}'}), 500
+
+@calligraphy_bp.route('/analyze-batch/<job_id>', methods=['GET'])
+@jwt_required()
+def get_analysis_job(job_id):
+    """查询批量分析任务进度"""
+    job = analysis_batch_queue.get(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    if str(job.user_id) != get_jwt_identity():
+        return jsonify({'error': '没有权限查看此任务'}), 403
+    return jsonify({'job': job.to_dict()}), 200
+
+@calligraphy_bp.route('/analyze-batch/<job_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_analysis_job(job_id):
+    """
+    续跑已结束的批量分析任务
+    
+    已完成的单字直接跳过，只重新分析未完成和失败的单字
+    """
+    try:
+        job = analysis_batch_queue.get(job_id)
+        if not job:
+            return jsonify({'error': '任务不存在'}), 404
+        if str(job.user_id) != get_jwt_identity():
+            return jsonify({'error': '没有权限操作此任务'}), 403
+        if not analysis_batch_queue.resume(job):
+            return jsonify({'error': '任务仍在进行中', 'job': job.to_dict()}), 409
+        return jsonify({
+            'message': '分析任务已重新开始',
+            'job': job.to_dict()
+        }), 202
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'续跑分析任务失败: {str(e)}'}), 500
+
 @calligraphy_bp.route('/save', methods=['POST'])
 def save_annotations():
     """
@@ -292,6 +372,7 @@ def save_annotations():
             
             # 保存到数据库
             db.session.add(character)
+            adjust_counter(Work, work_id, 'characters_count', 1)
             db.session.commit()
             
             return jsonify({
@@ -310,7 +391,7 @@ def create_annotation():
     """
     创建新注释
     
-    接收JSON格式的注释数据，添加用户身份信息后保存到本地文件
+    接收JSON格式的注释数据，添加用户身份信息后保存到 annotations 表
     """
     try:
         data = request.get_json()
@@ -339,19 +420,17 @@ def create_annotation():
         if not data.get('timestamp'):
             data['timestamp'] = datetime.utcnow().isoformat()
         
-        # 创建保存目录
-        save_dir = Path(__file__).resolve().parent.parent / 'calligraphy_annotations'
-        save_dir.mkdir(exist_ok=True)
-        
-        # 生成文件名
+        # 生成ID（沿用原文件名格式，同一秒内重复时追加微秒）
         character = data.get('character', 'unknown')
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{character}_annotation_{timestamp}.json"
-        filepath = save_dir / filename
+        now = datetime.now()
+        filename = f"{character}_annotation_{now.strftime('%Y%m%d_%H%M%S')}.json"
+        if Annotation.query.filter_by(filename=filename).first():
+            filename = f"{character}_annotation_{now.strftime('%Y%m%d_%H%M%S_%f')}.json"
         
-        # 保存JSON
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        annotation = Annotation(filename=filename)
+        annotation.apply_data(data)
+        db.session.add(annotation)
+        db.session.commit()
         
         return jsonify({
             'id': filename,
@@ -367,8 +446,20 @@ def create_annotation():
         }), 201
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'创建注释失败: {str(e)}'}), 500
 
+# 注释列表允许的排序字段
+ANNOTATION_SORT_COLUMNS = {
+    'timestamp': Annotation.timestamp,
+    'character': Annotation.character,
+    'keypoints_count': Annotation.keypoints_count,
+    'username': Annotation.username,
+    'user_id': Annotation.user_id,
+    'id': Annotation.filename,
+    'filename': Annotation.filename
+}
+
 @calligraphy_bp.route('/annotations', methods=['GET'])
 def get_annotations():
     """
@@ -379,6 +470,7 @@ def get_annotations():
         per_page: 每页数量，默认10
         sort_by: 排序字段，默认timestamp
         order: 排序顺序，asc或desc，默认desc
+        character: 按单字筛选（可选）
     
     返回注释列表，带分页信息
     """
@@ -388,6 +480,7 @@ def get_annotations():
         per_page = int(request.args.get('per_page', 10))
         sort_by = request.args.get('sort_by', 'timestamp')
         order = request.args.get('order', 'desc')
+        character = request.args.get('character')
         
         # 验证参数
         if page < 1:
@@ -395,53 +488,26 @@ def get_annotations():
         if per_page < 1 or per_page > 100:
             per_page = 10
         
-        save_dir = Path(__file__).resolve().parent.parent / 'calligraphy_annotations'
-        
-        if not save_dir.exists():
-            return jsonify({
-                'annotations': [],
-                'pagination': {
-                    'total': 0,
-                    'pages': 0,
-                    'page': page,
-                    'per_page': per_page
-                }
-            }), 200
-        
-        # 获取所有注释文件
-        all_annotations = []
-        for filepath in save_dir.glob('*.json'):
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    all_annotations.append({
-                        'id': filepath.name,
-                        'filename': filepath.name,
-                        'character': data.get('character', 'unknown'),
-                        'user_id': data.get('user_id'),
-                        'username': data.get('username'),
-                        'timestamp': data.get('timestamp', ''),
-                        'keypoints_count': len(data.get('keypoints', []))
-                    })
-            except Exception:
-                continue
+        # 列表只需要索引字段，不加载注释内容
+        query = Annotation.query.options(defer(Annotation.data))
+        if character:
+            query = query.filter(Annotation.character == character)
         
         # 排序
-        reverse = order.lower() == 'desc'
-        all_annotations.sort(key=lambda x: x[sort_by] if sort_by in x else '', reverse=reverse)
+        sort_column = ANNOTATION_SORT_COLUMNS.get(sort_by, Annotation.timestamp)
+        if order.lower() == 'desc':
+            query = query.order_by(sort_column.desc(), Annotation.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), Annotation.id.asc())
         
         # 分页
-        total = len(all_annotations)
-        pages = (total + per_page - 1) // per_page
-        start = (page - 1) * per_page
-        end = start + per_page
-        paginated_annotations = all_annotations[start:end]
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
-            'annotations': paginated_annotations,
+            'annotations': [annotation.to_summary() for annotation in pagination.items],
             'pagination': {
-                'total': total,
-                'pages': pages,
+                'total': pagination.total,
+                'pages': pagination.pages,
                 'page': page,
                 'per_page': per_page
             }
@@ -458,27 +524,20 @@ def list_annotations():
     返回注释列表
     """
     try:
-        save_dir = Path(__file__).resolve().parent.parent / 'calligraphy_annotations'
-        
-        if not save_dir.exists():
-            return jsonify({'annotations': []}), 200
-        
-        annotations = []
-        for filepath in save_dir.glob('*.json'):
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    annotations.append({
-                        'filename': filepath.name,
-                        'character': data.get('character', 'unknown'),
-                        'timestamp': data.get('timestamp', ''),
-                        'keypoints_count': len(data.get('keypoints', []))
-                    })
-            except Exception:
-                continue
-        
-        # 按时间倒序排序
-        annotations.sort(key=lambda x: x['timestamp'], reverse=True)
+        # 按时间倒序排序，只读取索引字段
+        rows = db.session.query(
+            Annotation.filename,
+            Annotation.character,
+            Annotation.timestamp,
+            Annotation.keypoints_count
+        ).order_by(Annotation.timestamp.desc(), Annotation.id.desc()).all()
+        
+        annotations = [{
+            'filename': row.filename,
+            'character': row.character,
+            'timestamp': row.timestamp.isoformat(),
+            'keypoints_count': row.keypoints_count
+        } for row in rows]
         
         return jsonify({'annotations': annotations}), 200
         
@@ -497,28 +556,13 @@ def get_annotation(id):
         注释数据
     """
     try:
-        # 注意：不使用secure_filename，因为它会过滤掉中文字符
-        # 直接使用id作为文件名，因为我们在创建时已经使用了安全的文件名生成方式
-        save_dir = Path(__file__).resolve().parent.parent / 'calligraphy_annotations'
-        
-        # 遍历所有文件，找到匹配的文件
-        target_file = None
-        for filepath in save_dir.glob('*.json'):
-            if filepath.name == id:
-                target_file = filepath
-                break
-        
-        if not target_file:
-            return jsonify({'error': '注释不存在'}), 404
-        
-        with open(target_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        annotation = Annotation.query.filter_by(filename=id).first()
         
-        # 添加id字段
-        data['id'] = id
+        if not annotation:
+            return jsonify({'error': '注释不存在'}), 404
         
         return jsonify({
-            'annotation': data
+            'annotation': annotation.to_dict()
         }), 200
         
     except Exception as e:
@@ -537,21 +581,12 @@ def update_annotation(id):
         更新后的注释数据
     """
     try:
-        save_dir = Path(__file__).resolve().parent.parent / 'calligraphy_annotations'
-        
-        # 遍历所有文件，找到匹配的文件
-        target_file = None
-        for filepath in save_dir.glob('*.json'):
-            if filepath.name == id:
-                target_file = filepath
-                break
+        annotation = Annotation.query.filter_by(filename=id).first()
         
-        if not target_file:
+        if not annotation:
             return jsonify({'error': '注释不存在'}), 404
         
-        # 读取现有注释
-        with open(target_file, 'r', encoding='utf-8') as f:
-            existing_data = json.load(f)
+        existing_data = annotation.data
         
         # 获取当前用户信息
         current_user_id = get_jwt_identity()
@@ -581,20 +616,19 @@ def update_annotation(id):
         
         # 更新timestamp
         updated_data['timestamp'] = datetime.utcnow().isoformat()
+        updated_data.pop('id', None)
         
         # 保存更新后的注释
-        with open(target_file, 'w', encoding='utf-8') as f:
-            json.dump(updated_data, f, ensure_ascii=False, indent=2)
-        
-        # 添加id字段
-        updated_data['id'] = id
+        annotation.apply_data(updated_data)
+        db.session.commit()
         
         return jsonify({
             'message': '注释更新成功',
-            'annotation': updated_data
+            'annotation': annotation.to_dict()
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'更新注释失败: {str(e)}'}), 500
 
 @calligraphy_bp.route('/annotations/<id>', methods=['DELETE'])
@@ -610,31 +644,20 @@ def delete_annotation(id):
         成功消息
     """
     try:
-        save_dir = Path(__file__).resolve().parent.parent / 'calligraphy_annotations'
+        annotation = Annotation.query.filter_by(filename=id).first()
         
-        # 遍历所有文件，找到匹配的文件
-        target_file = None
-        for filepath in save_dir.glob('*.json'):
-            if filepath.name == id:
-                target_file = filepath
-                break
-        
-        if not target_file:
+        if not annotation:
             return jsonify({'error': '注释不存在'}), 404
         
-        # 读取现有注释，检查权限
-        with open(target_file, 'r', encoding='utf-8') as f:
-            existing_data = json.load(f)
-        
         # 获取当前用户信息
         current_user_id = get_jwt_identity()
         
         # 检查权限：只有创建者才能删除
-        if str(existing_data.get('user_id')) != current_user_id:
+        if str(annotation.data.get('user_id')) != current_user_id:
             return jsonify({'error': '没有权限删除此注释'}), 403
         
-        # 删除文件
-        target_file.unlink()
+        db.session.delete(annotation)
+        db.session.commit()
         
         return jsonify({
             'message': '注释删除成功',
@@ -642,8 +665,43 @@ def delete_annotation(id):
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'删除注释失败: {str(e)}'}), 500
 
+@calligraphy_bp.route('/annotations/summary/<character>', methods=['GET'])
+def get_annotation_summary(character):
+    """
+    获取某个字全部注释的关键点汇总
+    
+    查询参数:
+        grid: 密度网格边长，默认16，最大64
+    
+    返回结果:
+        clusters: 共识关键点列表（x, y, count 注释数, points 关键点数, spread 离散度, tips 代表性提示），按 count 降序
+        heatmap: 密度网格（size, max, grid[行y][列x]）
+        annotations_count: 参与汇总的注释数
+        keypoints_count: 参与汇总的关键点数
+    """
+    try:
+        grid_size = request.args.get('grid', 16, type=int)
+        if grid_size < 1 or grid_size > 64:
+            grid_size = 16
+        
+        summary = annotation_stats.get_character_summary(character, grid_size)
+        
+        return jsonify({
+            'code': 200,
+            'message': '获取成功',
+            'data': summary
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'获取注释汇总失败: {str(e)}',
+            'data': None
+        }), 500
+
 @calligraphy_bp.route('/load/<filename>', methods=['GET'])
 def load_annotation(filename):
     """
@@ -656,19 +714,12 @@ def load_annotation(filename):
         注释数据
     """
     try:
-        # 安全检查文件名
-        filename = secure_filename(filename)
-        
-        save_dir = Path(__file__).resolve().parent.parent / 'calligraphy_annotations'
-        filepath = save_dir / filename
+        annotation = Annotation.query.filter_by(filename=filename).first()
         
-        if not filepath.exists():
+        if not annotation:
             return jsonify({'error': '文件不存在'}), 404
         
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        return jsonify(data), 200
+        return jsonify(annotation.data), 200
         
     except Exception as e:
         return jsonify({'error': f'加载失败: {str(e)}'}), 500
@@ -684,8 +735,10 @@ def search():
         per_page: 每页数量，默认20
     
     返回结果:
-        works: 作品搜索结果列表
-        characters: 单字搜索结果列表
+        works: 作品搜索结果列表（按相关度排序）
+        characters: 单字搜索结果列表（按相关度排序）
+        works_total: 作品匹配总数
+        characters_total: 单字匹配总数
         total: 总结果数
         page: 当前页码
         per_page: 每页数量
@@ -700,43 +753,45 @@ def search():
         if per_page > 50:
             per_page = 50
         
-        # 初始化结果
-        works = []
-        characters = []
+        if page < 1:
+            page = 1
+        if per_page < 1:
+            per_page = 20
         
-        # 搜索作品
-        work_query = Work.query.filter(Work.status == 'approved')
-        if q:
-            work_query = work_query.filter(
-                Work.title.ilike(f'%{q}%') | 
-                Work.author_name.ilike(f'%{q}%') | 
-                Work.style.ilike(f'%{q}%') |
-                Work.dynasty.ilike(f'%{q}%')
+        if q and search_index.is_available():
+            # 全文索引检索，按相关度排序
+            works, works_total = search_index.search_works(q, page, per_page)
+            characters, characters_total = search_index.search_characters(q, page, per_page)
+        else:
+            # 无关键词（或非 SQLite 数据库）时按时间倒序分页
+            work_query = Work.query.filter(Work.status == 'approved')
+            char_query = Character.query
+            if q:
+                work_query = work_query.filter(
+                    Work.title.ilike(f'%{q}%') | 
+                    Work.author_name.ilike(f'%{q}%') | 
+                    Work.style.ilike(f'%{q}%') |
+                    Work.dynasty.ilike(f'%{q}%')
+                )
+                char_query = char_query.filter(Character.recognition.ilike(f'%{q}%'))
+            work_page = work_query.order_by(Work.created_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
             )
+            char_page = char_query.order_by(Character.collected_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            works, works_total = work_page.items, work_page.total
+            characters, characters_total = char_page.items, char_page.total
         
-        # 搜索单字
-        char_query = Character.query
-        if q:
-            char_query = char_query.filter(Character.recognition.ilike(f'%{q}%'))
-        
-        # 获取结果（不分页，因为结果集不会太大）
-        works = work_query.all()
-        characters = char_query.all()
-        
-        # 转换为字典格式
-        works_data = [work.to_dict() for work in works]
+        # 转换为字典格式（单字所属作品一次加载）
+        works_data = serialize_works(works)
+        # 仅为持有引用：单字所属作品留在标识映射中，char.work 不再逐条查询
+        _keep = preload(Work, [char.work_id for char in characters])
         characters_data = [char.to_dict() for char in characters]
         
-        # 记录搜索词（只记录非空搜索词）
+        # 记录搜索词（只记录非空搜索词），写入缓冲队列后由后台线程批量落库
         if q:
-            try:
-                search_log = SearchLog(keyword=q)
-                db.session.add(search_log)
-                db.session.commit()
-            except Exception as log_error:
-                # 记录失败不影响搜索结果
-                db.session.rollback()
-                print(f"记录搜索词失败: {log_error}")
+            search_log_buffer.record(q)
         
         # 返回结果
         return jsonify({
@@ -745,7 +800,9 @@ def search():
             'data': {
                 'works': works_data,
                 'characters': characters_data,
-                'total': len(works_data) + len(characters_data),
+                'works_total': works_total,
+                'characters_total': characters_total,
+                'total': works_total + characters_total,
                 'page': page,
                 'per_page': per_page
             }
@@ -772,14 +829,12 @@ def get_hot_keywords():
     
     查询参数:
         limit: 返回数量，默认10，最大20
-        days: 统计最近多少天的数据，默认7天
+        days: 统计最近多少天的数据（含今天，按天汇总），默认7天
     
     返回结果:
         keywords: 热门搜索词列表，按搜索次数降序
     """
     try:
-        from datetime import timedelta
-        
         # 获取查询参数
         limit = request.args.get('limit', 10, type=int)
         days = request.args.get('days', 7, type=int)
@@ -794,26 +849,8 @@ def get_hot_keywords():
         if days < 1:
             days = 7
         
-        # 计算时间范围
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        # 统计热门搜索词
-        hot_keywords = db.session.query(
-            SearchLog.keyword,
-            func.count(SearchLog.id).label('count')
-        ).filter(
-            SearchLog.created_at >= start_date
-        ).group_by(
-            SearchLog.keyword
-        ).order_by(
-            func.count(SearchLog.id).desc()
-        ).limit(limit).all()
-        
-        # 转换为列表格式
-        keywords_data = [
-            {'keyword': kw.keyword, 'count': kw.count}
-            for kw in hot_keywords
-        ]
+        # 从按天汇总表读取（带短时缓存）
+        keywords_data = hot_keywords.get_hot_keywords(days, limit)
         
         return jsonify({
             'code': 200,
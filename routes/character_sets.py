@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, CharacterSet, CharacterInSet, Character
+from serializers import serialize_character_sets
+from utils import get_cursor_args, keyset_paginate
 
 character_sets_bp = Blueprint('character_sets', __name__, url_prefix='/api/character-sets')
 
@@ -13,11 +15,23 @@ def get_character_sets():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 12, type=int)
 
-    pagination = CharacterSet.query.filter_by(user_id=current_user_id).order_by(
+    query = CharacterSet.query.filter_by(user_id=current_user_id)
+
+    # 游标分页模式（传入 cursor 参数时启用）
+    cursor, with_total = get_cursor_args()
+    if cursor is not None:
+        try:
+            result = keyset_paginate(query, CharacterSet, cursor, per_page,
+                                     order_column=CharacterSet.updated_at, with_total=with_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(result.to_dict('character_sets', serialize_character_sets(result.items))), 200
+
+    pagination = query.order_by(
         CharacterSet.updated_at.desc()
     ).paginate(page=page, per_page=per_page, error_out=False)
 
-    character_sets = [cs.to_dict() for cs in pagination.items]
+    character_sets = serialize_character_sets(pagination.items)
 
     return jsonify({
         'character_sets': character_sets,
@@ -168,9 +182,19 @@ def get_characters_in_set(set_id):
         return jsonify({'error': '字集不存在或无权限访问'}), 404
 
     # 获取字集内的单字
-    pagination = CharacterInSet.query.filter_by(
-        character_set_id=set_id
-    ).order_by(
+    query = CharacterInSet.query.filter_by(character_set_id=set_id)
+
+    # 游标分页模式（传入 cursor 参数时启用）
+    cursor, with_total = get_cursor_args()
+    if cursor is not None:
+        try:
+            result = keyset_paginate(query, CharacterInSet, cursor, per_page,
+                                     order_column=CharacterInSet.added_at, with_total=with_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(result.to_dict('characters', [char_in_set.to_dict() for char_in_set in result.items])), 200
+
+    pagination = query.order_by(
         CharacterInSet.added_at.desc()
     ).paginate(page=page, per_page=per_page, error_out=False)
 
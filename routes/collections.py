@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Collection, Work
+from models import db, Collection, Work, User
+from utils import adjust_counter, get_cursor_args, keyset_paginate
+from serializers import serialize_collections
 
 collections_bp = Blueprint('collections', __name__, url_prefix='/api/collections')
 
@@ -12,11 +14,22 @@ def get_collections():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 12, type=int)
 
-    pagination = Collection.query.filter_by(user_id=current_user_id).order_by(
+    query = Collection.query.filter_by(user_id=current_user_id)
+
+    # 游标分页模式（传入 cursor 参数时启用）
+    cursor, with_total = get_cursor_args()
+    if cursor is not None:
+        try:
+            result = keyset_paginate(query, Collection, cursor, per_page, with_total=with_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(result.to_dict('collections', serialize_collections(result.items))), 200
+
+    pagination = query.order_by(
         Collection.created_at.desc()
     ).paginate(page=page, per_page=per_page, error_out=False)
 
-    collections = [collection.to_dict() for collection in pagination.items]
+    collections = serialize_collections(pagination.items)
 
     return jsonify({
         'collections': collections,
@@ -58,6 +71,8 @@ def add_collection():
 
     try:
         db.session.add(collection)
+        adjust_counter(Work, work.id, 'collections_count', 1)
+        adjust_counter(User, current_user_id, 'collections_count', 1)
         db.session.commit()
         return jsonify({
             'message': '收藏成功',
@@ -83,6 +98,8 @@ def remove_collection(work_id):
 
     try:
         db.session.delete(collection)
+        adjust_counter(Work, work_id, 'collections_count', -1)
+        adjust_counter(User, current_user_id, 'collections_count', -1)
         db.session.commit()
         return jsonify({'message': '取消收藏成功'}), 200
     except Exception as e:
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Comment, Work
+from utils import adjust_counter, get_cursor_args, keyset_paginate
+from serializers import serialize_comment_threads
 
 comments_bp = Blueprint('comments', __name__, url_prefix='/api/comments')
 
@@ -35,6 +37,7 @@ def create_comment():
 
     try:
         db.session.add(comment)
+        adjust_counter(Work, work.id, 'comments_count', 1)
         db.session.commit()
         return jsonify({
             'message': '评论成功',
@@ -54,13 +57,31 @@ def get_work_comments(work_id):
 
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
+    # 回复展开层数（默认1层）与每层回复上限（默认不限）
+    depth = request.args.get('depth', 1, type=int)
+    reply_limit = request.args.get('reply_limit', type=int)
 
     # 只获取顶级评论（没有父评论的）
-    pagination = Comment.query.filter_by(work_id=work_id, parent_id=None).order_by(
+    query = Comment.query.filter_by(work_id=work_id, parent_id=None)
+
+    # 游标分页模式（传入 cursor 参数时启用）
+    cursor, with_total = get_cursor_args()
+    if cursor is not None:
+        try:
+            result = keyset_paginate(query, Comment, cursor, per_page, with_total=with_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(result.to_dict('comments', serialize_comment_threads(
+            Comment, result.items, max_depth=depth, max_replies=reply_limit
+        ))), 200
+
+    pagination = query.order_by(
         Comment.created_at.desc()
     ).paginate(page=page, per_page=per_page, error_out=False)
 
-    comments = [comment.to_dict(include_replies=True) for comment in pagination.items]
+    comments = serialize_comment_threads(
+        Comment, pagination.items, max_depth=depth, max_replies=reply_limit
+    )
 
     return jsonify({
         'comments': comments,
@@ -115,7 +136,13 @@ def delete_comment(comment_id):
         return jsonify({'error': '无权删除此评论'}), 403
 
     try:
+        work_id = comment.work_id
         db.session.delete(comment)
+        db.session.flush()
+        # 删除评论会级联删除其所有回复，直接按剩余评论重算计数
+        work = Work.query.get(work_id)
+        if work:
+            work.comments_count = Comment.query.filter_by(work_id=work_id).count()
         db.session.commit()
         return jsonify({'message': '评论删除成功'}), 200
     except Exception as e:
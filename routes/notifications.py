@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Notification
+from utils import get_cursor_args, keyset_paginate
 from datetime import datetime, timedelta
 
 notifications_bp = Blueprint('notifications', __name__, url_prefix='/api/notifications')
@@ -26,6 +27,15 @@ def get_notifications():
     if notification_type != 'all':
         query = query.filter_by(type=notification_type)
     
+    # 游标分页模式（传入 cursor 参数时启用）
+    cursor, with_total = get_cursor_args()
+    if cursor is not None:
+        try:
+            result = keyset_paginate(query, Notification, cursor, per_page, with_total=with_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(result.to_dict('notifications', [notification.to_dict() for notification in result.items])), 200
+
     # 按创建时间降序排序
     query = query.order_by(Notification.created_at.desc())
     
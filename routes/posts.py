@@ -3,7 +3,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 from models import db, Post, PostLike, PostComment, Checkin, User, Topic
-from utils import create_notification
+from utils import create_notification, adjust_counter, get_cursor_args, keyset_paginate
+from serializers import serialize_posts, liked_post_ids, serialize_comment_threads
 from datetime import datetime, date
 import json
 import traceback
@@ -97,6 +98,9 @@ def create_post():
     # 更新话题帖子计数
     topic = Topic.query.get(topic_id)
     topic.post_count += 1
+
+    # 更新作者帖子计数
+    adjust_counter(User, current_user_id, 'posts_count', 1)
     
     db.session.commit()
 
@@ -141,9 +145,20 @@ def get_posts():
         else:
             query = query.order_by(Post.created_at.asc())
 
-    # 分页查询
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    posts = pagination.items
+    # 分页查询：传入 cursor 参数时使用游标分页（仅支持按创建时间排序）
+    cursor, with_total = get_cursor_args()
+    if cursor is not None:
+        if sort_by in ('likes_count', 'comments_count'):
+            return jsonify({'error': '游标分页仅支持按创建时间排序'}), 400
+        try:
+            result = keyset_paginate(query, Post, cursor, per_page,
+                                     descending=(order == 'desc'), with_total=with_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        posts = result.items
+    else:
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        posts = pagination.items
 
     # 获取当前用户ID（如果有）
     # 由于临时移除了JWT验证，设置默认值为None
@@ -152,9 +167,9 @@ def get_posts():
     try:
         # 尝试获取JWT身份，但不强制要求
         try:
-            from flask_jwt_extended import verify_jwt_in_request_optional, get_jwt_identity
-            # 首先调用verify_jwt_in_request_optional()来安全地验证JWT
-            verify_jwt_in_request_optional()
+            from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+            # 首先以可选模式验证JWT，未携带token时不报错
+            verify_jwt_in_request(optional=True)
             # 然后再尝试获取用户ID
             current_user_id = get_jwt_identity()
         except ImportError:
@@ -164,19 +179,16 @@ def get_posts():
         # 如果JWT验证失败或不存在，保持current_user_id为None
         pass
 
-    # 构建响应数据
+    # 构建响应数据：计数、作者批量加载，点赞状态整页一次查询（未登录时为空集合）
+    liked_ids = liked_post_ids(current_user_id, [post.id for post in posts])
     posts_data = []
-    for post in posts:
-        post_dict = post.to_dict()
-        # 添加是否点赞信息（仅当用户已登录时）
-        if current_user_id:
-            post_dict['is_liked'] = PostLike.query.filter_by(
-                user_id=current_user_id, post_id=post.id
-            ).first() is not None
-        else:
-            post_dict['is_liked'] = False
+    for post, post_dict in zip(posts, serialize_posts(posts)):
+        post_dict['is_liked'] = post.id in liked_ids
         posts_data.append(post_dict)
 
+    if cursor is not None:
+        return jsonify(result.to_dict('posts', posts_data)), 200
+
     return jsonify({
         'posts': posts_data,
         'total': pagination.total,
@@ -211,7 +223,11 @@ def get_post(post_id):
     comments = PostComment.query.filter_by(
         post_id=post_id, parent_id=None
     ).order_by(PostComment.created_at.desc()).all()
-    post_dict['comments'] = [comment.to_dict(include_replies=True) for comment in comments]
+    post_dict['comments'] = serialize_comment_threads(
+        PostComment, comments,
+        max_depth=request.args.get('depth', 1, type=int),
+        max_replies=request.args.get('reply_limit', type=int)
+    )
 
     return jsonify(post_dict)
 
@@ -313,6 +329,7 @@ def delete_post(post_id):
         return jsonify({'error': '无权删除该帖子'}), 403
 
     db.session.delete(post)
+    adjust_counter(User, user_id, 'posts_count', -1)
     db.session.commit()
 
     return jsonify({'message': '帖子已删除'})
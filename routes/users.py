@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, User, Work, Follow
-from utils import allowed_file, save_upload_file, create_notification
+from utils import allowed_file, save_upload_file, create_notification, adjust_counter, get_cursor_args, keyset_paginate
+from serializers import serialize_works
+import image_derivatives
 import os
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
@@ -28,11 +30,22 @@ def get_user_works(user_id):
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 12, type=int)
 
-    pagination = Work.query.filter_by(author_id=user_id, status='approved').order_by(
+    query = Work.query.filter_by(author_id=user_id, status='approved')
+
+    # 游标分页模式（传入 cursor 参数时启用）
+    cursor, with_total = get_cursor_args()
+    if cursor is not None:
+        try:
+            result = keyset_paginate(query, Work, cursor, per_page, with_total=with_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(result.to_dict('works', serialize_works(result.items, include_author=False))), 200
+
+    pagination = query.order_by(
         Work.created_at.desc()
     ).paginate(page=page, per_page=per_page, error_out=False)
 
-    works = [work.to_dict(include_author=False) for work in pagination.items]
+    works = serialize_works(pagination.items, include_author=False)
 
     return jsonify({
         'works': works,
@@ -110,12 +123,19 @@ def upload_avatar():
     if not filename:
         return jsonify({'error': '文件上传失败'}), 500
 
+    # 生成头像缩略图，失败时首次访问再补生成
+    try:
+        image_derivatives.generate_derivatives(filename, 'avatars')
+    except Exception as e:
+        print(f"头像衍生图生成失败: {e}")
+
     # 删除旧头像（如果不是默认头像）
     if user.avatar and user.avatar != 'default_avatar.png':
         from flask import current_app
         old_file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'avatars', user.avatar)
         if os.path.exists(old_file_path):
             os.remove(old_file_path)
+        image_derivatives.delete_derivatives(user.avatar, 'avatars')
 
     user.avatar = filename
 
@@ -123,7 +143,8 @@ def upload_avatar():
         db.session.commit()
         return jsonify({
             'message': '头像上传成功',
-            'avatar': filename
+            'avatar': filename,
+            'avatar_urls': user.avatar_urls()
         }), 200
     except Exception as e:
         db.session.rollback()
@@ -175,13 +196,23 @@ def get_user_following(user_id):
     # 获取当前用户的ID（如果已登录）
     current_user_id = get_jwt_identity()
 
-    # 查询用户关注的人
-    pagination = Follow.query.filter_by(follower_id=user_id).order_by(
-        Follow.created_at.desc()
-    ).paginate(page=page, per_page=per_page, error_out=False)
+    # 查询用户关注的人：传入 cursor 参数时使用游标分页
+    query = Follow.query.filter_by(follower_id=user_id)
+    cursor, with_total = get_cursor_args()
+    if cursor is not None:
+        try:
+            result = keyset_paginate(query, Follow, cursor, per_page, with_total=with_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        follows = result.items
+    else:
+        pagination = query.order_by(
+            Follow.created_at.desc()
+        ).paginate(page=page, per_page=per_page, error_out=False)
+        follows = pagination.items
 
     following_list = []
-    for follow in pagination.items:
+    for follow in follows:
         followed_user = follow.followed
         is_following = False
         if current_user_id:
@@ -195,13 +226,17 @@ def get_user_following(user_id):
             'id': followed_user.id,
             'username': followed_user.username,
             'avatar': followed_user.avatar,
+            'avatar_urls': followed_user.avatar_urls(),
             'bio': followed_user.bio,
-            'followers_count': followed_user.followers.count(),
-            'following_count': followed_user.following.count(),
+            'followers_count': followed_user.followers_count or 0,
+            'following_count': followed_user.following_count or 0,
             'is_following': is_following,
             'followed_at': follow.created_at.isoformat()
         })
 
+    if cursor is not None:
+        return jsonify(result.to_dict('following', following_list)), 200
+
     return jsonify({
         'following': following_list,
         'total': pagination.total,
@@ -226,13 +261,23 @@ def get_user_followers(user_id):
     # 获取当前用户的ID（如果已登录）
     current_user_id = get_jwt_identity()
 
-    # 查询关注该用户的人
-    pagination = Follow.query.filter_by(followed_id=user_id).order_by(
-        Follow.created_at.desc()
-    ).paginate(page=page, per_page=per_page, error_out=False)
+    # 查询关注该用户的人：传入 cursor 参数时使用游标分页
+    query = Follow.query.filter_by(followed_id=user_id)
+    cursor, with_total = get_cursor_args()
+    if cursor is not None:
+        try:
+            result = keyset_paginate(query, Follow, cursor, per_page, with_total=with_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        follows = result.items
+    else:
+        pagination = query.order_by(
+            Follow.created_at.desc()
+        ).paginate(page=page, per_page=per_page, error_out=False)
+        follows = pagination.items
 
     followers_list = []
-    for follow in pagination.items:
+    for follow in follows:
         follower_user = follow.follower
         is_following = False
         if current_user_id:
@@ -242,13 +287,17 @@ def get_user_followers(user_id):
             'id': follower_user.id,
             'username': follower_user.username,
             'avatar': follower_user.avatar,
+            'avatar_urls': follower_user.avatar_urls(),
             'bio': follower_user.bio,
-            'followers_count': follower_user.followers.count(),
-            'following_count': follower_user.following.count(),
+            'followers_count': follower_user.followers_count or 0,
+            'following_count': follower_user.following_count or 0,
             'is_following': is_following,
             'followed_at': follow.created_at.isoformat()
         })
 
+    if cursor is not None:
+        return jsonify(result.to_dict('followers', followers_list)), 200
+
     return jsonify({
         'followers': followers_list,
         'total': pagination.total,
@@ -297,6 +346,8 @@ def follow_user(user_id):
     
     try:
         db.session.add(new_follow)
+        adjust_counter(User, current_user_id, 'following_count', 1)
+        adjust_counter(User, user_id, 'followers_count', 1)
         db.session.commit()
         
         # 发送关注通知
@@ -328,6 +379,8 @@ def unfollow_user(user_id):
     
     try:
         db.session.delete(follow)
+        adjust_counter(User, follow.follower_id, 'following_count', -1)
+        adjust_counter(User, follow.followed_id, 'followers_count', -1)
         db.session.commit()
         return jsonify({
             'message': '取消关注成功',
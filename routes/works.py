@@ -1,12 +1,21 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Work, Like, Collection, Character
-from utils import allowed_file, save_upload_file
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
+from models import db, Work, Like, Collection, Character, User
+from utils import allowed_file, save_upload_file, adjust_counter, get_cursor_args, keyset_paginate
+from serializers import serialize_works
+import search_index
+from search_index import match_work_ids
+import ocr_service
+import image_derivatives
+import character_crops
+import character_atlas
+import single_flight
+from ocr_service import OcrError
+from ocr_jobs import ocr_job_queue, OcrJobLimitError
+from sqlalchemy import false
+from sqlalchemy.orm import joinedload
 import os
-import base64
 import json
-import uuid
-import requests
 from datetime import datetime
 from io import BytesIO
 
@@ -25,7 +34,7 @@ def get_works():
     per_page = request.args.get('per_page', 12, type=int)
     style = request.args.get('style')
     status = request.args.get('status', 'approved')
-    search = request.args.get('search')
+    search = (request.args.get('search') or '').strip()
     author = request.args.get('author')
     dynasty = request.args.get('dynasty')
     source_type = request.args.get('source_type')
@@ -52,21 +61,36 @@ def get_works():
     if source_type:
         query = query.filter_by(source_type=source_type)
 
-    # 搜索
+    # 搜索：优先使用全文索引，非 SQLite 数据库时回退到 LIKE
     if search:
-        query = query.filter(
-            Work.title.contains(search) | 
-            Work.description.contains(search) |
-            Work.author_name.contains(search) |
-            Work.dynasty.contains(search)
-        )
+        if search_index.is_available():
+            work_ids = match_work_ids(search)
+            # 只有标点等无法检索的输入不匹配任何作品
+            query = query.filter(Work.id.in_(work_ids) if work_ids is not None else false())
+        else:
+            query = query.filter(
+                Work.title.contains(search) | 
+                Work.description.contains(search) |
+                Work.author_name.contains(search) |
+                Work.dynasty.contains(search)
+            )
+
+    # 游标分页模式（传入 cursor 参数时启用）
+    cursor, with_total = get_cursor_args()
+    if cursor is not None:
+        try:
+            result = keyset_paginate(query, Work, cursor, per_page, with_total=with_total)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(result.to_dict('works', serialize_works(result.items))), 200
 
     # 分页
     pagination = query.order_by(Work.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
 
-    works = [work.to_dict() for work in pagination.items]
+    # 批量序列化，整页查询次数与每页数量无关
+    works = serialize_works(pagination.items)
 
     return jsonify({
         'works': works,
@@ -147,6 +171,12 @@ def create_work():
     if not filename:
         return jsonify({'error': '文件上传失败'}), 500
 
+    # 生成列表与详情页使用的多尺寸衍生图，失败时首次访问再补生成
+    try:
+        image_derivatives.generate_derivatives(filename, 'works')
+    except Exception as e:
+        print(f"作品衍生图生成失败: {e}")
+
     # 获取作品基本信息
     title = request.form.get('title')
     description = request.form.get('description', '')
@@ -193,6 +223,7 @@ def create_work():
         db.session.flush()  # 获取work.id，用于创建Character记录
         
         # 处理单字分割结果，创建Character记录
+        characters_count = 0
         if characters:
             for char_data in characters:
                 # 确保单字数据包含必要字段
@@ -217,6 +248,9 @@ def create_work():
                             height=y2 - y1  # 计算高度
                         )
                         db.session.add(character)
+                        characters_count += 1
+        work.characters_count = characters_count
+        adjust_counter(User, current_user_id, 'works_count', 1)
         
         db.session.commit()
         return jsonify({
@@ -285,9 +319,21 @@ def delete_work(work_id):
             file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'works', work.image_url)
             if os.path.exists(file_path):
                 os.remove(file_path)
+            image_derivatives.delete_derivatives(work.image_url, 'works')
+        character_ids = [row.id for row in db.session.query(Character.id).filter_by(work_id=work.id)]
+
+        # 作品删除会级联删除其收藏记录，同步扣减收藏者的收藏计数
+        collector_ids = db.select(Collection.user_id).where(Collection.work_id == work.id)
+        User.query.filter(User.id.in_(collector_ids)).update(
+            {User.collections_count: User.collections_count - 1},
+            synchronize_session=False
+        )
+        adjust_counter(User, work.author_id, 'works_count', -1)
 
         db.session.delete(work)
         db.session.commit()
+        for character_id in character_ids:
+            character_crops.invalidate(character_id)
         return jsonify({'message': '作品删除成功'}), 200
     except Exception as e:
         db.session.rollback()
@@ -313,6 +359,7 @@ def like_work(work_id):
 
     try:
         db.session.add(like)
+        adjust_counter(Work, work_id, 'likes_count', 1)
         db.session.commit()
         return jsonify({'message': '点赞成功'}), 201
     except Exception as e:
@@ -332,6 +379,7 @@ def unlike_work(work_id):
 
     try:
         db.session.delete(like)
+        adjust_counter(Work, work_id, 'likes_count', -1)
         db.session.commit()
         return jsonify({'message': '取消点赞成功'}), 200
     except Exception as e:
@@ -353,6 +401,36 @@ def get_work_characters(work_id):
     return jsonify({'characters': characters_data}), 200
 
 
+@works_bp.route('/<int:work_id>/characters/atlas', methods=['GET'])
+def get_work_character_atlas(work_id):
+    """
+    获取作品的单字精灵图坐标表
+
+    全部单字裁剪后按统一格子尺寸拼成一张图片，单字变化后下次访问时重新生成。
+
+    Response JSON:
+    - atlas_url: 精灵图 URL（文件名带版本，可长期缓存）
+    - width/height/cell_size: 精灵图与格子尺寸
+    - characters: 单字ID -> 精灵图中的矩形 {x, y, width, height}
+    """
+    work = Work.query.get(work_id)
+    if not work:
+        return jsonify({'error': '作品不存在'}), 404
+
+    try:
+        atlas = character_atlas.get_atlas(work)
+    except single_flight.SingleFlightTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'error': f'生成精灵图失败: {str(e)}'}), 500
+    if atlas is None:
+        return jsonify({'error': '作品图片不存在'}), 404
+
+    response = jsonify(atlas)
+    response.set_etag(atlas['version'])
+    return response.make_conditional(request)
+
+
 @works_bp.route('/<int:work_id>/characters', methods=['POST'])
 @jwt_required()
 def add_work_character(work_id):
@@ -398,6 +476,7 @@ def add_work_character(work_id):
 
     try:
         db.session.add(character)
+        adjust_counter(Work, work_id, 'characters_count', 1)
         db.session.commit()
         return jsonify({
             'message': '单字添加成功',
@@ -424,7 +503,9 @@ def delete_character(character_id):
 
     try:
         db.session.delete(character)
+        adjust_counter(Work, character.work_id, 'characters_count', -1)
         db.session.commit()
+        character_crops.invalidate(character_id)
         return jsonify({'message': '单字删除成功'}), 200
     except Exception as e:
         db.session.rollback()
@@ -450,6 +531,8 @@ def update_character(character_id):
     if not data:
         return jsonify({'error': '未接收到数据'}), 400
 
+    old_box = (character.x, character.y, character.width, character.height)
+
     # 更新单字字段
     if 'recognition' in data:
         character.recognition = data['recognition']
@@ -470,8 +553,13 @@ def update_character(character_id):
     if 'keypoints' in data:
         character.keypoints = data['keypoints']
 
+    # 单字框变化时裁剪图缓存失效
+    box_changed = (character.x, character.y, character.width, character.height) != old_box
+
     try:
         db.session.commit()
+        if box_changed:
+            character_crops.invalidate(character_id)
         return jsonify({
             'message': '单字更新成功',
             'character': character.to_dict()
@@ -501,28 +589,142 @@ def get_character(character_id):
         return jsonify({'error': f'获取单字详情失败: {str(e)}'}), 500
 
 
+@works_bp.route('/characters/<int:character_id>/image', methods=['GET'])
+def get_character_image(character_id):
+    """
+    获取单字裁剪图（服务端从作品图片裁出，磁盘缓存）
+
+    Query Params:
+    - padding: 四周边距（单字坐标尺度的像素，0 到 CHARACTER_CROP_MAX_PADDING），默认0
+    - size: 目标尺寸（最长边像素），向上取到 CHARACTER_CROP_SIZES 中的档位；不传保持裁剪尺寸
+    - format: webp（默认）/ jpeg / png
+
+    Response:
+    - 图片，带强 ETag；If-None-Match 命中时返回 304
+    """
+    padding = request.args.get('padding', 0, type=int)
+    size = request.args.get('size', type=int)
+    image_format = request.args.get('format', 'webp').lower()
+    if padding < 0 or padding > current_app.config.get('CHARACTER_CROP_MAX_PADDING', 50):
+        return jsonify({'error': 'padding 超出范围'}), 400
+    if size is not None and size <= 0:
+        return jsonify({'error': 'size 必须为正整数'}), 400
+    if image_format not in character_crops.FORMATS:
+        return jsonify({'error': '不支持的图片格式'}), 400
+
+    character = Character.query.get(character_id)
+    if not character:
+        return jsonify({'error': '单字不存在'}), 404
+    work = Work.query.get(character.work_id)
+    if not work or not work.image_url:
+        return jsonify({'error': '作品图片不存在'}), 404
+
+    try:
+        path, key = character_crops.get_crop(
+            character, work, padding=padding,
+            size=character_crops.snap_size(size), image_format=image_format
+        )
+    except Exception as e:
+        return jsonify({'error': f'裁剪单字失败: {str(e)}'}), 500
+    if path is None:
+        return jsonify({'error': '作品图片不存在或单字区域超出图片范围'}), 404
+
+    return send_file(
+        path,
+        mimetype=character_crops.FORMATS[image_format][1],
+        etag=key,
+        conditional=True,
+        max_age=current_app.config.get('CHARACTER_CROP_CACHE_MAX_AGE', 24 * 3600)
+    )
+
+
+def _filtered_characters_query():
+    """按查询参数 style / work_id / recognition 构建单字查询，并预加载所属作品"""
+    query = Character.query.options(
+        joinedload(Character.work).load_only(
+            Work.id, Work.image_url, Work.original_width, Work.original_height
+        )
+    )
+
+    style = request.args.get('style')
+    work_id = request.args.get('work_id', type=int)
+    recognition = request.args.get('recognition')
+
+    if style:
+        query = query.filter(Character.style == style)
+    if work_id:
+        query = query.filter(Character.work_id == work_id)
+    if recognition:
+        query = query.filter(Character.recognition == recognition)
+
+    return query
+
+
 @works_bp.route('/characters', methods=['GET'])
 def get_all_characters():
     """
-    获取所有可用单字列表
+    获取单字列表（分页）
+    
+    Query Params:
+    - page/per_page: 页码分页，per_page 默认50，最大200
+    - cursor/with_total: 游标分页（见 utils.keyset_paginate）
+    - style/work_id/recognition: 过滤条件
     
     Response JSON:
     - characters: 单字列表
     - total: 单字总数
     """
     try:
-        # 获取所有单字，按采集时间倒序排列
-        characters = Character.query.order_by(Character.collected_at.desc()).all()
-        characters_data = [char.to_dict() for char in characters]
+        page = request.args.get('page', 1, type=int)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+        query = _filtered_characters_query()
+
+        # 游标分页模式（传入 cursor 参数时启用）
+        cursor, with_total = get_cursor_args()
+        if cursor is not None:
+            try:
+                result = keyset_paginate(query, Character, cursor, per_page,
+                                         order_column=Character.collected_at, with_total=with_total,
+                                         max_per_page=200)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify(result.to_dict('characters', [char.to_dict() for char in result.items])), 200
+
+        # 按采集时间倒序排列
+        pagination = query.order_by(Character.collected_at.desc(), Character.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        characters_data = [char.to_dict() for char in pagination.items]
         
         return jsonify({
             'characters': characters_data,
-            'total': len(characters_data)
+            'total': pagination.total,
+            'page': page,
+            'per_page': per_page,
+            'pages': pagination.pages
         }), 200
     except Exception as e:
         return jsonify({'error': f'获取单字列表失败: {str(e)}'}), 500
 
 
+@works_bp.route('/characters/export', methods=['GET'])
+def export_characters():
+    """
+    以 NDJSON 流式导出单字（每行一个单字JSON）
+    
+    支持与单字列表相同的 style/work_id/recognition 过滤条件。
+    使用 yield_per 分批读取，内存占用与总行数无关，适合导出类调用方。
+    """
+    query = _filtered_characters_query().order_by(Character.id.asc())
+    batch_size = current_app.config.get('CHARACTER_EXPORT_BATCH_SIZE', 500)
+
+    def generate():
+        for char in query.yield_per(batch_size):
+            yield json.dumps(char.to_dict(), ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @works_bp.route('/config', methods=['GET'])
 def get_work_config():
     """获取作品上传的预配置信息
@@ -596,17 +798,28 @@ def get_work_config():
 
 @works_bp.route('/ocr', methods=['POST'])
 def ocr_recognize():
-    """调用古籍OCR API，对上传的图片进行识别，并将结果JSON暂存到 json_temp 目录。
+    """提交古籍 OCR 识别任务，识别结果JSON暂存到 json_temp 目录。
+    
+    同一图片与参数已识别过时直接返回缓存结果；否则创建异步任务并立即返回任务ID，
+    完成后推送 ocr_job_completed 事件到 user_<id> 房间，也可轮询 GET /api/works/ocr/jobs/<job_id>。
     
     Request JSON:
     - image: base64 数据（可包含 dataURL 前缀）
     - det_mode/version/return_position: 可选透传参数
+    - tiled: 可选，true/false 强制开启/关闭大图分块识别，缺省时最长边超过 OCR_TILE_TRIGGER_SIZE 自动分块
     
-    Response JSON:
-    - message: success | error
+    Response JSON（命中缓存，200）:
+    - message: success
+    - status: succeeded
     - temp_json_path: 暂存JSON文件的相对路径
     - boxes: 提取的字符框 [{text, position:[x1,y1,x2,y2], confidence, det_confidence}]
     - image_size: {width, height} 原图尺寸（如可获取）
+    - cached: true
+    
+    Response JSON（已创建任务，202）:
+    - message: success
+    - status: pending
+    - job_id: 任务ID
     """
     try:
         # 解析请求数据
@@ -614,127 +827,52 @@ def ocr_recognize():
             req_data = request.get_json(silent=True) or {}
         except Exception as e:
             return jsonify({'message': 'error', 'info': f'请求数据格式错误: {str(e)}'}), 400
-        
-        # 检查必要参数
-        image_b64 = req_data.get('image', '')
-        if not image_b64:
-            return jsonify({'message': 'error', 'info': '缺少 image(base64) 参数'}), 400
 
-        # 处理 base64 数据
         try:
-            # 去掉 dataURL 前缀
-            if ',' in image_b64:
-                image_b64 = image_b64.split(',', 1)[1]
-            
-            # 验证 base64 格式
-            base64.b64decode(image_b64, validate=True)
-        except Exception as e:
-            return jsonify({'message': 'error', 'info': f'base64 格式错误: {str(e)}'}), 400
-
-        # 读取原图尺寸（如果 Pillow 可用）
-        orig_width = None
-        orig_height = None
-        if _PIL_AVAILABLE:
-            try:
-                img_bytes = base64.b64decode(image_b64)
-                with Image.open(BytesIO(img_bytes)) as im:
-                    orig_width, orig_height = im.size
-            except Exception:
-                pass  # 忽略尺寸获取失败，继续执行
-
-        # 获取 OCR API 配置
-        token = os.getenv('Token', '').strip('"').strip("'")
-        email = os.getenv('Email', '').strip('"').strip("'")
-        if not token or not email:
-            return jsonify({'message': 'error', 'info': '服务器未配置 OCR Token/Email 环境变量'}), 500
-
-        # 组装 OCR API 请求参数
-        params = {
-            'token': token,
-            'email': email,
-            'image': image_b64
-        }
-        for key in ('det_mode', 'version', 'return_position'):
-            if key in req_data:
-                params[key] = req_data[key]
-        # 默认参数确保返回位置信息
-        params.setdefault('return_position', True)
-        params.setdefault('version', 'v2')
-        params.setdefault('det_mode', 'auto')
-
-        # 调用远端 OCR API
-        try:
-            api_url = 'https://ocr.kandianguji.com/ocr_api'
-            resp = requests.post(api_url, json=params, timeout=30)
-            resp.raise_for_status()  # 检查 HTTP 响应状态码
-            api_json = resp.json()
-        except requests.exceptions.Timeout:
-            return jsonify({'message': 'error', 'info': 'OCR API 请求超时'}), 504
-        except requests.exceptions.ConnectionError:
-            return jsonify({'message': 'error', 'info': 'OCR API 连接失败'}), 503
-        except requests.exceptions.HTTPError as e:
-            return jsonify({'message': 'error', 'info': f'OCR API 请求失败: HTTP {e.response.status_code}'}), 502
-        except requests.exceptions.RequestException as e:
-            return jsonify({'message': 'error', 'info': f'OCR API 请求失败: {str(e)}'}), 502
-        except ValueError:
-            return jsonify({'message': 'error', 'info': 'OCR API 返回格式错误'}), 502
-
-        # 验证 OCR API 返回结果
-        if not isinstance(api_json, dict):
-            return jsonify({'message': 'error', 'info': 'OCR API 返回格式错误'}), 502
-        
-        if api_json.get('message') != 'success':
-            return jsonify({'message': 'error', 'info': f'OCR 识别失败: {api_json.get("info", "未知错误")}'}), 502
-
-        # 确保 json_temp 目录存在
+            image_bytes = ocr_service.decode_image(req_data.get('image', ''))
+            params = ocr_service.build_params(req_data)
+            result = ocr_service.cached_result(image_bytes, params)
+        except OcrError as e:
+            return jsonify({'message': 'error', 'info': e.info}), e.status_code
+
+        # 命中缓存直接返回
+        if result is not None:
+            return jsonify({'message': 'success', 'status': 'succeeded', **result}), 200
+
+        # 创建异步任务（登录用户按用户限流，未登录按 IP）
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+        user_id = int(identity) if identity else None
+        client_key = f'user:{user_id}' if user_id else f'ip:{request.remote_addr}'
         try:
-            from flask import current_app
-            json_temp_dir = os.path.join(os.path.dirname(current_app.instance_path), 'json_temp')
-            os.makedirs(json_temp_dir, exist_ok=True)
-        except Exception as e:
-            return jsonify({'message': 'error', 'info': f'创建临时目录失败: {str(e)}'}), 500
+            job = ocr_job_queue.submit(image_bytes, params, user_id=user_id, client_key=client_key)
+        except OcrJobLimitError as e:
+            return jsonify({'message': 'error', 'info': str(e)}), 429
 
-        # 保存 OCR 结果到临时文件
-        try:
-            filename = f"ocr_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}.json"
-            temp_path = os.path.join(json_temp_dir, filename)
-            with open(temp_path, 'w', encoding='utf-8') as f:
-                json.dump(api_json, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            return jsonify({'message': 'error', 'info': f'保存 OCR 结果失败: {str(e)}'}), 500
-
-        # 提取字符框数据
-        boxes = []
-        try:
-            data = api_json.get('data', {})
-            text_lines = data.get('text_lines', [])
-            for line_idx, text_line in enumerate(text_lines):
-                words = text_line.get('words', [])
-                for word_idx, word in enumerate(words):
-                    text = word.get('text', '')
-                    position = word.get('position', [])
-                    confidence = word.get('confidence', 0.0)
-                    det_confidence = word.get('det_confidence', 0.0)
-                    if text and isinstance(position, list) and len(position) >= 4:
-                        boxes.append({
-                            'text': text,
-                            'position': position[:4],  # [x1,y1,x2,y2]
-                            'confidence': confidence,
-                            'det_confidence': det_confidence,
-                            'line_index': line_idx,
-                            'word_index': word_idx
-                        })
-        except Exception as e:
-            return jsonify({'message': 'error', 'info': f'处理 OCR 结果失败: {str(e)}'}), 500
-
-        # 返回成功结果
-        return jsonify({
-            'message': 'success',
-            'temp_json_path': f"json_temp/{filename}",
-            'boxes': boxes,
-            'image_size': {'width': orig_width, 'height': orig_height} if orig_width and orig_height else None
-        }), 200
+        return jsonify({'message': 'success', 'status': job.status, 'job_id': job.id}), 202
 
     except Exception as e:
         # 捕获所有未处理的异常
         return jsonify({'message': 'error', 'info': f'服务器内部错误: {str(e)}'}), 500
+
+
+@works_bp.route('/ocr/jobs/<job_id>', methods=['GET'])
+def get_ocr_job(job_id):
+    """查询 OCR 识别任务状态
+    
+    Response JSON:
+    - message: success
+    - job_id, status: pending | running | succeeded | failed
+    - 成功时附带 temp_json_path、boxes、image_size、cached；失败时附带 info、error_code
+    """
+    verify_jwt_in_request(optional=True)
+    job = ocr_job_queue.get(job_id)
+    if not job:
+        return jsonify({'message': 'error', 'info': '任务不存在'}), 404
+
+    # 登录用户创建的任务只有本人可以查看
+    identity = get_jwt_identity()
+    if job.user_id is not None and str(job.user_id) != str(identity):
+        return jsonify({'message': 'error', 'info': '无权查看此任务'}), 403
+
+    return jsonify({'message': 'success', **job.to_dict()}), 200
@@ -0,0 +1,223 @@
+"""
+全文检索索引
+基于 SQLite FTS5 为作品和单字建立全文索引，替代 ILIKE '%q%' 全表扫描
+
+unicode61 分词器会把连续的汉字当成一个词，单字无法命中。写入和查询前统一在每个汉字两侧
+插入空格（segment），使每个汉字成为独立的词，多字查询按短语匹配保证相邻。
+索引通过模型事件与 works / characters 表保持同步，也可以执行 `python rebuild_search_index.py` 全量重建。
+"""
+import re
+from sqlalchemy import event, inspect, text
+from models import db, Work, Character
+
+WORKS_FTS = 'works_fts'
+CHARACTERS_FTS = 'characters_fts'
+
+# 索引字段：FTS 表名 -> (模型, 字段列表)
+INDEXED_FIELDS = {
+    WORKS_FTS: (Work, ['title', 'description', 'author_name', 'dynasty', 'style', 'tags']),
+    CHARACTERS_FTS: (Character, ['recognition', 'source']),
+}
+
+# bm25 各字段权重，与 INDEXED_FIELDS 中字段顺序一致
+WORKS_RANK = 'bm25(works_fts, 10.0, 1.0, 5.0, 3.0, 2.0, 3.0)'
+CHARACTERS_RANK = 'bm25(characters_fts, 10.0, 1.0)'
+
+# 覆盖 CJK 统一汉字及扩展区
+_CJK_RE = re.compile(r'([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\U00020000-\U0003134f])')
+
+# 不含字母、数字或汉字的片段（纯标点）分词后为空，不作为检索词
+_WORD_RE = re.compile(r'\w')
+
+# 已确认存在 FTS 表的数据库（按连接地址缓存，避免每次写入都查 sqlite_master）
+_ready_databases = set()
+
+
+def segment(value):
+    """将文本规范为 FTS 可索引的形式：每个汉字前后加空格，列表按空格拼接"""
+    if not value:
+        return ''
+    if isinstance(value, (list, tuple)):
+        value = ' '.join(str(v) for v in value)
+    return _CJK_RE.sub(r' \1 ', str(value)).strip()
+
+
+def build_match_query(keyword):
+    """
+    将用户输入转换为 FTS5 MATCH 表达式
+
+    按空白拆分为多个词，每个词经 segment 后作为一个短语（要求相邻），多个词之间为 AND。
+    纯标点的片段被忽略。
+
+    Returns:
+        str: MATCH 表达式，输入为空白或只有标点时返回 None
+    """
+    phrases = []
+    for term in (keyword or '').split():
+        tokens = [token.replace('"', '""') for token in segment(term).split() if _WORD_RE.search(token)]
+        if tokens:
+            phrases.append('"' + ' '.join(tokens) + '"')
+    return ' AND '.join(phrases) or None
+
+
+def _database_key(connection):
+    return str(connection.engine.url)
+
+
+def _has_index(connection):
+    """当前数据库是否为 SQLite 且已建立 FTS 表"""
+    if connection.dialect.name != 'sqlite':
+        return False
+    key = _database_key(connection)
+    if key in _ready_databases:
+        return True
+    row = connection.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': WORKS_FTS}
+    ).first()
+    if row:
+        _ready_databases.add(key)
+    return row is not None
+
+
+def is_available():
+    """全文索引是否可用，不可用时调用方应回退到 LIKE 查询"""
+    return _has_index(db.session.connection())
+
+
+def ensure_search_index():
+    """创建 FTS 表（已存在则跳过），仅对 SQLite 生效"""
+    connection = db.session.connection()
+    if connection.dialect.name != 'sqlite':
+        return False
+    for table, (_, fields) in INDEXED_FIELDS.items():
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} "
+            f"USING fts5({', '.join(fields)}, tokenize='unicode61')"
+        ))
+    db.session.commit()
+    _ready_databases.add(_database_key(connection))
+    return True
+
+
+def _index_row(connection, table, target):
+    _, fields = INDEXED_FIELDS[table]
+    connection.execute(text(f"DELETE FROM {table} WHERE rowid = :id"), {'id': target.id})
+    connection.execute(
+        text(f"INSERT INTO {table} (rowid, {', '.join(fields)}) "
+             f"VALUES (:id, {', '.join(':' + f for f in fields)})"),
+        {'id': target.id, **{f: segment(getattr(target, f)) for f in fields}}
+    )
+
+
+def _listen(table):
+    model, fields = INDEXED_FIELDS[table]
+
+    @event.listens_for(model, 'after_insert')
+    def after_insert(mapper, connection, target):
+        if _has_index(connection):
+            _index_row(connection, table, target)
+
+    @event.listens_for(model, 'after_update')
+    def after_update(mapper, connection, target):
+        # 只有索引字段变化时才重写索引（如浏览量自增不触发）
+        state = inspect(target)
+        if any(state.attrs[f].history.has_changes() for f in fields) and _has_index(connection):
+            _index_row(connection, table, target)
+
+    @event.listens_for(model, 'after_delete')
+    def after_delete(mapper, connection, target):
+        if _has_index(connection):
+            connection.execute(text(f"DELETE FROM {table} WHERE rowid = :id"), {'id': target.id})
+
+
+for _table in INDEXED_FIELDS:
+    _listen(_table)
+
+
+def rebuild_search_index(batch_size=500):
+    """清空并按源表重建全部 FTS 索引"""
+    ensure_search_index()
+    counts = {}
+    for table, (model, fields) in INDEXED_FIELDS.items():
+        db.session.execute(text(f"DELETE FROM {table}"))
+        insert = text(f"INSERT INTO {table} (rowid, {', '.join(fields)}) "
+                      f"VALUES (:id, {', '.join(':' + f for f in fields)})")
+        rows = []
+        count = 0
+        for obj in model.query.order_by(model.id).yield_per(batch_size):
+            rows.append({'id': obj.id, **{f: segment(getattr(obj, f)) for f in fields}})
+            if len(rows) >= batch_size:
+                db.session.execute(insert, rows)
+                count += len(rows)
+                rows = []
+        if rows:
+            db.session.execute(insert, rows)
+            count += len(rows)
+        counts[table] = count
+    db.session.commit()
+    return counts
+
+
+def match_work_ids(keyword):
+    """
+    返回匹配关键词的作品ID子查询，可直接用于 Work.id.in_(...)
+
+    Returns:
+        TextualSelect，关键词中没有可检索的词时返回 None（调用方不能直接传给 in_()）
+    """
+    match = build_match_query(keyword)
+    if not match:
+        return None
+    return text(f"SELECT rowid FROM {WORKS_FTS} WHERE {WORKS_FTS} MATCH :works_match").bindparams(
+        works_match=match
+    ).columns(Work.id)
+
+
+def search_works(keyword, page=1, per_page=20, status='approved'):
+    """
+    按相关度分页检索作品
+
+    Returns:
+        tuple: (作品列表（按相关度排序）, 匹配总数)
+    """
+    match = build_match_query(keyword)
+    if not match:
+        return [], 0
+    params = {'match': match, 'status': status}
+    where = (f"FROM {WORKS_FTS} JOIN works ON works.id = {WORKS_FTS}.rowid "
+             f"WHERE {WORKS_FTS} MATCH :match AND works.status = :status")
+    total = db.session.execute(text(f"SELECT COUNT(*) {where}"), params).scalar()
+    ids = [row[0] for row in db.session.execute(
+        text(f"SELECT works.id {where} ORDER BY {WORKS_RANK} LIMIT :limit OFFSET :offset"),
+        {**params, 'limit': per_page, 'offset': (page - 1) * per_page}
+    )]
+    return _load_in_order(Work, ids), total
+
+
+def search_characters(keyword, page=1, per_page=20):
+    """
+    按相关度分页检索单字
+
+    Returns:
+        tuple: (单字列表（按相关度排序）, 匹配总数)
+    """
+    match = build_match_query(keyword)
+    if not match:
+        return [], 0
+    params = {'match': match}
+    where = f"FROM {CHARACTERS_FTS} WHERE {CHARACTERS_FTS} MATCH :match"
+    total = db.session.execute(text(f"SELECT COUNT(*) {where}"), params).scalar()
+    ids = [row[0] for row in db.session.execute(
+        text(f"SELECT rowid {where} ORDER BY {CHARACTERS_RANK} LIMIT :limit OFFSET :offset"),
+        {**params, 'limit': per_page, 'offset': (page - 1) * per_page}
+    )]
+    return _load_in_order(Character, ids), total
+
+
+def _load_in_order(model, ids):
+    if not ids:
+        return []
+    objects = {obj.id: obj for obj in model.query.filter(model.id.in_(ids)).all()}
+    return [objects[i] for i in ids if i in objects]
+
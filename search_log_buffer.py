@@ -0,0 +1,142 @@
+"""
+搜索记录写缓冲
+搜索接口只把搜索词放入内存队列，由后台线程按时间或数量批量写入 search_logs，
+每批一条多行 INSERT，并在同一事务中累加热门词按天汇总表，搜索响应不再等待写事务和 SQLite 写锁。
+后台线程同时按 SEARCH_LOG_PRUNE_INTERVAL 定期清理超过保留期的搜索记录。
+队列有上限，写满时直接丢弃新记录（只影响热门词统计）；进程退出时写入剩余记录。
+"""
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, SearchLog
+from hot_keywords import record_keyword_stats, prune_search_logs
+
+
+class SearchLogBuffer:
+    """搜索记录写缓冲，用法与 Flask 扩展一致：先创建实例，再调用 init_app(app)"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """读取配置并注册退出时的刷新"""
+        self.app = app
+        self.queue_size = app.config.get('SEARCH_LOG_QUEUE_SIZE', 10000)
+        self.batch_size = app.config.get('SEARCH_LOG_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('SEARCH_LOG_FLUSH_INTERVAL', 5)
+        self.prune_interval = app.config.get('SEARCH_LOG_PRUNE_INTERVAL', 3600)
+        self.retention_days = app.config.get('SEARCH_LOG_RETENTION_DAYS', 30)
+        if self._queue is None:
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            atexit.register(self.shutdown)
+        app.extensions['search_log_buffer'] = self
+
+    def record(self, keyword, user_id=None):
+        """
+        记录一次搜索，不访问数据库
+
+        Returns:
+            bool: 是否成功入队，队列已满时返回 False
+        """
+        keyword = (keyword or '').strip()[:100]
+        if not keyword or self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait({
+                'keyword': keyword,
+                'user_id': user_id,
+                'created_at': datetime.utcnow()
+            })
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self._ensure_worker()
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='search-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        last_prune = time.monotonic()
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            if time.monotonic() - last_prune >= self.prune_interval:
+                last_prune = time.monotonic()
+                self.prune()
+
+    def _drain(self):
+        rows = []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def flush(self):
+        """
+        将队列中的记录全部写入数据库
+
+        Returns:
+            int: 写入的记录数
+        """
+        if self._queue is None or self.app is None:
+            return 0
+        written = 0
+        with self._flush_lock, self.app.app_context():
+            while True:
+                rows = self._drain()
+                if not rows:
+                    break
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(insert(SearchLog.__table__).values(rows))
+                        record_keyword_stats(connection, rows)
+                    written += len(rows)
+                except Exception as e:
+                    # 写入失败只丢弃本批，不影响后续记录
+                    print(f"批量写入搜索记录失败: {e}")
+        return written
+
+    def prune(self):
+        """删除超过保留期的搜索记录"""
+        with self.app.app_context():
+            try:
+                return prune_search_logs(self.retention_days)
+            except Exception as e:
+                db.session.rollback()
+                print(f"清理搜索记录失败: {e}")
+                return 0
+
+    def shutdown(self):
+        """停止后台线程并写入剩余记录"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+
+search_log_buffer = SearchLogBuffer()
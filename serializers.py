@@ -0,0 +1,153 @@
+"""
+批量序列化
+列表接口一次性序列化整页数据：关联对象按主键批量加载，计数按关系各做一次 GROUP BY，
+输出与各模型 to_dict() 完全相同的结构，查询次数不随每页数量增长
+"""
+from sqlalchemy import func
+from models import db, User, Work, PostLike, PostComment, Comment, Topic, CharacterInSet
+
+
+def preload(model, ids):
+    """
+    按主键批量加载记录到会话的标识映射中
+
+    之后访问多对一关系（如 work.author）会直接命中标识映射，不再逐条查询。
+    标识映射是弱引用，调用方需在序列化结束前持有返回值（本模块统一赋给 _keep）。
+
+    Args:
+        model: 模型类
+        ids: 主键集合
+
+    Returns:
+        dict: 主键 -> 模型对象
+    """
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    return {obj.id: obj for obj in model.query.filter(model.id.in_(ids)).all()}
+
+
+def count_by(column, ids):
+    """
+    对一组外键值做一次 GROUP BY 计数
+
+    Args:
+        column: 外键列（如 PostLike.post_id）
+        ids: 外键值集合
+
+    Returns:
+        dict: 外键值 -> 数量（没有记录的不在结果中）
+    """
+    ids = set(ids)
+    if not ids:
+        return {}
+    rows = db.session.query(column, func.count()).filter(column.in_(ids)).group_by(column).all()
+    return dict(rows)
+
+
+def serialize_works(works, include_author=True):
+    """批量序列化作品，计数读取冗余字段，作者一次加载"""
+    # 仅为持有引用：作者留在标识映射中，work.author 不再逐条查询
+    _keep = preload(User, [work.author_id for work in works]) if include_author else {}
+    return [work.to_dict(include_author=include_author) for work in works]
+
+
+def serialize_posts(posts, include_author=True):
+    """批量序列化帖子，点赞数/评论数各一次 GROUP BY，作者与话题一次加载"""
+    post_ids = [post.id for post in posts]
+    likes = count_by(PostLike.post_id, post_ids)
+    comments = count_by(PostComment.post_id, post_ids)
+    # 仅为持有引用：话题与作者留在标识映射中
+    _keep = (
+        preload(Topic, [post.topic_id for post in posts]),
+        preload(User, [post.author_id for post in posts]) if include_author else {}
+    )
+    return [
+        post.to_dict(include_author=include_author, counts={
+            'likes_count': likes.get(post.id, 0),
+            'comments_count': comments.get(post.id, 0)
+        })
+        for post in posts
+    ]
+
+
+def liked_post_ids(user_id, post_ids):
+    """
+    一次 IN 查询取出用户在给定帖子中点赞过的帖子ID
+
+    Args:
+        user_id: 当前用户ID，为空时直接返回空集合
+        post_ids: 帖子ID集合
+
+    Returns:
+        set: 已点赞的帖子ID
+    """
+    post_ids = set(post_ids)
+    if not user_id or not post_ids:
+        return set()
+    rows = db.session.query(PostLike.post_id).filter(
+        PostLike.user_id == user_id,
+        PostLike.post_id.in_(post_ids)
+    ).all()
+    return {row.post_id for row in rows}
+
+
+def serialize_character_sets(character_sets):
+    """批量序列化字集，单字数量一次 GROUP BY"""
+    counts = count_by(CharacterInSet.character_set_id, [cs.id for cs in character_sets])
+    return [cs.to_dict(characters_count=counts.get(cs.id, 0)) for cs in character_sets]
+
+
+def serialize_collections(collections):
+    """批量序列化收藏，收藏的作品及其作者各一次加载"""
+    works = preload(Work, [collection.work_id for collection in collections])
+    # 仅为持有引用：作品与作者留在标识映射中
+    _keep = (works, preload(User, [work.author_id for work in works.values()]))
+    return [collection.to_dict() for collection in collections]
+
+
+def serialize_comment_threads(model, roots, max_depth=1, max_replies=None):
+    """
+    一次性加载评论楼层并在内存中组装回复树
+
+    所属作品/帖子的全部回复一次查询取出，作者一次加载，替代逐条递归访问 replies 关系。
+    max_depth=1 时输出与 to_dict(include_replies=True) 相同。
+
+    Args:
+        model: Comment 或 PostComment
+        roots: 顶级评论列表
+        max_depth: 回复展开层数，None 表示不限
+        max_replies: 每层最多返回的回复数，None 表示不限
+
+    Returns:
+        list: 顶级评论字典列表，展开的层级带 replies 与 replies_count 字段
+    """
+    if not roots:
+        return []
+
+    owner_column = model.work_id if model is Comment else model.post_id
+    owner_ids = {getattr(root, owner_column.key) for root in roots}
+    replies = model.query.filter(
+        owner_column.in_(owner_ids),
+        model.parent_id.isnot(None)
+    ).order_by(model.created_at.asc(), model.id.asc()).all()
+    # 仅为持有引用：作者留在标识映射中
+    _keep = preload(User, [c.author_id for c in roots] + [c.author_id for c in replies])
+
+    children = {}
+    for reply in replies:
+        children.setdefault(reply.parent_id, []).append(reply)
+
+    def build(comment, depth, visited):
+        data = comment.to_dict()
+        if max_depth is not None and depth >= max_depth:
+            return data
+        visited = visited | {comment.id}
+        kids = [kid for kid in children.get(comment.id, []) if kid.id not in visited]
+        data['replies_count'] = len(kids)
+        if max_replies is not None:
+            kids = kids[:max_replies]
+        data['replies'] = [build(kid, depth + 1, visited) for kid in kids]
+        return data
+
+    return [build(root, 0, set()) for root in roots]
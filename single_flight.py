@@ -0,0 +1,119 @@
+"""
+并发请求合并（single-flight）
+同一进程内，键相同（图片摘要 + 参数）的并发请求只有第一个真正调用外部服务，
+其余请求等待同一个 Future 并得到相同结果（或相同异常）；等待超过 SINGLE_FLIGHT_WAIT_TIMEOUT 秒时放弃。
+调用成功后结果再保留 SINGLE_FLIGHT_RESULT_WINDOW 秒，供紧随其后的相同请求直接复用。
+各分组的调用数、实际执行数与合并（节省）的调用数可通过 /health/providers 查看。
+"""
+import copy
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from flask import current_app
+
+
+class SingleFlightTimeout(TimeoutError):
+    """等待相同请求的结果超时"""
+
+
+class SingleFlight:
+    """一组共享键空间的合并调用"""
+
+    def __init__(self, name):
+        self.name = name
+        # 键 -> [Future, 结果保留截止时间（执行中为 None）]
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'executions': 0, 'coalesced': 0, 'timeouts': 0}
+
+    def _purge(self, now):
+        for key in [k for k, (_, expires_at) in self._calls.items() if expires_at is not None and expires_at <= now]:
+            del self._calls[key]
+
+    def do(self, key, fn, timeout=None, window=0):
+        """
+        执行 fn()，相同键已有进行中（或保留期内）的调用时等待其结果
+
+        Args:
+            key: 可哈希的请求键
+            fn: 无参调用，真正请求外部服务
+            timeout: 等待其他调用结果的最长秒数，None 表示一直等待
+            window: 成功结果的保留秒数
+
+        Returns:
+            fn() 的返回值；合并得到的结果为深拷贝，调用方可以放心修改
+
+        Raises:
+            SingleFlightTimeout: 等待超时
+            fn() 抛出的异常
+        """
+        with self._lock:
+            self.counters['calls'] += 1
+            self._purge(time.monotonic())
+            entry = self._calls.get(key)
+            leader = entry is None
+            if leader:
+                future = Future()
+                self._calls[key] = [future, None]
+                self.counters['executions'] += 1
+            else:
+                future = entry[0]
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            try:
+                return copy.deepcopy(future.result(timeout=timeout))
+            except FutureTimeoutError:
+                with self._lock:
+                    self.counters['timeouts'] += 1
+                raise SingleFlightTimeout(f'等待相同请求的结果超时（{timeout} 秒）')
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if window > 0:
+                self._calls[key][1] = time.monotonic() + window
+            else:
+                self._calls.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def metrics(self):
+        with self._lock:
+            counters = dict(self.counters)
+            counters['in_flight'] = sum(1 for _, expires_at in self._calls.values() if expires_at is None)
+        return counters
+
+
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def group(name):
+    """获取（首次调用时创建）某个分组"""
+    flight = _groups.get(name)
+    if flight is None:
+        with _groups_lock:
+            flight = _groups.setdefault(name, SingleFlight(name))
+    return flight
+
+
+def coalesce(name, key, fn):
+    """按配置的等待超时与结果保留时间，在分组 name 内合并调用 fn"""
+    config = current_app.config
+    return group(name).do(
+        key,
+        fn,
+        timeout=config.get('SINGLE_FLIGHT_WAIT_TIMEOUT', 120),
+        window=config.get('SINGLE_FLIGHT_RESULT_WINDOW', 2)
+    )
+
+
+def metrics():
+    """所有分组的合并指标"""
+    return {name: flight.metrics() for name, flight in list(_groups.items())}
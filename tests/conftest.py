@@ -0,0 +1,69 @@
+"""
+测试公共夹具
+每个测试使用临时目录中的 SQLite 数据库与上传目录，运行方式：python -m pytest -q
+"""
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(config.TestingConfig, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    from app import create_app
+    from models import db
+    app, _ = create_app('testing')
+    app.config['DEBUG'] = False
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """创建用户，返回 (用户, 认证请求头)"""
+    from flask_jwt_extended import create_access_token
+    from models import db, User
+
+    def make(username):
+        user = User(username=username, email=f'{username}@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user, {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    return make
+
+
+@pytest.fixture
+def count_queries(app):
+    """统计代码块内执行的 SQL 语句数"""
+    from models import db
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return counter
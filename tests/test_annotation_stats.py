@@ -0,0 +1,48 @@
+"""
+注释关键点聚类测试
+"""
+import numpy as np
+
+from annotation_stats import cluster_points
+
+
+def _reference_clusters(points, radius):
+    """原稠密邻接矩阵实现，作为对照"""
+    diff = points[:, None, :] - points[None, :, :]
+    adjacency = (diff ** 2).sum(axis=2) <= radius * radius
+    remaining = np.ones(len(points), dtype=bool)
+    clusters = []
+    while remaining.any():
+        neighbors = adjacency[:, remaining].sum(axis=1)
+        neighbors[~remaining] = -1
+        seed = int(neighbors.argmax())
+        members = np.flatnonzero(adjacency[seed] & remaining)
+        remaining[members] = False
+        clusters.append(members)
+    return clusters
+
+
+def test_matches_dense_reference():
+    rng = np.random.default_rng(0)
+    centers = rng.random((8, 2))
+    points = np.clip(np.concatenate([
+        centers[rng.integers(0, len(centers), 600)] + rng.normal(0, 0.03, (600, 2)),
+        rng.random((200, 2)),
+        np.array([[0.0, 0.0], [1.0, 1.0], [0.5, 0.5], [0.5, 0.5]])
+    ]), 0.0, 1.0)
+    for radius in (0.02, 0.08, 0.3):
+        expected = _reference_clusters(points, radius)
+        actual = cluster_points(points, radius)
+        assert [c.tolist() for c in actual] == [c.tolist() for c in expected]
+
+
+def test_dense_point_cloud_stays_bounded():
+    # 5000 个几乎重合的点落在同一格子里，距离按块计算，不再分配 N×N×2 的数组
+    points = np.full((5000, 2), 0.5) + np.random.default_rng(1).normal(0, 1e-4, (5000, 2))
+    clusters = cluster_points(points, 0.08)
+    assert len(clusters) == 1
+    assert len(clusters[0]) == 5000
+
+
+def test_empty():
+    assert cluster_points(np.empty((0, 2)), 0.08) == []
@@ -0,0 +1,25 @@
+"""
+热门搜索词缓存测试
+"""
+from datetime import datetime
+
+import hot_keywords
+from models import db, SearchKeywordStat
+
+
+def test_cached_list_does_not_depend_on_first_limit(app):
+    app.config['HOT_KEYWORDS_TOP_K'] = 5
+    hot_keywords.clear_cache()
+    today = datetime.utcnow().date()
+    for i in range(8):
+        db.session.add(SearchKeywordStat(bucket=today, keyword=f'kw{i}', count=100 - i))
+    db.session.commit()
+
+    # 大 limit 的结果不取决于缓存是否先被小 limit 的请求填充
+    uncached = hot_keywords.get_hot_keywords(days=7, limit=20)
+    hot_keywords.clear_cache()
+    assert len(hot_keywords.get_hot_keywords(days=7, limit=2)) == 2
+    cached = hot_keywords.get_hot_keywords(days=7, limit=20)
+    assert cached == uncached
+    assert [k['keyword'] for k in cached] == [f'kw{i}' for i in range(5)]
+    hot_keywords.clear_cache()
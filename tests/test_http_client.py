@@ -0,0 +1,195 @@
+"""
+外部服务 HTTP 客户端测试：对本地替身 HTTP 服务验证重试、抖动退避、熔断与指标
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import http_client
+from http_client import CircuitOpenError, ProviderClient
+
+
+class StandInServer:
+    """本地替身服务：按 script 依次返回状态码，用完后重复最后一项；'sleep' 表示超时不响应"""
+
+    def __init__(self):
+        self.script = [200]
+        self.hits = 0
+        self.sleep = 1.0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                action = server.next_action()
+                if action == 'sleep':
+                    time.sleep(server.sleep)
+                    action = 200
+                body = b'{"ok": true}'
+                try:
+                    self.send_response(action)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except OSError:
+                    pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/ocr'
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def next_action(self):
+        with self._lock:
+            self.hits += 1
+            return self.script.pop(0) if len(self.script) > 1 else self.script[0]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    stand_in = StandInServer()
+    yield stand_in
+    stand_in.close()
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """记录退避区间，实际等待 0 秒"""
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return 0
+
+    monkeypatch.setattr(http_client.random, 'uniform', uniform)
+    return bounds
+
+
+def test_retries_5xx_then_succeeds(server, no_backoff):
+    server.script = [503, 502, 200]
+    client = ProviderClient('test', retries=2)
+
+    response = client.post(server.url, data=b'x')
+
+    assert response.status_code == 200
+    assert server.hits == 3
+    metrics = client.metrics()
+    assert (metrics['requests'], metrics['errors'], metrics['retries'], metrics['success']) == (3, 2, 2, 1)
+    assert metrics['circuit'] == 'closed'
+    assert metrics['latency']['count'] == 3
+
+
+def test_returns_last_5xx_when_retries_exhausted(server, no_backoff):
+    server.script = [500]
+    client = ProviderClient('test', retries=2, failure_threshold=5)
+
+    response = client.post(server.url)
+
+    assert response.status_code == 500
+    assert server.hits == 3
+    assert client.metrics()['consecutive_failures'] == 1
+
+
+def test_4xx_is_not_retried(server, no_backoff):
+    server.script = [400]
+    client = ProviderClient('test', retries=2)
+
+    assert client.post(server.url).status_code == 400
+    assert server.hits == 1
+    assert no_backoff == []
+
+
+def test_timeout_is_retried_then_raised(server, no_backoff):
+    server.script = ['sleep']
+    server.sleep = 0.5
+    client = ProviderClient('test', timeout=0.1, retries=1)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        client.post(server.url)
+
+    assert server.hits == 2
+    metrics = client.metrics()
+    assert (metrics['requests'], metrics['errors'], metrics['retries']) == (2, 2, 1)
+
+
+def test_backoff_is_jittered_and_capped(server, no_backoff):
+    server.script = [500]
+    client = ProviderClient('test', retries=3, backoff=1, backoff_max=1.5)
+
+    client.post(server.url)
+
+    # 全抖动：每次在 [0, min(上限, 基数 * 2^attempt)] 内随机
+    assert no_backoff == [(0, 1), (0, 1.5), (0, 1.5)]
+
+
+def test_circuit_opens_rejects_without_network_and_recovers(server, no_backoff):
+    server.script = [500]
+    client = ProviderClient('test', retries=0, failure_threshold=2, reset_timeout=0.3)
+
+    client.post(server.url)
+    client.post(server.url)
+    assert client.metrics()['circuit'] == 'open'
+
+    hits = server.hits
+    with pytest.raises(CircuitOpenError):
+        client.post(server.url)
+    assert server.hits == hits
+    assert client.metrics()['rejected'] == 1
+
+    # 冷却后放行一个试探请求，成功即恢复
+    time.sleep(0.35)
+    server.script = [200]
+    assert client.post(server.url).status_code == 200
+    metrics = client.metrics()
+    assert metrics['circuit'] == 'closed'
+    assert metrics['consecutive_failures'] == 0
+
+
+def test_failed_half_open_trial_reopens(server, no_backoff):
+    server.script = [500]
+    client = ProviderClient('test', retries=0, failure_threshold=1, reset_timeout=0.2)
+
+    client.post(server.url)
+    assert client.breaker.state == 'open'
+    time.sleep(0.25)
+
+    assert client.breaker.allow()
+    assert client.breaker.state == 'half_open'
+    # 试探请求进行中时其余请求仍被拒绝
+    assert not client.breaker.allow()
+    client.breaker.record_failure()
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.post(server.url)
+
+
+def test_provider_metrics_reports_shared_clients(server, no_backoff, monkeypatch):
+    monkeypatch.setattr(http_client, '_clients', {})
+    server.script = [502, 200]
+
+    client = http_client.get_client('stand-in', retries=1)
+    assert http_client.get_client('stand-in') is client
+    client.post(server.url)
+
+    metrics = http_client.provider_metrics()
+    assert list(metrics) == ['stand-in']
+    stand_in = metrics['stand-in']
+    assert (stand_in['requests'], stand_in['errors'], stand_in['retries'], stand_in['success'], stand_in['rejected']) == (2, 1, 1, 1, 0)
+    assert stand_in['latency']['count'] == 2
+    assert sum(stand_in['latency']['buckets'].values()) == 2
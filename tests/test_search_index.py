@@ -0,0 +1,62 @@
+"""
+全文检索测试：建立 FTS 表后按作品与单字检索，空白与纯标点输入不报错
+"""
+import pytest
+
+import search_index
+from models import db, Work, Character
+
+
+@pytest.fixture
+def indexed(app, make_user):
+    """先建 FTS 表再写入数据，由模型事件同步索引"""
+    assert search_index.ensure_search_index()
+    owner, _ = make_user('owner')
+    lanting = Work(title='兰亭序', author_name='王羲之', image_url='lanting.png', author_id=owner.id)
+    jizhi = Work(title='祭侄文稿', author_name='颜真卿', image_url='jizhi.png', author_id=owner.id)
+    db.session.add_all([lanting, jizhi])
+    db.session.flush()
+    db.session.add(Character(work_id=lanting.id, style='行书', strokes=3, stroke_order='', recognition='兰', source='兰亭序'))
+    db.session.commit()
+    return lanting, jizhi
+
+
+def test_build_match_query():
+    assert search_index.build_match_query('兰亭') == '"兰 亭"'
+    assert search_index.build_match_query('兰亭 王羲之') == '"兰 亭" AND "王 羲 之"'
+    assert search_index.build_match_query('兰亭，') == '"兰 亭"'
+    assert search_index.build_match_query('  ') is None
+    assert search_index.build_match_query('!!! ，。') is None
+
+
+def _titles(client, search):
+    response = client.get('/api/works/', query_string={'search': search})
+    assert response.status_code == 200, response.get_json()
+    return sorted(work['title'] for work in response.get_json()['works'])
+
+
+def test_works_search_uses_index(client, indexed):
+    assert search_index.is_available()
+    assert _titles(client, '兰亭') == ['兰亭序']
+    assert _titles(client, ' 颜真卿 ') == ['祭侄文稿']
+
+
+def test_works_search_blank_lists_all(client, indexed):
+    assert _titles(client, '  ') == ['兰亭序', '祭侄文稿']
+
+
+def test_works_search_punctuation_matches_nothing(client, indexed):
+    assert _titles(client, '!!!') == []
+    assert _titles(client, '兰亭 ，') == ['兰亭序']
+
+
+@pytest.mark.parametrize('q, works_total, characters_total', [
+    ('兰', 1, 1),
+    ('!!!', 0, 0),
+    ('  ', 2, 1),
+])
+def test_calligraphy_search(client, indexed, q, works_total, characters_total):
+    response = client.get('/api/calligraphy/search', query_string={'q': q})
+    assert response.status_code == 200, response.get_json()
+    data = response.get_json()['data']
+    assert (data['works_total'], data['characters_total']) == (works_total, characters_total)
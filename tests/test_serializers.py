@@ -0,0 +1,120 @@
+"""
+列表接口查询次数回归测试：每页的 SQL 语句数不随每页数量增长
+"""
+from models import db, User, Work, Collection, Post, PostLike, PostComment, Topic, Character, CharacterSet, CharacterInSet
+
+N = 5
+
+
+def _seed_works(count, start):
+    """每个作品一个不同的作者，作者需要批量加载"""
+    works = []
+    for i in range(start, start + count):
+        author = User(username=f'author{i}', email=f'author{i}@example.com', password_hash='x')
+        db.session.add(author)
+        db.session.flush()
+        work = Work(title=f'work{i}', image_url=f'work{i}.png', author_id=author.id)
+        db.session.add(work)
+        works.append(work)
+    db.session.flush()
+    return works
+
+
+def _measure(client, count_queries, url, headers=None):
+    with count_queries() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return len(statements), response.get_json()
+
+
+def _assert_constant(client, count_queries, seed, url, key, headers=None):
+    """先种 N 条取一页 N 条，再补到 2N 条取一页 2N 条，两次的语句数应相同"""
+    counts = []
+    for size in (N, 2 * N):
+        seed(N)
+        for mode in ('', '&cursor='):
+            queries, data = _measure(client, count_queries, f'{url}?per_page={size}{mode}', headers)
+            assert len(data[key]) == size
+            counts.append(queries)
+    assert counts[0] == counts[2], counts
+    assert counts[1] == counts[3], counts
+
+
+def test_get_works_query_budget(client, count_queries):
+    seeded = []
+
+    def seed(count):
+        seeded.extend(_seed_works(count, len(seeded)))
+        db.session.commit()
+
+    _assert_constant(client, count_queries, seed, '/api/works/', 'works')
+
+
+def test_get_user_works_query_budget(client, count_queries, make_user):
+    owner, _ = make_user('owner')
+    seeded = []
+
+    def seed(count):
+        for i in range(len(seeded), len(seeded) + count):
+            work = Work(title=f'work{i}', image_url=f'work{i}.png', author_id=owner.id)
+            db.session.add(work)
+            seeded.append(work)
+        db.session.commit()
+
+    _assert_constant(client, count_queries, seed, f'/api/users/{owner.id}/works', 'works')
+
+
+def test_get_collections_query_budget(client, count_queries, make_user):
+    collector, headers = make_user('collector')
+    seeded = []
+
+    def seed(count):
+        for work in _seed_works(count, len(seeded)):
+            db.session.add(Collection(user_id=collector.id, work_id=work.id))
+            seeded.append(work)
+        db.session.commit()
+
+    _assert_constant(client, count_queries, seed, '/api/collections/', 'collections', headers)
+
+
+def test_get_posts_query_budget(client, count_queries, make_user):
+    reader, headers = make_user('reader')
+    seeded = []
+
+    def seed(count):
+        for i in range(len(seeded), len(seeded) + count):
+            topic = Topic(id=f'topic{i}', name=f'topic{i}', description='d')
+            author = User(username=f'poster{i}', email=f'poster{i}@example.com', password_hash='x')
+            db.session.add_all([topic, author])
+            db.session.flush()
+            post = Post(content=f'post{i}', author_id=author.id, topic_id=topic.id)
+            db.session.add(post)
+            db.session.flush()
+            db.session.add(PostLike(user_id=reader.id, post_id=post.id))
+            db.session.add(PostComment(content='c', author_id=author.id, post_id=post.id))
+            seeded.append(post)
+        db.session.commit()
+
+    _assert_constant(client, count_queries, seed, '/api/posts', 'posts', headers)
+
+
+def test_get_character_sets_query_budget(client, count_queries, make_user):
+    owner, headers = make_user('owner')
+    work = Work(title='work', image_url='work.png', author_id=owner.id)
+    db.session.add(work)
+    db.session.flush()
+    character = Character(work_id=work.id, style='楷书', strokes=1, stroke_order='', recognition='一', source='s')
+    db.session.add(character)
+    db.session.commit()
+    seeded = []
+
+    def seed(count):
+        for i in range(len(seeded), len(seeded) + count):
+            character_set = CharacterSet(name=f'set{i}', user_id=owner.id)
+            db.session.add(character_set)
+            db.session.flush()
+            db.session.add(CharacterInSet(character_set_id=character_set.id, character_id=character.id))
+            seeded.append(character_set)
+        db.session.commit()
+
+    _assert_constant(client, count_queries, seed, '/api/character-sets/', 'character_sets', headers)
@@ -0,0 +1,211 @@
+"""
+外部 AI 调用用量统计
+每次调用豆包模型或古籍 OCR 接口时记录耗时、请求/响应字节数、token 用量、模型与结果，
+在内存中按接口（服务:接口:模型）和按用户累加：当前统计周期的汇总每 USAGE_SNAPSHOT_INTERVAL 秒
+由后台线程写入 usage_snapshots 表后清零，进程启动以来的累计值一直保留。
+费用按 AI_MODEL_PRICES（元/千 tokens）与 OCR_PRICE_PER_CALL（元/次）估算。
+"""
+import atexit
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app, has_request_context
+from sqlalchemy import insert
+from models import db, UsageSnapshot
+
+FIELDS = ('calls', 'errors', 'latency_ms_sum', 'latency_ms_max', 'request_bytes', 'response_bytes',
+          'prompt_tokens', 'completion_tokens', 'cost')
+
+# 后台任务线程中代为记录调用所属的用户
+_local = threading.local()
+
+
+def _empty():
+    return dict.fromkeys(FIELDS, 0)
+
+
+def _add(aggregates, key, sample):
+    agg = aggregates.get(key)
+    if agg is None:
+        agg = aggregates[key] = _empty()
+    agg['calls'] += 1
+    agg['errors'] += 0 if sample['outcome'] == 'success' else 1
+    agg['latency_ms_sum'] += sample['latency_ms']
+    agg['latency_ms_max'] = max(agg['latency_ms_max'], sample['latency_ms'])
+    for field in ('request_bytes', 'response_bytes', 'prompt_tokens', 'completion_tokens', 'cost'):
+        agg[field] += sample[field]
+
+
+def _summarize(aggregates):
+    """附加平均耗时，按调用次数降序"""
+    result = []
+    for (scope, key), agg in aggregates.items():
+        result.append({
+            'scope': scope,
+            'key': key,
+            **agg,
+            'cost': round(agg['cost'], 4),
+            'latency_ms_avg': round(agg['latency_ms_sum'] / agg['calls'], 1) if agg['calls'] else 0
+        })
+    result.sort(key=lambda item: -item['calls'])
+    return {
+        'endpoints': [item for item in result if item['scope'] == 'endpoint'],
+        'users': [item for item in result if item['scope'] == 'user']
+    }
+
+
+def current_user_id():
+    """调用所属用户：后台任务中取 attribute_to 设置的用户，请求中取 JWT 身份（可选）"""
+    user_id = getattr(_local, 'user_id', None)
+    if user_id is not None:
+        return user_id
+    if has_request_context():
+        try:
+            from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+            verify_jwt_in_request(optional=True)
+            return get_jwt_identity()
+        except Exception:
+            return None
+    return None
+
+
+@contextmanager
+def attribute_to(user_id):
+    """在后台任务中把本线程的外部调用记到指定用户名下"""
+    previous = getattr(_local, 'user_id', None)
+    _local.user_id = user_id
+    try:
+        yield
+    finally:
+        _local.user_id = previous
+
+
+def estimate_cost(provider, model, prompt_tokens=0, completion_tokens=0):
+    """按配置的单价估算一次调用的费用（元）"""
+    config = current_app.config
+    if provider == 'ocr':
+        return config.get('OCR_PRICE_PER_CALL', 0)
+    prices = config.get('AI_MODEL_PRICES', {}).get(model)
+    if not prices:
+        return 0
+    input_price, output_price = prices
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1000
+
+
+class UsageStats:
+    """用量统计，用法与 Flask 扩展一致：先创建实例，再调用 init_app(app)"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._window = {}
+        self._totals = {}
+        self._window_start = datetime.utcnow()
+        self._started_at = self._window_start
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """读取配置并注册退出时写入快照"""
+        self.app = app
+        self.snapshot_interval = app.config.get('USAGE_SNAPSHOT_INTERVAL', 300)
+        if not self._registered:
+            atexit.register(self.shutdown)
+            self._registered = True
+        app.extensions['usage_stats'] = self
+
+    def record(self, provider, endpoint, model, latency_ms, request_bytes=0, response_bytes=0,
+               prompt_tokens=0, completion_tokens=0, outcome='success', user_id=None):
+        """
+        记录一次外部调用
+
+        Args:
+            provider: 服务名（ark / ocr）
+            endpoint: 接口名
+            model: 模型名或接口版本
+            outcome: success，失败时为错误类型
+            user_id: 调用所属用户，缺省按当前请求或后台任务推断
+        """
+        if user_id is None:
+            user_id = current_user_id()
+        sample = {
+            'outcome': outcome,
+            'latency_ms': float(latency_ms),
+            'request_bytes': int(request_bytes or 0),
+            'response_bytes': int(response_bytes or 0),
+            'prompt_tokens': int(prompt_tokens or 0),
+            'completion_tokens': int(completion_tokens or 0),
+            'cost': estimate_cost(provider, model, prompt_tokens or 0, completion_tokens or 0)
+        }
+        keys = [('endpoint', f'{provider}:{endpoint}:{model}'), ('user', str(user_id) if user_id is not None else 'anonymous')]
+        with self._lock:
+            for key in keys:
+                _add(self._window, key, sample)
+                _add(self._totals, key, sample)
+        self._ensure_worker()
+
+    def stats(self):
+        """当前统计周期与进程启动以来的汇总"""
+        with self._lock:
+            window = {key: dict(agg) for key, agg in self._window.items()}
+            totals = {key: dict(agg) for key, agg in self._totals.items()}
+            window_start = self._window_start
+        return {
+            'window': {'since': window_start.isoformat(), **_summarize(window)},
+            'totals': {'since': self._started_at.isoformat(), **_summarize(totals)}
+        }
+
+    def _ensure_worker(self):
+        if self.app is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='usage-snapshot', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.snapshot_interval):
+            self.snapshot()
+
+    def snapshot(self):
+        """
+        把当前统计周期的汇总写入 usage_snapshots 并开始新周期
+
+        Returns:
+            int: 写入的行数
+        """
+        if self.app is None:
+            return 0
+        now = datetime.utcnow()
+        with self._lock:
+            window, self._window = self._window, {}
+            period_start, self._window_start = self._window_start, now
+        if not window:
+            return 0
+        rows = [
+            {'period_start': period_start, 'period_end': now, 'scope': scope, 'key': key[:200], **agg}
+            for (scope, key), agg in window.items()
+        ]
+        with self.app.app_context():
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(UsageSnapshot.__table__).values(rows))
+            except Exception as e:
+                print(f"写入用量快照失败: {e}")
+                return 0
+        return len(rows)
+
+    def shutdown(self):
+        """停止后台线程并写入最后一个周期"""
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.snapshot()
+
+
+usage_stats = UsageStats()
@@ -2,9 +2,14 @@ import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import uuid
+import json
+import base64
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 
+# 游标分页每页数量上限（路由未指定时）
+CURSOR_MAX_PER_PAGE = 100
+
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
     return '.' in filename and \
@@ -133,3 +138,148 @@ def create_notification(user_id, notification_type, content, related_id, related
         db.session.rollback()
         print(f'创建通知失败: {str(e)}')
         return None
+
+
+def adjust_counter(model, obj_id, field, delta=1):
+    """
+    在当前事务中原子地增减冗余计数字段
+
+    使用 UPDATE ... SET field = field + delta，避免并发请求读-改-写丢失更新；
+    不会提交事务，由调用方与业务数据一起 commit。
+
+    Args:
+        model: 模型类（如 Work）
+        obj_id: 记录ID
+        field: 计数字段名（如 'likes_count'）
+        delta: 增量，可为负数
+    """
+    column = getattr(model, field)
+    model.query.filter(model.id == obj_id).update(
+        {column: column + delta},
+        synchronize_session=False
+    )
+
+
+def encode_cursor(value, obj_id):
+    """
+    生成游标分页的不透明游标
+
+    Args:
+        value: 排序字段的值（datetime）
+        obj_id: 记录ID，作为同一时间点的次级排序键
+
+    Returns:
+        str: URL 安全的 base64 字符串
+    """
+    payload = json.dumps([value.isoformat(), obj_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解析游标
+
+    Returns:
+        tuple: (datetime, id)
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, obj_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(value), int(obj_id)
+    except Exception as e:
+        raise ValueError(f'无效的游标: {cursor}') from e
+
+
+class CursorPage:
+    """游标分页结果"""
+
+    def __init__(self, items, per_page, next_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def to_dict(self, key, data):
+        """组装响应体，只有请求了总数时才包含 total"""
+        result = {
+            key: data,
+            'next_cursor': self.next_cursor,
+            'has_next': self.has_next,
+            'per_page': self.per_page
+        }
+        if self.total is not None:
+            result['total'] = self.total
+        return result
+
+
+def keyset_paginate(query, model, cursor, per_page, order_column=None, descending=True, with_total=False,
+                    max_per_page=CURSOR_MAX_PER_PAGE):
+    """
+    按 (排序字段, id) 做游标分页
+
+    与 paginate() 不同，不使用 OFFSET，也默认不执行 COUNT(*)，深翻页的代价与第一页相同。
+
+    Args:
+        query: 已应用过滤条件的查询（排序会被重置）
+        model: 查询的模型类
+        cursor: 上一页返回的 next_cursor，为空表示第一页
+        per_page: 每页数量，限制在 1 到 max_per_page 之间（0 或负数按 1 处理）
+        order_column: 排序字段，默认 model.created_at
+        descending: 是否倒序
+        with_total: 是否额外统计总数
+        max_per_page: 每页数量上限
+
+    Returns:
+        CursorPage
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    from sqlalchemy import and_, or_
+
+    per_page = min(max(per_page or 1, 1), max_per_page)
+    column = order_column if order_column is not None else model.created_at
+    query = query.order_by(None)
+    total = query.count() if with_total else None
+
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        if descending:
+            query = query.filter(or_(column < value, and_(column == value, model.id < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, model.id > last_id)))
+
+    if descending:
+        query = query.order_by(column.desc(), model.id.desc())
+    else:
+        query = query.order_by(column.asc(), model.id.asc())
+
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, column.key), last.id)
+
+    return CursorPage(items, per_page, next_cursor=next_cursor, total=total)
+
+
+def get_cursor_args():
+    """
+    读取游标分页的查询参数
+
+    Returns:
+        tuple: (cursor, with_total)。cursor 为 None 表示客户端未启用游标模式，
+        应继续使用页码分页；空字符串表示游标模式的第一页
+    """
+    from flask import request
+    cursor = request.args.get('cursor')
+    with_total = request.args.get('with_total', 'false').lower() in ('1', 'true', 'yes')
+    return cursor, with_total